@@ -0,0 +1,222 @@
+"""
+A cache of parsed events, so that drawing the same event again does not
+mean parsing its text again.
+
+Each event is stored in its own file in the user cache directory, as the
+columns of an EventColumns. The file starts with a fixed header:
+
+    MAGIC, then little-endian uint32 schema version and metadata length
+
+followed by the metadata (a pickled dictionary with the units, pdfinfo,
+particle names, extra colour flow and the name, array typecode, length and
+offset of every column), followed by the raw column arrays, each starting
+at a multiple of 8 bytes. The columns are read straight out of a memory
+map of the file.
+
+The cache is kept below CACHE_SIZE bytes by deleting the events which were
+least recently used whenever an event is stored.
+"""
+
+from .. import log; log = log.getChild(__name__)
+
+from array import array
+from cPickle import dumps, loads, UnpicklingError
+from hashlib import md5
+from mmap import mmap, ACCESS_READ
+from os import listdir, stat, remove, rename, makedirs, utime
+from os.path import abspath, exists, join as pjoin
+from struct import pack, unpack, calcsize
+from sys import byteorder
+
+from mcviz.exception import XDG_CACHE_HOME
+from mcviz.utils.trydecompress import is_stream
+from .columns import EventColumns
+
+MAGIC = "MCVIZEV\0"
+SCHEMA_VERSION = 2
+HEADER = "<II"
+HEADER_SIZE = len(MAGIC) + calcsize(HEADER)
+ALIGNMENT = 8
+
+CACHE_DIR = pjoin(XDG_CACHE_HOME, "events")
+CACHE_SUFFIX = ".mcvizev"
+# The most space cached events may take, in bytes
+CACHE_SIZE = 256 << 20
+
+# Columns of EventColumns which are stored, in order
+COLUMNS = ("no", "pdgid", "status", "color", "anticolor",
+           "px", "py", "pz", "e", "m", "start_vertex", "end_vertex",
+           "vno", "in_offsets", "in_particles", "out_offsets", "out_particles",
+           "position")
+
+def cache_file(filename, event_number, args):
+    """
+    The cache file of an event. It depends on the input file's path, size
+    and modification time, so that the cache of a file which has changed is
+    never used, and on the options which affect parsing: a --format other
+    than the one the file would be read as gives a different event.
+    """
+    st = stat(filename)
+    key = (abspath(filename), st.st_size, st.st_mtime, event_number,
+           getattr(args, "units", None), getattr(args, "format", None))
+    return pjoin(CACHE_DIR, md5(repr(key)).hexdigest() + CACHE_SUFFIX)
+
+def write_event(path, event_graph):
+    """
+    Write `event_graph` to the cache file `path`
+    """
+    columns = event_graph.columns
+    if columns is None:
+        columns = EventColumns.from_graph(event_graph.vertices,
+                                          event_graph.particles)
+
+    layout, offset = [], 0
+    for name in COLUMNS:
+        column = getattr(columns, name)
+        if column is None:
+            continue
+        layout.append((name, column.typecode, len(column), offset))
+        offset += -(-len(column) * column.itemsize // ALIGNMENT) * ALIGNMENT
+
+    metadata = dumps(dict(
+        byteorder=byteorder,
+        n_particles=columns.n_particles, n_vertices=columns.n_vertices,
+        units=event_graph.units, pdfinfo=event_graph.pdfinfo,
+        name=columns.name, flow=columns.flow, columns=layout), 2)
+    data_start = -(-(HEADER_SIZE + len(metadata)) // ALIGNMENT) * ALIGNMENT
+
+    if not exists(CACHE_DIR):
+        makedirs(CACHE_DIR)
+    # Write to a temporary file first, so that readers never see half a file
+    partial = path + ".partial"
+    with open(partial, "wb") as fd:
+        fd.write(MAGIC + pack(HEADER, SCHEMA_VERSION, len(metadata)) + metadata)
+        for name, typecode, length, offset in layout:
+            fd.seek(data_start + offset)
+            getattr(columns, name).tofile(fd)
+    rename(partial, path)
+
+def read_event(path, event_graph_class):
+    """
+    Read the event in the cache file `path`. Returns None if there is no
+    usable cache of the event.
+    """
+    try:
+        fd = open(path, "rb")
+    except IOError:
+        return None
+    with fd:
+        header = fd.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+            return None
+        version, metadata_length = unpack(HEADER, header[len(MAGIC):])
+        if version != SCHEMA_VERSION:
+            log.debug("ignoring cached event with schema version %i" % version)
+            return None
+        try:
+            metadata = loads(fd.read(metadata_length))
+        except (UnpicklingError, EOFError, ValueError):
+            return None
+        data_start = -(-(HEADER_SIZE + metadata_length) // ALIGNMENT) * ALIGNMENT
+
+        columns = EventColumns(metadata["n_particles"], metadata["n_vertices"])
+        data = mmap(fd.fileno(), 0, access=ACCESS_READ)
+        try:
+            for name, typecode, length, offset in metadata["columns"]:
+                column = array(typecode)
+                start = data_start + offset
+                column.fromstring(buffer(data, start, length * column.itemsize))
+                if len(column) != length:
+                    return None
+                if metadata["byteorder"] != byteorder:
+                    column.byteswap()
+                setattr(columns, name, column)
+        finally:
+            data.close()
+
+    columns.name = metadata["name"]
+    columns.flow = metadata["flow"]
+    columns.particle_index = dict((no, i) for i, no in enumerate(columns.no))
+    columns.vertex_index = dict((vno, i) for i, vno in enumerate(columns.vno))
+    return event_graph_class(columns.vertices, columns.particles,
+                             metadata["units"], metadata["pdfinfo"])
+
+def prune(size):
+    """
+    Delete cached events, least recently used first, until they take no more
+    than `size` bytes. Reading an event from the cache counts as using it.
+    """
+    try:
+        names = listdir(CACHE_DIR)
+    except OSError:
+        return
+    events = []
+    for name in names:
+        if not name.endswith(CACHE_SUFFIX):
+            continue
+        path = pjoin(CACHE_DIR, name)
+        try:
+            st = stat(path)
+        except OSError:
+            # Deleted by another process
+            continue
+        events.append((st.st_mtime, st.st_size, path))
+
+    total = sum(event_size for mtime, event_size, path in events)
+    for mtime, event_size, path in sorted(events):
+        if total <= size:
+            break
+        try:
+            remove(path)
+        except OSError:
+            continue
+        total -= event_size
+        log.debug("removed cached event %s" % path)
+
+class EventCache(object):
+    """
+    The cached events of one input file
+    """
+    def __init__(self, filename, args, write=True):
+        self.filename = filename
+        self.args = args
+        self.write = write
+
+    def path(self, event_number):
+        if is_stream(self.filename):
+            # The same stream never comes again
+            return None
+        try:
+            return cache_file(self.filename, event_number, self.args)
+        except OSError:
+            # Not a file, so there's nothing to key the cache on
+            return None
+
+    def has(self, event_number):
+        path = self.path(event_number)
+        return path is not None and exists(path)
+
+    def get(self, event_number, event_graph_class):
+        path = self.path(event_number)
+        if path is None:
+            return None
+        event_graph = read_event(path, event_graph_class)
+        if event_graph is not None:
+            log.verbose("read event %i from the cache" % event_number)
+            try:
+                # Keep it from being pruned
+                utime(path, None)
+            except OSError:
+                pass
+        return event_graph
+
+    def put(self, event_number, event_graph):
+        path = self.path(event_number)
+        if not self.write or path is None:
+            return
+        try:
+            write_event(path, event_graph)
+        except (IOError, OSError), e:
+            log.debug("could not cache event %i: %s" % (event_number, e))
+            return
+        prune(CACHE_SIZE)
@@ -0,0 +1,332 @@
+"""
+Columnar storage of the particles and vertices of an event.
+
+Instead of one Python object (and its dictionary, tuples and sets) per
+particle and vertex, every quantity is kept in one array for the whole
+event, and the particles going into and out of the vertices are kept as
+index arrays (in CSR form: the particles of vertex i are
+in_particles[in_offsets[i]:in_offsets[i+1]]).
+
+ColumnParticle and ColumnVertex are small views into the columns with the
+same interface as Particle and Vertex, created only when they are looked up,
+so that a GraphView works the same on either kind of event.
+"""
+
+from array import array
+from collections import Mapping
+from math import atan2, log as ln, tan
+
+
+class EventColumns(object):
+    """
+    The particles and vertices of one event, stored column by column.
+    Particles and vertices are addressed by their index in the columns, which
+    is the order of their numbers.
+    """
+    def __init__(self, n_particles, n_vertices):
+        self.no = array("l")
+        self.pdgid = array("l")
+        self.status = array("l")
+        self.color = array("l")
+        self.anticolor = array("l")
+        self.px = array("d")
+        self.py = array("d")
+        self.pz = array("d")
+        self.e = array("d")
+        self.m = array("d")
+        # Particle names are only known for pythia logs
+        self.name = None
+        # Colour flow other than color/anticolor, {particle index: flow}
+        self.flow = {}
+        # Index of the vertex each particle starts from and ends in, or -1
+        self.start_vertex = array("l")
+        self.end_vertex = array("l")
+
+        self.vno = array("l")
+        self.in_offsets = array("l", [0])
+        self.in_particles = array("l")
+        self.out_offsets = array("l", [0])
+        self.out_particles = array("l")
+        # Vertex positions (x, y, z, ctau) are only known for HepMC
+        self.position = None
+
+        self.n_particles, self.n_vertices = n_particles, n_vertices
+        self.particle_index, self.vertex_index = {}, {}
+
+    @classmethod
+    def from_graph(cls, vertices, particles):
+        """
+        Store the Vertex and Particle objects (dictionaries by number) of an
+        event in columns
+        """
+        pnos, vnos = sorted(particles), sorted(vertices)
+        c = cls(len(pnos), len(vnos))
+        c.particle_index = dict((no, i) for i, no in enumerate(pnos))
+        c.vertex_index = dict((vno, i) for i, vno in enumerate(vnos))
+
+        def vertex_index(vertex):
+            if vertex is None:
+                return -1
+            return c.vertex_index.get(vertex.vno, -1)
+
+        ps = [particles[no] for no in pnos]
+        c.no.extend(pnos)
+        # pythia logs give floats, keep them so that events look the same
+        pdgids = [p.pdgid for p in ps]
+        if any(isinstance(pdgid, float) for pdgid in pdgids):
+            c.pdgid = array("d")
+        c.pdgid.extend(pdgids)
+        c.status.extend(p.status for p in ps)
+        c.color.extend(p.color for p in ps)
+        c.anticolor.extend(p.anticolor for p in ps)
+        for axis, components in enumerate((c.px, c.py, c.pz)):
+            components.extend(p.p[axis] for p in ps)
+        c.e.extend(p.e for p in ps)
+        c.m.extend(p.m for p in ps)
+        if any(p.name for p in ps):
+            c.name = [p.name for p in ps]
+        c.flow = dict((i, p.other_flow) for i, p in enumerate(ps)
+                      if getattr(p, "other_flow", None))
+        c.start_vertex.extend(vertex_index(p.vertex_in) for p in ps)
+        c.end_vertex.extend(vertex_index(p.vertex_out) for p in ps)
+
+        vs = [vertices[vno] for vno in vnos]
+        c.vno.extend(vnos)
+        for v in vs:
+            c.in_particles.extend(sorted(c.particle_index[p.no] for p in v.incoming))
+            c.in_offsets.append(len(c.in_particles))
+            c.out_particles.extend(sorted(c.particle_index[p.no] for p in v.outgoing))
+            c.out_offsets.append(len(c.out_particles))
+        if any(v.position for v in vs):
+            c.position = array("d")
+            for v in vs:
+                c.position.extend(map(float, v.position or (0, 0, 0, 0)))
+        return c
+
+    @classmethod
+    def from_lists(cls, numbers, pdgids, statuses, colors, anticolors, momenta,
+                   flows, vertices):
+        """
+        Store an event read into lists, with the particles in any order.
+        The particle lists hold the numbers, pdgids, statuses, colours and
+        anticolours of the particles and `momenta` holds their px, py, pz, e
+        and m lists. `flows` is {position in the lists: other colour flow}.
+        `vertices` is a list of (vno, incoming, outgoing, position) where
+        incoming and outgoing are positions in the particle lists and position
+        is (x, y, z, ctau) or None. Vertices without particles are left out.
+        """
+        particle_order = sorted(xrange(len(numbers)), key=numbers.__getitem__)
+        sorted_index = dict((i, j) for j, i in enumerate(particle_order))
+        vertices = sorted(v for v in vertices if v[1] or v[2])
+
+        if particle_order == range(len(numbers)):
+            ordered = lambda values: values
+        else:
+            ordered = lambda values: [values[i] for i in particle_order]
+
+        c = cls(len(particle_order), len(vertices))
+        c.no.extend(ordered(numbers))
+        c.pdgid.extend(ordered(pdgids))
+        c.status.extend(ordered(statuses))
+        c.color.extend(ordered(colors))
+        c.anticolor.extend(ordered(anticolors))
+        for column, values in zip((c.px, c.py, c.pz, c.e, c.m), momenta):
+            column.extend(ordered(values))
+        c.flow = dict((sorted_index[i], flow) for i, flow in flows.iteritems())
+        c.particle_index = dict((no, i) for i, no in enumerate(c.no))
+
+        c.start_vertex.extend([-1] * c.n_particles)
+        c.end_vertex.extend([-1] * c.n_particles)
+        if any(position for vno, ins, outs, position in vertices):
+            c.position = array("d")
+        for k, (vno, ins, outs, position) in enumerate(vertices):
+            c.vno.append(vno)
+            ins = sorted(sorted_index[i] for i in ins)
+            outs = sorted(sorted_index[i] for i in outs)
+            for i in ins:
+                c.end_vertex[i] = k
+            for i in outs:
+                c.start_vertex[i] = k
+            c.in_particles.extend(ins)
+            c.in_offsets.append(len(c.in_particles))
+            c.out_particles.extend(outs)
+            c.out_offsets.append(len(c.out_particles))
+            if c.position is not None:
+                c.position.extend(position or (0., 0., 0., 0.))
+        c.vertex_index = dict((vno, k) for k, vno in enumerate(c.vno))
+        return c
+
+    @property
+    def particles(self):
+        "The particles, a mapping from particle number to ColumnParticle"
+        return ColumnMap(self, self.no, self.particle_index, ColumnParticle)
+
+    @property
+    def vertices(self):
+        "The vertices, a mapping from vertex number to ColumnVertex"
+        return ColumnMap(self, self.vno, self.vertex_index, ColumnVertex)
+
+    def incoming(self, vertex):
+        "Indices of the particles going into the vertex with index `vertex`"
+        return self.in_particles[self.in_offsets[vertex]:self.in_offsets[vertex+1]]
+
+    def outgoing(self, vertex):
+        "Indices of the particles coming out of the vertex with index `vertex`"
+        return self.out_particles[self.out_offsets[vertex]:self.out_offsets[vertex+1]]
+
+class ColumnMap(Mapping):
+    """
+    A read-only mapping from particle or vertex number to views into the
+    columns, made when they are looked up
+    """
+    def __init__(self, columns, numbers, index, view):
+        self.columns = columns
+        self.numbers = numbers
+        self.index = index
+        self.view = view
+
+    def __getitem__(self, number):
+        return self.view(self.columns, self.index[number])
+
+    def __contains__(self, number):
+        return number in self.index
+
+    def __iter__(self):
+        return iter(self.numbers)
+
+    def __len__(self):
+        return len(self.numbers)
+
+class ColumnView(object):
+    __slots__ = ("columns", "index")
+
+    def __init__(self, columns, index):
+        self.columns = columns
+        self.index = index
+
+    def __eq__(self, rhs):
+        return (type(self) is type(rhs) and self.index == rhs.index and
+                self.columns is rhs.columns)
+
+    def __ne__(self, rhs):
+        return not self == rhs
+
+    def __hash__(self):
+        return self.index
+
+def column(name):
+    "A property reading this view's entry in the column `name`"
+    return property(lambda self: getattr(self.columns, name)[self.index])
+
+class ColumnParticle(ColumnView):
+    """
+    A particle stored in EventColumns, see Particle
+    """
+    __slots__ = ()
+
+    no = column("no")
+    pdgid = column("pdgid")
+    status = column("status")
+    color = column("color")
+    anticolor = column("anticolor")
+    e = column("e")
+    m = column("m")
+
+    @property
+    def name(self):
+        names = self.columns.name
+        return names[self.index] if names else ""
+
+    @property
+    def other_flow(self):
+        return self.columns.flow.get(self.index, {})
+
+    @property
+    def p(self):
+        c, i = self.columns, self.index
+        return c.px[i], c.py[i], c.pz[i]
+
+    @property
+    def pt(self):
+        c, i = self.columns, self.index
+        return (c.px[i]**2 + c.py[i]**2)**0.5
+
+    @property
+    def eta(self):
+        pt = self.pt
+        return -ln(tan(atan2(pt, self.columns.pz[self.index])/2.)) if pt else +999
+
+    @property
+    def phi(self):
+        c, i = self.columns, self.index
+        return atan2(c.px[i], c.py[i])
+
+    @property
+    def vertex_in(self):
+        vertex = self.columns.start_vertex[self.index]
+        return None if vertex < 0 else ColumnVertex(self.columns, vertex)
+
+    @property
+    def vertex_out(self):
+        vertex = self.columns.end_vertex[self.index]
+        return None if vertex < 0 else ColumnVertex(self.columns, vertex)
+
+    @property
+    def mothers(self):
+        vertex = self.vertex_in
+        return vertex.incoming if vertex else set()
+
+    @property
+    def daughters(self):
+        vertex = self.vertex_out
+        return vertex.outgoing if vertex else set()
+
+    @property
+    def initial_state(self):
+        "No mothers"
+        vertex = self.vertex_in
+        return vertex is None or not vertex.incoming
+
+    @property
+    def final_state(self):
+        "No daughters"
+        vertex = self.vertex_out
+        return vertex is None or not vertex.outgoing
+
+    def __repr__(self):
+        return "<Particle id=%i name=%s>" % (self.no, self.name)
+
+    def __lt__(self, rhs):
+        return self.no < rhs.no
+
+class ColumnVertex(ColumnView):
+    """
+    A vertex stored in EventColumns, see Vertex
+    """
+    __slots__ = ()
+
+    vno = column("vno")
+
+    @property
+    def incoming(self):
+        c = self.columns
+        return set(ColumnParticle(c, i) for i in c.incoming(self.index))
+
+    @property
+    def outgoing(self):
+        c = self.columns
+        return set(ColumnParticle(c, i) for i in c.outgoing(self.index))
+
+    @property
+    def position(self):
+        position = self.columns.position
+        if position is None: return None
+        return tuple(position[4*self.index:4*self.index+4])
+
+    def __repr__(self):
+        args = (self.vno, sorted(p.no for p in self.incoming),
+                sorted(p.no for p in self.outgoing))
+        return "<Vertex id=%i in=set(%r) out=set(%r)>" % args
+
+    def __lt__(self, rhs):
+        return self.vno < rhs.vno
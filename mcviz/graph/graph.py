@@ -2,12 +2,15 @@
 
 from .. import log; log = log.getChild(__name__)
 
+from itertools import chain
+
 from mcviz import FatalError
 from . import EventParseError
+from .kinematics import Kinematics
 #from mcviz.tests.test_graph import graph_is_consistent
 
 class EventGraph(object):
-    def __init__(self, vertices, particles, units, pdfinfo=None):
+    def __init__(self, vertices, particles, units, pdfinfo=None, kinematics=None):
         """
         `records`: A list containing many particles
         """
@@ -15,9 +18,26 @@ class EventGraph(object):
         self.particles = particles
         self.units = units
         self.pdfinfo = pdfinfo
+        if kinematics is None:
+            kinematics = Kinematics.from_particles(particles, units)
+        self.kinematics = kinematics
+        # The EventColumns of the event, if it is stored in columns
+        self.columns = getattr(particles, "columns", None)
         # Graph consistency checks
         #graph_is_consistent(self)
 
+    def to_columns(self):
+        """
+        Return this event with its particles and vertices stored in columns,
+        which take far less memory than the Particle and Vertex objects
+        """
+        from .columns import EventColumns
+        if self.columns is not None:
+            return self
+        columns = EventColumns.from_graph(self.vertices, self.particles)
+        return EventGraph(columns.vertices, columns.particles,
+                          self.units, self.pdfinfo, self.kinematics)
+
     @property
     def initial_particles(self):
         return sorted(p for p in self.particles.values() if p.initial_state)
@@ -25,20 +45,150 @@ class EventGraph(object):
     @classmethod
     def load(cls, args):
         """
-        Try to load a monte-carlo event using all available loaders
+        Load a monte-carlo event, the first one if args.filename selects
+        several
         """
-        loaders = [cls.from_hepmc, cls.from_lhe, cls.from_pythia_log]
-        for loader in loaders:
+        for event_number, event_graph in cls.load_events(args):
+            return event_graph
+
+    @classmethod
+    def load_events(cls, args):
+        """
+        Yield (event number, EventGraph) for each event selected by
+        args.filename, reading through the file once. Events found in the
+        parsed-event cache are not parsed again.
+        """
+        from .cache import EventCache
+        from .loaders import parse_event_spec
+        if getattr(args, "no_cache", False):
+            for format, event_number, event in cls.read_events(args):
+                yield event_number, cls.from_raw(format, event, args)
+            return
+
+        filename, event_numbers = parse_event_spec(args.filename)
+        # Only single events are stored, to keep the cache small when drawing
+        # whole files
+        cache = EventCache(filename, args, write=len(event_numbers or ()) == 1)
+        # --select is evaluated on the raw events, so they must be read
+        if (event_numbers and not getattr(args, "select", None) and
+            all(cache.has(n) for n in event_numbers)):
+            # Every event is cached, the input needn't be read at all
+            cached = [(n, cache.get(n, cls)) for n in event_numbers]
+            if all(event_graph for n, event_graph in cached):
+                for event_number, event_graph in cached:
+                    yield event_number, event_graph
+                return
+
+        for format, event_number, event in cls.read_events(args):
+            event_graph = None
+            if event_numbers:
+                event_graph = cache.get(event_number, cls)
+            if event_graph is None:
+                event_graph = cls.from_raw(format, event, args)
+                cache.put(event_number, event_graph)
+            yield event_number, event_graph
+
+    @classmethod
+    def read_events(cls, args):
+        """
+        Yield (format, event number, raw event) for each event selected by
+        args.filename, without parsing the events. The loader is chosen by
+        --format, or else from the start of the file. If the format can't be
+        guessed, all available loaders are tried. Events not chosen by
+        --select are skipped.
+        """
+        from .loaders import FORMAT_NAMES, loader_module, parse_event_spec
+        filename, event_numbers = parse_event_spec(args.filename)
+        if getattr(args, "select", None):
+            from .selection import EventSelection
+            selection = EventSelection(args.select)
+        else:
+            selection = None
+        format = cls.input_format(args)
+        for format in [format] if format else FORMAT_NAMES:
+            loader = loader_module(format)
+            events = loader.read_events(filename, event_numbers)
             try:
-                return loader(args)
+                first = next(events)
             except EventParseError:
                 log.debug("loader %s failed" % loader.__name__)
+                continue
+            except StopIteration:
+                return
             except IOError as e:
-                log.exception('loading file "{0}" failed!'.format(args.filename))
+                log.exception('loading file "{0}" failed!'.format(filename))
                 raise FatalError
-                
+
+            n_read = n_selected = 0
+            for event_number, event in chain([first], events):
+                n_read += 1
+                if selection and not selection(*loader.summary_columns(event, args)):
+                    log.debug("event %i not selected" % event_number)
+                    continue
+                n_selected += 1
+                yield format, event_number, event
+            if selection:
+                log.info("selected %i of %i events with %r"
+                         % (n_selected, n_read, selection.expression))
+            return
+
         raise EventParseError("No loaders succeeded on %s" % args.filename)
+
+    @classmethod
+    def from_raw(cls, format, event, args):
+        """
+        Make an EventGraph from a raw event yielded by read_events. HepMC
+        events are read straight into columns; events in other formats are
+        only stored in columns with --columnar once they have been made, so
+        for them it saves memory afterwards but not while they are read.
+        """
+        from .loaders import loader_module
+        event_graph = cls(*loader_module(format).make_event(event, args))
+        if getattr(args, "columnar", False):
+            event_graph = event_graph.to_columns()
+        return event_graph
+
+    @classmethod
+    def input_format(cls, args):
+        """
+        The format of the input file, or None if it is not known
+        """
+        from .loaders import sniff_format
+        from mcviz.utils.trydecompress import is_stream
+        format = getattr(args, "format", None)
+        if format is None:
+            filename = args.filename.partition(":")[0]
+            try:
+                format = sniff_format(filename)
+            except IOError as e:
+                log.exception('loading file "{0}" failed!'.format(filename))
+                raise FatalError
+            if format is None and is_stream(filename):
+                # Trying every loader would mean reading it again
+                log.fatal('Could not tell the format of "{0}", please give '
+                          'it with --format'.format(filename))
+                raise FatalError
+        return format
     
+    @classmethod
+    def index(cls, args):
+        """
+        Build the event index of the input file, so that later loads can seek
+        straight to any event
+        """
+        from .loaders import FORMAT_NAMES, loader_module
+        filename = args.filename.partition(":")[0]
+        format = cls.input_format(args)
+        formats = [format] if format else FORMAT_NAMES
+        for loader in map(loader_module, formats):
+            try:
+                index = loader.build_index(filename)
+            except EventParseError:
+                continue
+            if index:
+                return index
+        raise EventParseError("Could not index %s" % filename)
+
     @classmethod
     def from_hepmc(cls, args):
         from .loaders.hepmc import load_event
@@ -0,0 +1,72 @@
+"""
+Kinematic quantities of all the particles of an event, computed together
+when the event is loaded instead of every time a particle is asked for them.
+"""
+
+from array import array
+from itertools import izip
+from math import atan2, log, sqrt, tan
+
+from mcviz.utils.particledata import classify_all
+
+QUANTITIES = ("pt", "eta", "phi", "rapidity", "mass")
+
+class Kinematics(object):
+    """
+    pt, eta, phi, rapidity, mass (from the four-momentum), and charge and
+    classification flags (from the species) of every particle of an event,
+    one array each. Particle i in the arrays is the particle with number
+    `numbers[i]`, `index` maps numbers to positions.
+
+    The momenta are scaled to the event's energy unit, in the same way as
+    those of the particles of a GraphView.
+    """
+    def __init__(self, numbers, px, py, pz, e, pdgid, energy_mag=1):
+        self.numbers = numbers
+        self.index = dict((no, i) for i, no in enumerate(numbers))
+        for name in QUANTITIES:
+            setattr(self, name, array("d"))
+
+        inf = float("inf")
+        for x, y, z, energy in izip(px, py, pz, e):
+            x, y, z, energy = (x * energy_mag, y * energy_mag, z * energy_mag,
+                               energy * energy_mag)
+
+            pt = (x**2 + y**2)**0.5
+            try:
+                eta = -log(tan(atan2(pt, z)/2.))
+            except ValueError:       # pt == 0
+                eta = inf * z
+            if energy > abs(z):
+                rapidity = 0.5 * log((energy + z) / (energy - z))
+            else:
+                rapidity = inf * z
+            m2 = energy**2 - pt**2 - z**2
+
+            self.pt.append(pt)
+            self.eta.append(eta)
+            self.phi.append(atan2(x, y))
+            self.rapidity.append(rapidity)
+            self.mass.append(sqrt(m2) if m2 >= 0 else -sqrt(-m2))
+
+        classes = classify_all([int(species) for species in pdgid])
+        self.charge = array("d", (c.charge for c in classes))
+        self.flags = array("l", (c.flags for c in classes))
+
+    @classmethod
+    def from_particles(cls, particles, units):
+        """
+        Compute the kinematics of `particles`, a mapping from number to
+        Particle
+        """
+        columns = getattr(particles, "columns", None)
+        if columns is not None:
+            # Stored in columns already, no need to gather the values
+            c = columns
+            return cls(c.no, c.px, c.py, c.pz, c.e, c.pdgid, units.energy_mag)
+
+        numbers = sorted(particles)
+        ps = [particles[no] for no in numbers]
+        return cls(numbers, [p.p[0] for p in ps], [p.p[1] for p in ps],
+                   [p.p[2] for p in ps], [p.e for p in ps],
+                   [p.pdgid for p in ps], units.energy_mag)
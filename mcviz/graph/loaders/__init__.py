@@ -1 +1,174 @@
+"""
+Loaders for the event file formats understood by MCViz
+"""
 
+from ... import log; log = log.getChild(__name__)
+
+from contextlib import closing
+from importlib import import_module
+from operator import attrgetter
+
+from mcviz import FatalError
+from mcviz.utils import Units
+from mcviz.utils.trydecompress import open_decompressed
+
+# Enough to get past the banners at the top of any of the formats
+SNIFF_SIZE = 1 << 16
+# Read at a time while sniffing, so that a pipe needn't fill SNIFF_SIZE first
+SNIFF_CHUNK = 1 << 12
+
+# Format name: loader module, in the order they are tried
+FORMATS = [("hepmc", "hepmc"),
+           ("hepmc3", "hepmc3"),
+           ("lhe", "leshouchesevent"),
+           ("pythia", "pythialog")]
+FORMAT_NAMES = [name for name, module in FORMATS]
+
+def loader_module(format):
+    "The loader module for `format`"
+    return import_module("." + dict(FORMATS)[format], __name__)
+
+def sniff_format(filename):
+    """
+    Guess the format of `filename` from the first few kilobytes of its
+    (decompressed) content. Returns None if it is not recognised.
+    """
+    head = ""
+    with closing(open_decompressed(filename, peek=True)) as fd:
+        while len(head) < SNIFF_SIZE:
+            data = fd.read(SNIFF_CHUNK)
+            head += data
+            for format in FORMAT_NAMES:
+                if loader_module(format).sniff(head):
+                    log.debug('"{0}" looks like {1}'.format(filename, format))
+                    return format
+            if not data:
+                break
+    return None
+
+def parse_event_spec(spec):
+    """
+    Split "filename[:events]" into the filename and a sorted list of event
+    numbers, or None for all events. `events` is "all" or a comma separated
+    list of event numbers and inclusive ranges such as "0-999". By default
+    only the first event is read.
+    """
+    filename, _, events = spec.partition(":")
+    if not events:
+        return filename, [0]
+    elif events == "all":
+        return filename, None
+
+    event_numbers = set()
+    try:
+        for part in events.split(","):
+            first, _, last = part.partition("-")
+            first = int(first)
+            last = int(last) if last else first
+            if first < 0 or last < first:
+                raise ValueError
+            event_numbers.update(xrange(first, last + 1))
+    except ValueError:
+        log.fatal("Failed to understand the events to read, '{0}'. Filename "
+                  "should have the form 'string[:events]', where events is "
+                  "'all' or e.g. 4 or 0-999 or 1,5,7-9".format(events))
+        raise FatalError()
+    return filename, sorted(event_numbers)
+
+def too_few_events(filename, event_numbers, n_events):
+    """
+    Stop with an error if the last of `event_numbers` is beyond the
+    `n_events` events in `filename`
+    """
+    if event_numbers and event_numbers[-1] >= n_events:
+        log.fatal("Event {0} requested, but {1} only contains {2} events"
+                  .format(event_numbers[-1], filename, n_events))
+        raise FatalError()
+
+def select_events(events, event_numbers, filename):
+    """
+    Yield (event number, event) for the events of `events`, in file order,
+    whose numbers are in `event_numbers`. Nothing is read after the last
+    event wanted.
+    """
+    if event_numbers is None:
+        for item in enumerate(events):
+            yield item
+        return
+
+    wanted, last = set(event_numbers), event_numbers[-1]
+    n_events = 0
+    for n, event in enumerate(events):
+        n_events = n + 1
+        if n in wanted:
+            yield n, event
+            if n == last:
+                return
+    too_few_events(filename, event_numbers, n_events)
+
+def indexed_events(index, event_numbers):
+    """
+    Yield (event number, byte offset) for `event_numbers` in an index
+    """
+    if event_numbers is None:
+        event_numbers = xrange(len(index))
+    else:
+        too_few_events(index.filename, event_numbers, len(index))
+    for event_number in event_numbers:
+        yield event_number, index.offset(event_number)
+
+def event_units(args, declared=None):
+    """
+    The units of an event which declares the units `declared`, e.g.
+    "GEV MM", or None. --units takes precedence, as it does when the event is
+    made.
+    """
+    if getattr(args, "units", None):
+        return Units(args.units)
+    return Units(declared)
+
+def scale_momenta(px, py, units):
+    """
+    The x and y momenta `px` and `py` of an event in `units`, in GeV as they
+    are in its Kinematics
+    """
+    scale = units.energy_mag
+    if scale == 1:
+        return px, py
+    return [x * scale for x in px], [y * scale for y in py]
+
+def make_vertices(particles):
+    """
+    Make the vertices between `particles`, Particle objects whose mothers and
+    daughters are sets of Particles, for formats which only list the mothers
+    of each particle. A particle comes out of the vertex which one of its
+    mothers goes into, if there is one, and is then made a daughter of all of
+    that vertex's incoming particles. Otherwise it comes out of a new vertex
+    which its mothers go into, or one of its own if it has no mothers.
+
+    Each mother goes into only one vertex, so the vertex of every mother is
+    looked up instead of searched for. Returns a dictionary of the vertices
+    and the number of the last one.
+    """
+    from .. import Vertex
+    vertex_dict, mother_vertex = {}, {}
+    vno = 0
+    for particle in particles:
+        found = [mother_vertex[m] for m in particle.mothers if m in mother_vertex]
+        if found:
+            # The mothers go into different vertices, take the first one made
+            found_v = min(found, key=attrgetter("vno"))
+            found_v.outgoing.add(particle)
+            for new_mother in found_v.incoming:
+                particle.mothers.add(new_mother)
+                new_mother.daughters.add(particle)
+        elif particle.mothers:
+            vno += 1
+            vertex = Vertex(vno, particle.mothers, [particle])
+            vertex_dict[frozenset(particle.mothers)] = vertex
+            for mother in particle.mothers:
+                mother_vertex[mother] = vertex
+        else: # initial state vertex
+            vno += 1
+            vertex_dict[particle] = Vertex(vno, [], [particle])
+    return vertex_dict, vno
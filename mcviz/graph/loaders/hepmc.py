@@ -1,34 +1,80 @@
 from ... import log; log = log.getChild(__name__)
 
 
+from array import array
 from collections import namedtuple
+from contextlib import closing
 from itertools import izip
 import re
 
 from mcviz import FatalError
 from mcviz.utils import Units
-from mcviz.utils.trydecompress import try_decompress
+from mcviz.utils.trydecompress import open_decompressed
 from .. import EventParseError, Particle, Vertex
+from ..columns import EventColumns
+from . import (parse_event_spec, select_events, indexed_events, event_units,
+               scale_momenta)
+from .index import get_index
 
 
-HEPMC_TEXT = re.compile("""(?:
-HepMC::Version (?P<version>.*?))?\s*
-HepMC::IO_(?:GenEvent|Ascii)-START_EVENT_LISTING
-(?P<events>.*)
-HepMC::IO_(?:GenEvent|Ascii)-END_EVENT_LISTING
-""", re.M | re.DOTALL)
+HEPMC_START = re.compile(r"HepMC::IO_(?:GenEvent|Ascii)-START_EVENT_LISTING")
+HEPMC_END = re.compile(r"HepMC::IO_(?:GenEvent|Ascii)-END_EVENT_LISTING")
+
+def sniff(head):
+    "Does `head`, the start of a file, look like HepMC?"
+    return bool(HEPMC_START.search(head))
+
+def find_event_listing(lines):
+    """
+    Consume `lines` up to and including the start of the HepMC event listing.
+    Returns False if the start of a listing was never seen.
+    """
+    for line in lines:
+        if HEPMC_START.match(line):
+            return True
+    return False
 
 def event_generator(lines):
     """
-    Yield one event at a time from a HepMC file
+    Yield one event at a time from a HepMC file, as the list of its lines.
+    Only one event is held in memory at a time and no line is tokenized here,
+    so events which are skipped over cost little more than reading them.
     """
     event = []
-    for line in (l.split() for l in lines):
-        if line[0] == "E" and event:
+    for line in lines:
+        if line[:1] == "E" and event:
             yield event
             event = []
-        event.append(line)
-    yield event
+        elif HEPMC_END.match(line):
+            break
+        if line.strip():
+            event.append(line)
+    if event:
+        yield event
+
+def index_events(fd):
+    """
+    Scan a HepMC file and return an index entry for every event:
+    (byte offset, event number, number of particles, number of vertices)
+    """
+    entries = []
+    offset, listing, entry = 0, False, None
+    for line in fd:
+        if not listing:
+            listing = bool(HEPMC_START.match(line))
+        elif line[:1] == "E":
+            if entry:
+                entries.append(tuple(entry))
+            fields = line.split(None, 9)
+            entry = [offset, int(fields[1]), 0, int(fields[8])]
+        elif line[:1] == "P":
+            entry[2] += 1
+        elif HEPMC_END.match(line):
+            listing = False
+        offset += len(line)
+    if entry:
+        entries.append(tuple(entry))
+    return entries, {}
 
 HEvent = namedtuple("HEvent", 
     "id interaction_count ev_scale alpha_qcd alpha_qed signal_proc_id "
@@ -237,38 +283,205 @@ def load_single_event(ev, args):
 
     return vertices, particles, units, pdfinfo
 
-def load_event(args):
+def load_event_columns(ev, args):
     """
-    Load one event from a HepMC file
+    Given one event in HepMC's text format, as a list of lines, return its
+    particles and vertices stored in EventColumns. This builds the same event
+    as load_single_event, but each line is split once and the fields of all
+    particles are converted to numbers a column at a time, with no record or
+    Particle objects.
     """
-    filename, _, event_number = args.filename.partition(":")
-    if event_number:
-        try:
-            event_number = int(event_number)
-        except ValueError:
-            log.fatal("Failed to convert filename part to an integer. Filename "
-                      "should have the form 'string[:int(event number)]'")
-            raise FatalError()
-    else:
-        event_number = 0
-    
-    with open(filename) as fd:
-        data = try_decompress(fd.read())
-        match = HEPMC_TEXT.search(data)
+    units = Units(args.units) if args.units else None
+    event = pdfinfo = None
+
+    # Fields and colour flow of the particles, in the order of the file
+    particle_fields, flows = [], {}
+    # Vertices in the order of the file, with the particles coming out of them
+    vertex_barcodes, positions, vertex_outgoing = [], [], []
+    outgoing, initial, orphans = [], [], 0
+
+    for line in ev:
+        fields = line.split()
+        type_ = fields[0]
+        if type_ == "P":
+            if event is None:
+                raise RuntimeError("Event record should come first. Corrupted "
+                                   "input hepmc?")
+            if len(fields) in (12, 14, 16):
+                # Strange dialect which misses the "mass" column? Insert 0 mass.
+                fields.insert(7, "0")
+            if fields[2] == "0":
+                continue
+            i = len(particle_fields)
+            particle_fields.append(fields)
+            if len(fields) > 12:
+                n_flow = int(fields[12])
+                assert len(fields) == 13 + 2*n_flow, "Unexpected additional data on particle"
+                if n_flow:
+                    flow = map(int, fields[13:])
+                    flows[i] = dict(izip(flow[::2], flow[1::2]))
+            else:
+                assert len(fields) == 12, "Unexpected additional data on particle"
+
+            if orphans:
+                orphans -= 1
+                initial.append(i)
+            else:
+                outgoing.append(i)
+
+        elif type_ == "V":
+            if event is None:
+                raise RuntimeError("Event record should come first. Corrupted "
+                                   "input hepmc?")
+            if vertex_barcodes:
+                vertex_outgoing.append(outgoing)
+                outgoing = []
+            vertex_barcodes.append(int(fields[1]))
+            positions.append(tuple(map(float, fields[3:7])))
+            orphans = int(fields[7])
+
+        elif type_ == "E":
+            assert event is None, "Duplicate event records in event"
+            event = make_record(fields)
+            log.debug("Event record: {0} ".format(event))
+
+        elif type_ == "U":
+            if units is None:
+                units = make_record(fields)
+            else:
+                log.verbose("previous units declaration overriding input's unit record")
+
+        elif type_ == "F":
+            if event is None:
+                raise RuntimeError("Event record should come first. Corrupted "
+                                   "input hepmc?")
+            pdfinfo = make_record(fields)
+
+    vertex_outgoing.append(outgoing)
+
+    # Convert the fields of the particles a whole column at a time
+    fields = zip(*[f[:12] for f in particle_fields]) or [()] * 12
+    barcodes, pdgids, statuses, end_barcodes = [map(int, fields[k]) for k in (1, 2, 8, 11)]
+    momenta = [array("d", map(float, fields[k])) for k in range(3, 8)]
+    colors, anticolors = [0] * len(barcodes), [0] * len(barcodes)
+    for i, flow in flows.items():
+        colors[i], anticolors[i] = flow.pop(1, 0), flow.pop(2, 0)
+        if not flow:
+            del flows[i]
+
+    # Use default units if they are not specified
+    if units is None:
+        units = Units()
+
+    # Particles ending nowhere get a vertex of their own to end in, and
+    # particles coming from nowhere get one to start from, numbered after the
+    # vertices of the event
+    vertex_incoming = dict((barcode, []) for barcode in vertex_barcodes)
+    final = []
+    for i, barcode in enumerate(end_barcodes):
+        if barcode:
+            vertex_incoming[barcode].append(i)
+        else:
+            final.append(i)
+    vno = min(vertex_barcodes) - 1
+    for i in sorted(final, key=barcodes.__getitem__):
+        vertex_barcodes.append(vno)
+        vertex_incoming[vno] = [i]
+        vertex_outgoing.append([])
+        vno -= 1
+    for i in initial:
+        vertex_barcodes.append(vno)
+        vertex_incoming[vno] = []
+        vertex_outgoing.append([i])
+        vno -= 1
+
+    # Only real vertices have positions
+    positions.extend([None] * (len(vertex_barcodes) - len(positions)))
+    vertices = [(barcode, vertex_incoming[barcode], vertex_outgoing[j], positions[j])
+                for j, barcode in enumerate(vertex_barcodes)]
+    c = EventColumns.from_lists(barcodes, pdgids, statuses, colors, anticolors,
+                                momenta, flows, vertices)
+
+    particles = c.particles
+    # Check theres only 2 incoming vertices
+    if len(initial) != 2:
+        log.warning("found {0:d} incoming particles, this may indicate an incomplete input file"\
+            .format(len(initial)))
+        log.debug("initial particles:")
+        for i in initial: log.debug(repr(particles[barcodes[i]]))
+    for i in initial:
+        units.initial_check(particles[barcodes[i]])
+
+    for i in final:
+        if colors[i] or anticolors[i]:
+            log.warning("found coloured final state particle"\
+                ", this may indicate an incomplete input file")
+            log.debug("final state particle: {0:s} color: {1:d} anticolor {2:d}"\
+                .format(repr(particles[barcodes[i]]), colors[i], anticolors[i]))
+
+    return c.vertices, particles, units, pdfinfo
 
-    if not match:
+def summary_columns(event, args):
+    """
+    The pdgids and x and y momenta in GeV of the particles of an event, as
+    yielded by read_events, without parsing the rest of it
+    """
+    fields, declared = [], None
+    for line in event:
+        if line[:1] == "P":
+            fields.append(line.split(None, 5))
+        elif line[:1] == "U":
+            declared = " ".join(line.split()[1:3])
+    fields = [f for f in fields if f[2] != "0"]
+    px, py = scale_momenta([float(f[3]) for f in fields],
+                           [float(f[4]) for f in fields],
+                           event_units(args, declared))
+    return [int(f[2]) for f in fields], px, py
+
+def build_index(filename):
+    """
+    (Re)build the index of a HepMC file
+    """
+    return get_index(filename, "hepmc", index_events, rebuild=True)
+
+def read_events(filename, event_numbers):
+    """
+    Yield (event number, lines of the event) for `event_numbers`, or all
+    events if it is None. Without an index the file is streamed through once
+    and closed as soon as the last event wanted has been read.
+    """
+    index = get_index(filename, "hepmc", index_events)
+    if index is None:
+        with closing(open_decompressed(filename)) as fd:
+            if not find_event_listing(fd):
+                raise EventParseError("Not obviously hepmc data.")
+            for item in select_events(event_generator(fd), event_numbers, filename):
+                yield item
+    elif not index:
         raise EventParseError("Not obviously hepmc data.")
-        
-    result = match.groupdict()
-    #version = tuple(map(int, result.get("version", "0").split(".")))
-    #if version != (2, 06, 01):
-        #log.warning("Warning: Only tested with hepmc 2.06.01")
-    lines = result["events"].split("\n")
-    
-    for i, event in izip(xrange(event_number+1), event_generator(lines)):
-        # Load only one event
-        pass
-    return load_single_event(event, args)
+    else:
+        with open(filename, "rb") as fd:
+            for event_number, offset in indexed_events(index, event_numbers):
+                fd.seek(offset)
+                yield event_number, next(event_generator(fd))
+
+def make_event(event, args):
+    """
+    Make an event from the lines yielded by read_events. With --debug, the
+    event is built from HepMC records and Particle objects, which are easier
+    to inspect.
+    """
+    if getattr(args, "debug", False):
+        return load_single_event([line.split() for line in event], args)
+    return load_event_columns(event, args)
+
+def load_event(args):
+    """
+    Load one event from a HepMC file
+    """
+    filename, event_numbers = parse_event_spec(args.filename)
+    event_number, event = next(read_events(filename, event_numbers))
+    return make_event(event, args)
 
 if __name__ == "__main__":
     from IPython.Shell import IPShellEmbed; ip = IPShellEmbed(["-pdb"])
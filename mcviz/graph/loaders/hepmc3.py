@@ -0,0 +1,261 @@
+"""
+Loader for the ASCII format of HepMC3 (HepMC::Asciiv3).
+
+Unlike HepMC2, each particle refers to the vertex it comes from, and the
+vertices list the particles going into them. A vertex with only one
+particle going into it is usually not written at all: the particles coming
+out of it refer to their mother instead. Attributes, such as the colour flow
+of the particles, are written on separate "A" lines.
+"""
+
+from ... import log; log = log.getChild(__name__)
+
+from array import array
+from contextlib import closing
+import re
+
+from mcviz.utils import Units
+from mcviz.utils.trydecompress import open_decompressed
+from .. import EventParseError
+from ..columns import EventColumns
+from . import (parse_event_spec, select_events, indexed_events, event_units,
+               scale_momenta)
+from .hepmc import HPDF
+from .index import get_index
+
+
+HEPMC3_START = re.compile(r"HepMC::Asciiv3-START_EVENT_LISTING")
+HEPMC3_END = re.compile(r"HepMC::Asciiv3-END_EVENT_LISTING")
+VERTEX = re.compile(r"V\s+(-?\d+)\s+(?:-?\d+\s+)?\[([^\]]*)\]"
+                    r"(?:\s*@\s*(\S+)\s+(\S+)\s+(\S+)\s+(\S+))?")
+
+def sniff(head):
+    "Does `head`, the start of a file, look like HepMC3?"
+    return bool(HEPMC3_START.search(head))
+
+def find_event_listing(lines):
+    """
+    Consume `lines` up to and including the start of the event listing.
+    Returns False if the start of a listing was never seen.
+    """
+    for line in lines:
+        if HEPMC3_START.match(line):
+            return True
+    return False
+
+def event_generator(lines):
+    """
+    Yield one event at a time from a HepMC3 file, as the list of its lines.
+    The run information before the first event is only logged.
+    """
+    event = None
+    for line in lines:
+        if line[:1] == "E":
+            if event:
+                yield event
+            event = []
+        elif HEPMC3_END.match(line):
+            break
+        elif event is None:
+            if line[:1] == "T":
+                log.verbose("written by {0}".format(line[1:].strip()))
+            continue
+        if line.strip():
+            event.append(line)
+    if event:
+        yield event
+
+def index_events(fd):
+    """
+    Scan a HepMC3 file and return an index entry for every event:
+    (byte offset, event number, number of particles, number of vertices)
+    """
+    entries = []
+    offset, listing = 0, False
+    for line in fd:
+        if not listing:
+            listing = bool(HEPMC3_START.match(line))
+        elif line[:1] == "E":
+            fields = line.split(None, 4)
+            entries.append((offset, int(fields[1]), int(fields[3]), int(fields[2])))
+        elif HEPMC3_END.match(line):
+            listing = False
+        offset += len(line)
+    return entries, {}
+
+def load_event_columns(ev, args):
+    """
+    Given one event in HepMC3's ASCII format, as a list of lines, return its
+    particles and vertices stored in EventColumns, along with the units and
+    pdf information. The fields of all particles are converted to numbers a
+    column at a time, and attributes are applied straight to the columns.
+    """
+    units = Units(args.units) if args.units else None
+    pdfinfo = None
+
+    particle_fields, attributes = [], []
+    explicit_vertices = []
+    for line in ev:
+        type_ = line[:1]
+        if type_ == "P":
+            particle_fields.append(line.split())
+        elif type_ == "V":
+            match = VERTEX.match(line)
+            if not match:
+                raise EventParseError("Bad HepMC3 vertex: {0}".format(line.strip()))
+            vno, incoming, x, y, z, t = match.groups()
+            position = tuple(map(float, (x, y, z, t))) if x is not None else None
+            explicit_vertices.append((int(vno), map(int, incoming.replace(",", " ").split()),
+                                      position))
+        elif type_ == "A":
+            attributes.append(line.split(None, 3))
+        elif type_ == "U":
+            fields = line.split()
+            log.verbose("event reports units are {0} and {1}".format(*fields[1:3]))
+            if units is None:
+                units = Units(fields[1] + " " + fields[2])
+            else:
+                log.verbose("previous units declaration overriding input's unit record")
+        elif type_ == "E":
+            log.debug("Event record: {0}".format(line.strip()))
+
+    # Use default units if they are not specified
+    if units is None:
+        units = Units()
+
+    # Convert the fields of the particles a whole column at a time
+    fields = zip(*[f[:10] for f in particle_fields]) or [()] * 10
+    numbers, parents, pdgids, statuses = [map(int, fields[k]) for k in (1, 2, 3, 9)]
+    momenta = [array("d", map(float, fields[k])) for k in range(4, 9)]
+    index = dict((no, i) for i, no in enumerate(numbers))
+
+    flows = {}
+    for attribute in attributes:
+        if len(attribute) != 4:
+            continue
+        target, name, value = int(attribute[1]), attribute[2], attribute[3]
+        if target == 0 and name == "GenPdfInfo":
+            pdfinfo = HPDF._make(value.split()[:len(HPDF._fields)])
+        elif target > 0 and name[:4] == "flow" and name[4:].isdigit():
+            flows.setdefault(index[target], {})[int(name[4:])] = int(value)
+    colors, anticolors = [0] * len(numbers), [0] * len(numbers)
+    for i, flow in flows.items():
+        colors[i], anticolors[i] = flow.pop(1, 0), flow.pop(2, 0)
+        if not flow:
+            del flows[i]
+
+    # Vertices which aren't written get numbers after those which are, in the
+    # order of their first particle, and particles ending nowhere or coming
+    # from nowhere get vertices of their own after those, as for HepMC2
+    vno = min([v[0] for v in explicit_vertices] + [0]) - 1
+    vertex_outgoing = dict((v[0], []) for v in explicit_vertices)
+    implicit, implicit_order, initial = {}, [], []
+    for i, parent in enumerate(parents):
+        if parent < 0:
+            if parent not in vertex_outgoing:
+                raise EventParseError("Particle {0} comes from unknown vertex {1}"
+                                      .format(numbers[i], parent))
+            vertex_outgoing[parent].append(i)
+        elif parent > 0:
+            mother = index[parent]
+            if mother not in implicit:
+                implicit[mother] = []
+                implicit_order.append(mother)
+            implicit[mother].append(i)
+        else:
+            initial.append(i)
+
+    vertices, ended = [], set(implicit)
+    for v, incoming, position in explicit_vertices:
+        incoming = [index[no] for no in incoming]
+        ended.update(incoming)
+        vertices.append((v, incoming, vertex_outgoing[v], position))
+    for mother in implicit_order:
+        vertices.append((vno, [mother], implicit[mother], None))
+        vno -= 1
+    final = sorted((i for i in xrange(len(numbers)) if i not in ended),
+                   key=numbers.__getitem__)
+    for i in final:
+        vertices.append((vno, [i], [], None))
+        vno -= 1
+    for i in initial:
+        vertices.append((vno, [], [i], None))
+        vno -= 1
+
+    c = EventColumns.from_lists(numbers, pdgids, statuses, colors, anticolors,
+                                momenta, flows, vertices)
+
+    particles = c.particles
+    if len(initial) != 2:
+        log.warning("found {0:d} incoming particles, this may indicate an incomplete input file"
+            .format(len(initial)))
+        log.debug("initial particles:")
+        for i in initial: log.debug(repr(particles[numbers[i]]))
+    for i in initial:
+        units.initial_check(particles[numbers[i]])
+
+    for i in final:
+        if colors[i] or anticolors[i]:
+            log.warning("found coloured final state particle"
+                ", this may indicate an incomplete input file")
+            log.debug("final state particle: {0:s} color: {1:d} anticolor {2:d}"
+                .format(repr(particles[numbers[i]]), colors[i], anticolors[i]))
+
+    return c.vertices, particles, units, pdfinfo
+
+def summary_columns(event, args):
+    """
+    The pdgids and x and y momenta in GeV of the particles of an event, as
+    yielded by read_events, without parsing the rest of it
+    """
+    fields, declared = [], None
+    for line in event:
+        if line[:1] == "P":
+            fields.append(line.split(None, 6))
+        elif line[:1] == "U":
+            declared = " ".join(line.split()[1:3])
+    px, py = scale_momenta([float(f[4]) for f in fields],
+                           [float(f[5]) for f in fields],
+                           event_units(args, declared))
+    return [int(f[3]) for f in fields], px, py
+
+def build_index(filename):
+    """
+    (Re)build the index of a HepMC3 file
+    """
+    return get_index(filename, "hepmc3", index_events, rebuild=True)
+
+def read_events(filename, event_numbers):
+    """
+    Yield (event number, lines of the event) for `event_numbers`, or all
+    events if it is None. Without an index the file is streamed through once
+    and closed as soon as the last event wanted has been read.
+    """
+    index = get_index(filename, "hepmc3", index_events)
+    if index is None:
+        with closing(open_decompressed(filename)) as fd:
+            if not find_event_listing(fd):
+                raise EventParseError("Not obviously HepMC3 data.")
+            for item in select_events(event_generator(fd), event_numbers, filename):
+                yield item
+    elif not index:
+        raise EventParseError("Not obviously HepMC3 data.")
+    else:
+        with open(filename, "rb") as fd:
+            for event_number, offset in indexed_events(index, event_numbers):
+                fd.seek(offset)
+                yield event_number, next(event_generator(fd))
+
+def make_event(event, args):
+    """
+    Make an event from the lines yielded by read_events
+    """
+    return load_event_columns(event, args)
+
+def load_event(args):
+    """
+    Load one event from a HepMC3 file
+    """
+    filename, event_numbers = parse_event_spec(args.filename)
+    event_number, event = next(read_events(filename, event_numbers))
+    return make_event(event, args)
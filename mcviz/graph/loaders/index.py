@@ -0,0 +1,149 @@
+"""
+Persistent event indices, for random access into large event files.
+
+An index records where each event starts in a file, so that event N can be
+read by seeking straight to it instead of scanning the file from the start.
+It is kept next to the input file as `<filename>.mcvizidx`, or in the user
+cache directory if the input file is inside a version control checkout or its
+directory is not writable, and is rebuilt whenever the size or modification
+time of the input file change.
+"""
+
+from ... import log; log = log.getChild(__name__)
+
+from cPickle import dump, load, UnpicklingError
+from hashlib import md5
+from os import access, stat, W_OK
+from os.path import abspath, dirname, exists, join as pjoin
+
+from mcviz.exception import XDG_CACHE_HOME, ensure_cachedir
+from mcviz.utils.timer import Timer; timer = Timer(log, log.VERBOSE)
+from mcviz.utils.trydecompress import is_compressed, is_stream
+
+
+INDEX_SUFFIX = ".mcvizidx"
+INDEX_VERSION = 1
+VCS_DIRECTORIES = (".git", ".hg", ".svn", ".bzr")
+
+class EventIndex(object):
+    """
+    The index of one event file.
+
+    `entries` holds one tuple per event, the first item of which is always
+    the byte offset at which the event starts. The meaning of the other items
+    is up to the loader which built the index, as is the content of `extra`.
+    """
+    def __init__(self, filename, format, entries, extra=None):
+        self.filename = filename
+        self.format = format
+        self.entries = entries
+        self.extra = extra if extra is not None else {}
+        self.size, self.mtime = file_signature(filename)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return "<EventIndex {0} {1} events={2}>".format(self.format,
+                                                        self.filename, len(self))
+
+    def offset(self, event_number):
+        return self.entries[event_number][0]
+
+    @property
+    def fresh(self):
+        return (self.size, self.mtime) == file_signature(self.filename)
+
+    @classmethod
+    def build(cls, filename, format, scanner):
+        """
+        Build an index of `filename` by running `scanner` over it.
+        `scanner(fd)` must return the entries and extra information to store.
+        """
+        with timer('index "{0}"'.format(filename)):
+            with open(filename, "rb") as fd:
+                entries, extra = scanner(fd)
+        log.verbose("indexed {0} events in {1}".format(len(entries), filename))
+        return cls(filename, format, entries, extra)
+
+    @classmethod
+    def read(cls, filename, format):
+        """
+        Return the stored index of `filename`, or None if there is no usable
+        one.
+        """
+        for index_file in index_locations(filename):
+            try:
+                with open(index_file, "rb") as fd:
+                    state = load(fd)
+            except (IOError, EOFError, UnpicklingError):
+                continue
+            if (state.get("version") != INDEX_VERSION or
+                state.get("format") != format):
+                continue
+            index = cls.__new__(cls)
+            index.__dict__.update(state["index"])
+            index.filename = filename
+            if index.fresh:
+                return index
+            log.verbose('index "{0}" is out of date'.format(index_file))
+        return None
+
+    def write(self):
+        """
+        Store the index in the first writable location
+        """
+        state = dict(version=INDEX_VERSION, format=self.format,
+                     index=self.__dict__)
+        for index_file in index_locations(self.filename):
+            try:
+                with open(index_file, "wb") as fd:
+                    dump(state, fd, 2)
+            except IOError:
+                continue
+            log.debug('wrote index "{0}"'.format(index_file))
+            return index_file
+        log.warning('could not write an index for "{0}"'.format(self.filename))
+
+def file_signature(filename):
+    st = stat(filename)
+    return st.st_size, st.st_mtime
+
+def in_checkout(directory):
+    "Whether `directory` is inside a version control checkout"
+    while True:
+        if any(exists(pjoin(directory, vcs)) for vcs in VCS_DIRECTORIES):
+            return True
+        parent = dirname(directory)
+        if parent == directory:
+            return False
+        directory = parent
+
+def index_locations(filename):
+    """
+    The places an index of `filename` is looked for, in order of preference.
+    Next to the input file comes first, unless that would leave a file in a
+    checkout or can't be written.
+    """
+    directory = dirname(abspath(filename))
+    beside = filename + INDEX_SUFFIX
+    ensure_cachedir()
+    key = md5(abspath(filename)).hexdigest()
+    cached = pjoin(XDG_CACHE_HOME, key + INDEX_SUFFIX)
+    if access(directory, W_OK) and not in_checkout(directory):
+        return [beside, cached]
+    return [cached, beside]
+
+def get_index(filename, format, scanner, rebuild=False):
+    """
+    Return an up-to-date index of `filename`, building and storing it if
+    necessary. Returns None for files which can't be seeked into.
+    """
+    if is_stream(filename) or is_compressed(filename):
+        return None
+    index = None if rebuild else EventIndex.read(filename, format)
+    if index is None:
+        index = EventIndex.build(filename, format, scanner)
+        if index.entries:
+            index.write()
+    return index
@@ -1,43 +1,97 @@
 from collections import namedtuple
+from contextlib import closing
 from itertools import izip
-import re
 
 from ... import log; log = log.getChild(__name__)
 
 from mcviz import FatalError
 from mcviz.utils import Units
-from mcviz.utils.trydecompress import try_decompress
+from mcviz.utils.trydecompress import open_decompressed
 from .. import EventParseError, Particle, Vertex
+from . import (parse_event_spec, select_events, indexed_events, make_vertices,
+               event_units, scale_momenta)
+from .index import get_index
 
 
-LHE_TEXT = re.compile("""
-*<LesHouchesEvents version="(?P<version>.*?)">
-.*\s*<init>\s*
-(?P<init>.*?)
-\s*</init>\s*
-(?P<events>.*)
-</LesHouchesEvents>
-*""", re.M | re.DOTALL)
-
-LHE_EVENT = re.compile("""
-*\s*<event>\s*
-(?P<event>.*?)
-\s*</event>\s*
-*""", re.M | re.DOTALL)
-
 # See the following for info on the LHE format:
 # http://arxiv.org/abs/hep-ph/0609017
 # http://arxiv.org/abs/hep-ph/0109068
 
+# Init block has the following format:
+LINIT = namedtuple('LINIT', 'IDBMUP1, IDBMUP2, EBMUP1, EBMUP2, PDFGUP1, PDFGUP2, PDFSUP1, PDFSUP2, IDWTUP, NPRUP')
+
+def sniff(head):
+    "Does `head`, the start of a file, look like a Les Houches event file?"
+    return "<LesHouchesEvents" in head
+
+def read_init(lines):
+    """
+    Consume `lines` up to the end of the <init> block. Returns the parsed
+    first line of the block and all of its lines.
+    """
+    in_document, init_lines = False, None
+    for line in lines:
+        stripped = line.strip()
+        if not in_document:
+            in_document = stripped.startswith("<LesHouchesEvents")
+        elif init_lines is None:
+            if stripped.startswith("<init"):
+                init_lines = []
+        elif stripped.startswith("</init"):
+            break
+        elif stripped:
+            init_lines.append(stripped)
+    else:
+        raise EventParseError("Failed to parse LHE data")
+
+    init = init_lines[0].split()
+    init = [int(i) for i in init[:2] ] + [float(i) for i in init[2:4] ] + [int(i) for i in init[4:10] ] 
+    # Followed by NPRUP lines of processes
+    return LINIT._make(init), init_lines
+
 def event_generator(lines):
     """
-    Yield one event at a time from a LHE file
+    Yield one event at a time from a LHE file, as the list of the lines
+    between its <event> tags
     """
-    eventiter = LHE_EVENT.finditer(lines)
-    
-    for match in eventiter:
-      result = match.groupdict()
-      yield result['event']
+    event = None
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("<event"):
+            event = []
+        elif stripped.startswith("</event"):
+            yield event
+            event = None
+        elif stripped.startswith("</LesHouchesEvents"):
+            break
+        elif event is not None and stripped:
+            event.append(line)
+
+def index_events(fd):
+    """
+    Scan a LHE file and return an index entry for every event,
+    (byte offset, number of particles), plus the parsed init block
+    """
+    def offsets(lines):
+        offset = 0
+        for line in lines:
+            yield offset, line
+            offset += len(line)
+    numbered = offsets(fd)
+    init, init_lines = read_init(line for offset, line in numbered)
+
+    entries, start = [], None
+    for offset, line in numbered:
+        stripped = line.strip()
+        if stripped.startswith("<event"):
+            start = offset
+        elif start is not None and stripped:
+            # The first line of an event starts with the number of particles
+            entries.append((start, int(stripped.split()[0])))
+            start = None
+        elif stripped.startswith("</LesHouchesEvents"):
+            break
+    return entries, dict(init=tuple(init), init_lines=init_lines)
 
 def make_lhe_graph(lines, init, args):
     """
@@ -45,13 +99,14 @@ def make_lhe_graph(lines, init, args):
     """
     # First is an event details line with the number of particle as NUP
     LEVENT = namedtuple('LEVENT', 'NUP, IDPRUP, XWGTUP, SCALUP, AQEDUP, AQCDUP')
-    line = lines.pop(0).split()
+    line = lines[0].split()
     line = [int(i) for i in line[:2] ] + [float(i) for i in line[2:6] ]
     event = LEVENT._make(line)
 
-    # Now add the initial beam particles to this event
-    lines.insert(0, "%s -1 0 0 0 0 0 0 %s %s 0 0 9" %(init.IDBMUP1, init.EBMUP1, init.EBMUP1) )
-    lines.insert(1, "%s -1 0 0 0 0 0 0 %s %s 0 0 9" %(init.IDBMUP2, init.EBMUP2, init.EBMUP2) )
+    # Now add the initial beam particles to this event. The lines are copied,
+    # so that the event read can be made again.
+    lines = ["%s -1 0 0 0 0 0 0 %s %s 0 0 9" %(init.IDBMUP1, init.EBMUP1, init.EBMUP1),
+             "%s -1 0 0 0 0 0 0 %s %s 0 0 9" %(init.IDBMUP2, init.EBMUP2, init.EBMUP2)] + lines[1:]
 
     # Particles have the format:
     LPARTICLE = namedtuple('LPARTICLE', 'IDUP, ISTUP, MOTHUP1, MOTHUP2, ICOLUP1, ICOLUP2, PUP1, PUP2, PUP3, PUP4, PUP5, VTIMUP, SPINUP')
@@ -95,38 +150,7 @@ def make_lhe_graph(lines, init, args):
         particle.mothers.discard(particle)
         particle.daughters.discard(particle)
 
-    # TODO: Johannes: Please explain!
-    vertex_dict = dict()
-    vno = 0
-    for particle in particles:
-        found_v = None
-        if frozenset(particle.mothers) in vertex_dict:
-            found_v = vertex_dict[frozenset(particle.mothers)]
-        else:
-            for v in vertex_dict.itervalues():
-                for m in particle.mothers:
-                    if m in v.incoming:
-                        found_v = v
-                        #print >> stderr, map(lambda x: x.no, v.incoming), map(lambda x: x.no, particle.mothers)
-                        break
-                if found_v:
-                    break
-
-        if found_v:
-            found_v.outgoing.add(particle)
-
-            for new_mother in found_v.incoming:
-                particle.mothers.add(new_mother)
-                new_mother.daughters.add(particle)
-        elif particle.mothers:
-            vno += 1
-            vertex_dict[frozenset(particle.mothers)] = Vertex(vno, particle.mothers, [particle])
-            if len(particle.mothers) == 0:
-                # this is the system vertex
-                log.error("particle %s has no mothers: %s", particle.no, particle)
-        else: # initial state vertex
-            vno += 1
-            vertex_dict[particle] = Vertex(vno, [], [particle])
+    vertex_dict, vno = make_vertices(particles)
 
     initial_particles = []
     for particle in particles:
@@ -168,46 +192,70 @@ def make_lhe_graph(lines, init, args):
 
     return vertex_dict, particle_dict, units
     
-def load_event(args):
+def build_index(filename):
     """
-    Load one event from a LHE file
+    (Re)build the index of a LHE file
     """
-    filename, _, event_number = args.filename.partition(":")
-    
-    if event_number:
-        try:
-            event_number = int(event_number)
-        except ValueError:
-            log.fatal("Failed to convert filename part to an integer. Filename "
-                      "should have the form 'string[:int(event number)]'")
-            raise FatalError()
+    return get_index(filename, "lhe", index_events, rebuild=True)
+
+def read_events(filename, event_numbers):
+    """
+    Yield (event number, (init block, lines of the event)) for
+    `event_numbers`, or all events if it is None, reading through the file
+    only once
+    """
+    index = get_index(filename, "lhe", index_events)
+    if index is None:
+        with closing(open_decompressed(filename)) as fd:
+            init, init_lines = read_init(fd)
+            log_init(init_lines)
+            events = select_events(event_generator(fd), event_numbers, filename)
+            for event_number, event in events:
+                yield event_number, (init, event)
     else:
-        event_number = 0
-    
-    with open(filename) as fd:
-        data = try_decompress(fd.read())
-        match = LHE_TEXT.search(data)
-    
-    if not match:
-        raise EventParseError("Failed to parse LHE data")
+        # The init block comes from the index, only the events are read
+        init = LINIT._make(index.extra["init"])
+        log_init(index.extra["init_lines"])
+        with open(filename, "rb") as fd:
+            for event_number, offset in indexed_events(index, event_numbers):
+                fd.seek(offset)
+                yield event_number, (init, next(event_generator(fd)))
 
-    result = match.groupdict()
-    
-    # Init block has the following format:
-    LINIT = namedtuple('LINIT', 'IDBMUP1, IDBMUP2, EBMUP1, EBMUP2, PDFGUP1, PDFGUP2, PDFSUP1, PDFSUP2, IDWTUP, NPRUP')
-    init = result['init'].splitlines()[0].split()
-    init = [int(i) for i in init[:2] ] + [float(i) for i in init[2:4] ] + [int(i) for i in init[4:10] ] 
-    init = LINIT._make(init)
-    # Followed by NPRUP lines of processes
+def log_init(init_lines):
     log.verbose("LHE init block:")
-    for line in result['init'].splitlines():
-        log.verbose(line.strip())
+    for line in init_lines:
+        log.verbose(line)
 
-    for i, event in izip(xrange(event_number+1), event_generator(result['events']) ):
-        # Load only one event
-        pass
+def summary_columns(event, args):
+    """
+    The pdgids and x and y momenta in GeV of the particles of an event, as
+    yielded by read_events, including the beams, without parsing the rest of
+    it
+    """
+    init, lines = event
+    n_particles = int(lines[0].split()[0])
+    # Mothers and colours sometimes run together, so the momenta are counted
+    # from the end
+    fields = [line.split() for line in lines[1:n_particles+1]]
+    px, py = scale_momenta([0., 0.] + [float(f[-7]) for f in fields],
+                           [0., 0.] + [float(f[-6]) for f in fields],
+                           event_units(args))
+    return [init.IDBMUP1, init.IDBMUP2] + [int(f[0]) for f in fields], px, py
+
+def make_event(event, args):
+    """
+    Make an event from the init block and lines yielded by read_events
+    """
+    init, lines = event
+    return make_lhe_graph(lines, init, args)
 
-    return make_lhe_graph(event.splitlines(), init, args)
+def load_event(args):
+    """
+    Load one event from a LHE file
+    """
+    filename, event_numbers = parse_event_spec(args.filename)
+    event_number, event = next(read_events(filename, event_numbers))
+    return make_event(event, args)
     
 if __name__ == "__main__":
     from IPython.Shell import IPShellEmbed; ip = IPShellEmbed(["-pdb"])
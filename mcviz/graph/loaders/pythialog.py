@@ -4,9 +4,14 @@ This whole module is begging for a refactor, but by some miracle it works.
 
 from ... import log; log = log.getChild(__name__)
 
+from contextlib import closing
+
+from mcviz import FatalError
 from mcviz.utils import Units
-from mcviz.utils.trydecompress import try_decompress
+from mcviz.utils.trydecompress import open_decompressed
 from .. import EventParseError, Particle, Vertex
+from . import parse_event_spec, too_few_events, indexed_events, make_vertices
+from .index import get_index
 
 # Pythia status codes:
 # (taken from http://hep.ps.uci.edu/~arajaram/worksheet.pdf)
@@ -31,6 +36,53 @@ START_HARD = ("--------  PYTHIA Event Listing  (hard process)  -------------"
     "----------------------------------------------------------------------")
 END_LIST = ("--------  End PYTHIA Event Listing  -----------------------------"
     "------------------------------------------------------------------")
+
+# If a log contains several kinds of listing, the first kind found here is drawn
+HEADERS = (START_COMPLETE, START_COMBINED, START_HARD)
+
+def sniff(head):
+    "Does `head`, the start of a file, look like a pythia log?"
+    return "PYTHIA Event Listing" in head or "Lund Monte Carlo" in head
+
+def listings(lines):
+    """
+    Yield (byte offset, header) for each PYTHIA Event Listing in a log
+    """
+    offset = 0
+    for line in lines:
+        if "PYTHIA Event Listing" in line:
+            header = line.strip()
+            if header in HEADERS:
+                yield offset, header
+        offset += len(line)
+
+def read_listing(lines):
+    """
+    Consume `lines` following a listing header up to the end of the listing,
+    returning the lines of the particle records
+    """
+    records = []
+    for line in lines:
+        line = line.strip()
+        if line == END_LIST:
+            break
+        elif line:
+            records.append(line)
+    # The first line holds the column titles, the last one the charge sum
+    return records[1:-1]
+
+def index_events(fd):
+    """
+    Scan a pythia log and return an index entry, (byte offset,), for every
+    listing of the kind which would be drawn from it
+    """
+    by_header = {}
+    for offset, header in listings(fd):
+        by_header.setdefault(header, []).append((offset,))
+    for header in HEADERS:
+        if header in by_header:
+            return by_header[header], dict(header=header)
+    return [], {}
     
 def make_pythia_graph(records):
     # Make particle objects and {no:Particle} dictionary
@@ -56,37 +108,7 @@ def make_pythia_graph(records):
         particle.mothers.discard(particle)
         particle.daughters.discard(particle)
 
-    # TODO: Johannes: Please explain!
-    vertex_dict = dict()
-    vno = 0
-    for particle in particles:
-        found_v = None
-        if frozenset(particle.mothers) in vertex_dict:
-            found_v = vertex_dict[frozenset(particle.mothers)]
-        else:
-            for v in vertex_dict.itervalues():
-                for m in particle.mothers:
-                    if m in v.incoming:
-                        found_v = v
-                        #print >> stderr, map(lambda x: x.no, v.incoming), map(lambda x: x.no, particle.mothers)
-                        break
-                if found_v:
-                    break
-
-        if found_v:
-            found_v.outgoing.add(particle)
-            for new_mother in found_v.incoming:
-                particle.mothers.add(new_mother)
-                new_mother.daughters.add(particle)
-        elif particle.mothers:
-            vno += 1
-            vertex_dict[frozenset(particle.mothers)] = Vertex(vno, particle.mothers, [particle])
-            if len(particle.mothers) == 0:
-                # this is the system vertex
-                log.error("particle %s has no mothers: %s", particle.no, particle)
-        else: # initial state vertex
-            vno += 1
-            vertex_dict[particle] = Vertex(vno, [], [particle])
+    vertex_dict, vno = make_vertices(particles)
 
     initial_particles = []
     for particle in particles:
@@ -118,52 +140,101 @@ def make_pythia_graph(records):
     
     return vertex_dict, particle_dict, Units()
 
-def load_event(args):
+def build_index(filename):
     """
-    Parse a pythia event record from a log file.
-    Numbers are converted to floats where possible.
+    (Re)build the index of a pythia log
     """
+    return get_index(filename, "pythia", index_events, rebuild=True)
 
-    filename, _, event_number = args.filename.partition(":")
-    if event_number:
-        try:
-            event_number = int(event_number)
-        except ValueError:
-            log.fatal("Failed to convert filename part to an integer. Filename "
-                      "should have the form 'string[:int(event number)]'")
-            raise FatalError()
-    else:
-        event_number = 0
-
-    with open(filename) as fd:
-        lines = try_decompress(fd.read()).split("\n")
-        lines = [line for line in (line.strip() for line in lines) if line]
-
-    header = None
-    if START_COMPLETE in lines:
-        header = START_COMPLETE
-    elif START_COMBINED in lines:
-        header = START_COMBINED
-    elif START_HARD in lines:
-        header = START_HARD
+def stream_listings(filename, event_numbers):
+    """
+    Stream through a (compressed) log, yielding (event number, listing lines)
+    for `event_numbers`, or for all listings if it is None.
+
+    Complete listings are yielded as they are read. Listings of other kinds are
+    only kept until it is clear that the log has no complete listings.
+    """
+    wanted = set(event_numbers) if event_numbers is not None else None
+    seen = dict((header, 0) for header in HEADERS)
+    kept = dict((header, []) for header in HEADERS)
+    with closing(open_decompressed(filename)) as fd:
+        for line in fd:
+            header = line.strip()
+            if header not in seen:
+                continue
+            event_number = seen[header]
+            seen[header] += 1
+            if wanted is not None and event_number not in wanted:
+                continue
+            if header == START_COMPLETE:
+                yield event_number, read_listing(fd)
+                if event_numbers and event_number == event_numbers[-1]:
+                    return
+            elif not seen[START_COMPLETE]:
+                kept[header].append((event_number, read_listing(fd)))
+
+    for header in HEADERS:
+        if seen[header]:
+            break
     else:
         raise EventParseError("Failed to read pythia log file: "
                                "no complete event listing found")
+    for item in kept[header]:
+        yield item
+    too_few_events(filename, event_numbers, seen[header])
 
-    first = 0
-    for i in range(event_number+1):
-        first = lines.index(header, first) + 2
-    last = first + lines[first:].index(END_LIST) - 1
-
-    def maybe_num(s):
-        try: return float(s)
-        except ValueError:
-            return s
+def read_events(filename, event_numbers):
+    """
+    Yield (event number, listing lines) for `event_numbers`, or all events if
+    it is None
+    """
+    index = get_index(filename, "pythia", index_events)
+    if index is None:
+        for item in stream_listings(filename, event_numbers):
+            yield item
+    elif not index:
+        raise EventParseError("Failed to read pythia log file: "
+                               "no complete event listing found")
+    else:
+        with open(filename, "rb") as fd:
+            for event_number, offset in indexed_events(index, event_numbers):
+                fd.seek(offset)
+                fd.readline()
+                yield event_number, read_listing(fd)
+
+def maybe_num(s):
+    try: return float(s)
+    except ValueError:
+        return s
+
+def summary_columns(lines, args):
+    """
+    The pdgids and x and y momenta in GeV of the particles of an event, as
+    yielded by read_events, without parsing the rest of it. Pythia logs are
+    always in GeV.
+    """
+    fields = [line.split() for line in lines]
+    # The name may be missing, so the momenta are counted from the end
+    fields = [f for f in fields if f[0] != "0"]
+    return ([int(f[1]) for f in fields], [float(f[-5]) for f in fields],
+            [float(f[-4]) for f in fields])
 
-    records = [map(maybe_num, line.split()) for line in lines[first:last]]
+def make_event(lines, args):
+    """
+    Make an event from the listing lines yielded by read_events.
+    Numbers are converted to floats where possible.
+    """
+    records = [map(maybe_num, line.split()) for line in lines]
     # insert blank name if name is not specified
     for particle in records:
         if len(particle) == 14: 
             particle.insert(2,"")
-            
     return make_pythia_graph(records)
+
+def load_event(args):
+    """
+    Parse a pythia event record from a log file.
+    """
+    filename, event_numbers = parse_event_spec(args.filename)
+    event_number, event = next(read_events(filename, event_numbers))
+    return make_event(event, args)
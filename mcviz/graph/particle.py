@@ -7,16 +7,25 @@ class Particle(object):
         self.p = px, py, pz
         self.e = e
         self.m = m
-        self.pt = (px**2 + py**2)**0.5
-        self.eta = -ln(tan(atan2(self.pt, pz)/2.)) if self.pt else +999
-        self.phi = atan2(px, py)
-        self.e = e
-        self.m = m
         self.other_flow = {}
         
         self.vertex_in = None
         self.vertex_out = None
         
+    # The kinematics of all particles are in EventGraph.kinematics, these are
+    # only worked out for the odd particle which is asked for them
+    @property
+    def pt(self):
+        return (self.p[0]**2 + self.p[1]**2)**0.5
+
+    @property
+    def eta(self):
+        return -ln(tan(atan2(self.pt, self.p[2])/2.)) if self.pt else +999
+
+    @property
+    def phi(self):
+        return atan2(self.p[0], self.p[1])
+        
     @classmethod
     def from_pythia(cls, record):
         (no, pdgid, name, status, mother1, mother2, daughter1, daughter2, 
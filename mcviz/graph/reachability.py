@@ -0,0 +1,132 @@
+"""
+Which objects of a GraphView can be reached from which.
+
+A Reachability is made from the topology of a view at one time, and is
+remade by GraphView.reachability when the topology changes. The descendants
+and ancestors of an object are found with one breadth first search the first
+time they are asked for, after which testing whether an object is among them
+takes constant time.
+"""
+
+from collections import deque
+
+class Reachability(object):
+    """
+    The reachability of the particles and vertices of `graph_view`, going
+    from vertices to the particles coming out of them and from particles to
+    the vertex they end in
+    """
+    def __init__(self, graph_view):
+        self.nodes = list(graph_view.particles) + list(graph_view.vertices)
+        self.index = index = dict((node, i) for i, node in enumerate(self.nodes))
+        self.initial = list(graph_view.initial_particles)
+
+        self.children = children = [[] for node in self.nodes]
+        self.parents = parents = [[] for node in self.nodes]
+        for i, node in enumerate(self.nodes):
+            if hasattr(node, "outgoing"):
+                next_nodes = node.outgoing
+            else:
+                next_nodes = (node.end_vertex,)
+            for next_node in next_nodes:
+                j = index.get(next_node)
+                if j is not None:
+                    children[i].append(j)
+                    parents[j].append(i)
+
+        self._descendants, self._ancestors = {}, {}
+        self._depth = self.distances([i for i, p in enumerate(parents) if not p])
+
+    def distances(self, sources):
+        """
+        The number of steps from the nearest of `sources` to every node, as a
+        list by node index. Nodes not reachable from any of them (those in
+        loops with no way in) are counted from the first of them in order.
+        """
+        depth = [None] * len(self.nodes)
+        children = self.children
+
+        def search(starts):
+            for i in starts:
+                depth[i] = 0
+            queue = deque(starts)
+            while queue:
+                i = queue.popleft()
+                for j in children[i]:
+                    if depth[j] is None:
+                        depth[j] = depth[i] + 1
+                        queue.append(j)
+
+        search(sources)
+        for i in xrange(len(self.nodes)):
+            if depth[i] is None:
+                search([i])
+        return depth
+
+    def search(self, sources, ascend=False, max_depth=None):
+        """
+        Breadth first search from all of the nodes `sources` (indices) at
+        once, going to the children of each node, or to its parents if
+        `ascend`. Returns {node index: number of steps from the nearest
+        source} for every node reached, including the sources, going no
+        further than `max_depth` steps if it is given.
+        """
+        edges = self.parents if ascend else self.children
+        depth = dict((i, 0) for i in sources)
+        queue = deque(depth)
+        while queue:
+            i = queue.popleft()
+            next_depth = depth[i] + 1
+            if max_depth is not None and next_depth > max_depth:
+                continue
+            for j in edges[i]:
+                if j not in depth:
+                    depth[j] = next_depth
+                    queue.append(j)
+        return depth
+
+    def reachable(self, i, edges, cache):
+        "The indices of the nodes reachable from node `i` along `edges`"
+        found = cache.get(i)
+        if found is None:
+            found = set()
+            queue = deque(edges[i])
+            while queue:
+                j = queue.popleft()
+                if j not in found:
+                    found.add(j)
+                    queue.extend(edges[j])
+            cache[i] = found
+        return found
+
+    def descendant_indices(self, obj):
+        return self.reachable(self.index[obj], self.children, self._descendants)
+
+    def ancestor_indices(self, obj):
+        return self.reachable(self.index[obj], self.parents, self._ancestors)
+
+    def descendants(self, obj):
+        "All objects which come after `obj`, including itself if it's in a loop"
+        nodes = self.nodes
+        return set(nodes[i] for i in self.descendant_indices(obj))
+
+    def ancestors(self, obj):
+        "All objects which come before `obj`, including itself if it's in a loop"
+        nodes = self.nodes
+        return set(nodes[i] for i in self.ancestor_indices(obj))
+
+    def is_ancestor(self, ancestor, obj):
+        "Does `obj` come after `ancestor`?"
+        return self.index[obj] in self.descendant_indices(ancestor)
+
+    def reaches(self, ancestor, obj):
+        "Is `obj` either `ancestor` or one of its descendants?"
+        return obj is ancestor or self.is_ancestor(ancestor, obj)
+
+    def depth(self, obj):
+        "The number of steps from the nearest object with nothing before it"
+        return self._depth[self.index[obj]]
+
+    @property
+    def max_depth(self):
+        return max(self._depth or [0])
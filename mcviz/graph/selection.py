@@ -0,0 +1,75 @@
+"""
+Selection of events with --select, before they are parsed.
+
+A selection is a python expression such as
+
+    has_pdgid(6) and n_particles > 500
+    max_pt(11, 13) > 20
+
+evaluated on the species and transverse momenta of the particles of each
+event, which every loader can pick out of a raw event much more cheaply than
+making an EventGraph of it. The names it can use are:
+
+    n_particles     the number of particles in the event
+    has_pdgid(*ids) whether there are particles of any of the species `ids`
+    count(*ids)     the number of particles of the species `ids`
+    max_pt(*ids)    the highest pt in GeV of the particles of the species
+                    `ids`, or of all particles if none are given, 0 if there
+                    are none
+
+Particles of species -id are counted as species id. The loaders give the
+momenta in GeV whatever the units of the event, as its Kinematics has them.
+"""
+
+from .. import log; log = log.getChild(__name__)
+
+from mcviz.exception import FatalError
+
+BUILTINS = dict(abs=abs, min=min, max=max, len=len)
+
+class EventSelection(object):
+    """
+    A compiled --select expression. Call it with the pdgids and x and y
+    momenta in GeV of the particles of an event to know if the event is
+    selected.
+    """
+    def __init__(self, expression):
+        self.expression = expression
+        try:
+            self.code = compile(expression, "--select", "eval")
+        except SyntaxError, e:
+            log.fatal("Invalid --select expression {0!r}: {1}".format(expression, e.msg))
+            raise FatalError
+
+    def __call__(self, pdgids, px, py):
+        namespace = dict(BUILTINS, **event_functions(pdgids, px, py))
+        try:
+            return bool(eval(self.code, {"__builtins__": {}}, namespace))
+        except Exception, e:
+            log.fatal("Could not evaluate --select {0!r}: {1}".format(self.expression, e))
+            raise FatalError
+
+    def __repr__(self):
+        return "<EventSelection {0!r}>".format(self.expression)
+
+def event_functions(pdgids, px, py):
+    """
+    The names a selection can use, for an event with particles of species
+    `pdgids` and momenta `px`, `py` in GeV
+    """
+    def species(ids):
+        ids = set(abs(int(pdgid)) for pdgid in ids)
+        return [i for i, pdgid in enumerate(pdgids) if abs(pdgid) in ids]
+
+    def has_pdgid(*ids):
+        return bool(species(ids))
+
+    def count(*ids):
+        return len(species(ids))
+
+    def max_pt(*ids):
+        particles = species(ids) if ids else xrange(len(pdgids))
+        return max([(px[i]**2 + py[i]**2)**0.5 for i in particles] or [0.])
+
+    return dict(n_particles=len(pdgids), has_pdgid=has_pdgid, count=count,
+                max_pt=max_pt)
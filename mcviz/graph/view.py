@@ -3,6 +3,7 @@ from mcviz.utils import OrderedSet
 from .view_object import ViewObject, Summary
 from .view_particle import ViewParticle, ViewParticleSingle, ViewParticleSummary
 from .view_vertex import ViewVertex, ViewVertexSingle, ViewVertexSummary
+from .reachability import Reachability
 from .walk import walk
 
 class GraphView(object):
@@ -12,6 +13,8 @@ class GraphView(object):
 
         # create central maps (define structure)
         self.v_map, self.p_map = {}, {}
+        # Bumped whenever p_map or v_map change, see materialized()
+        self.topology_version = 0
         for v in event_graph.vertices.keys():
             ViewVertexSingle(self, v)
         for p in event_graph.particles.keys():
@@ -47,6 +50,34 @@ class GraphView(object):
             if not self._incoming[nr]:
                 self._initial_particles.extend(self._outgoing[nr])
 
+        # View objects adjacent to each vertex, and all of them
+        self._incoming_view, self._outgoing_view, self._views = {}, {}, {}
+
+    def topology_changed(self):
+        """
+        Must be called whenever p_map or v_map are changed, so that no stale
+        adjacency is used
+        """
+        self.topology_version += 1
+
+    def materialized(self, cache, key, numbers, to_objects):
+        """
+        Return `to_objects(numbers)`, which is remembered in `cache` under
+        `key` until the topology of the view changes. The sets returned are
+        shared, so must not be modified.
+        """
+        entry = cache.get(key)
+        if entry is not None and entry[0] == self.topology_version:
+            return entry[1]
+        objects = to_objects(numbers)
+        cache[key] = self.topology_version, objects
+        return objects
+
+    def contains(self, obj):
+        "Is the view object `obj` still part of this view?"
+        view_map = self.p_map if isinstance(obj, ViewParticle) else self.v_map
+        return view_map.get(obj.order_number) is obj
+
     def numbers_to_particles(self, numbers):
         return OrderedSet(p for p in (self.p_map[nr] for nr in numbers) if p)
 
@@ -62,40 +93,76 @@ class GraphView(object):
         return None if end_vertex is None else self.v_map[end_vertex]
 
     def vertex_incoming_particles(self, vertex_number):
-        return self.numbers_to_particles(self._incoming[vertex_number])
+        return self.materialized(self._incoming_view, vertex_number,
+            self._incoming[vertex_number], self.numbers_to_particles)
 
     def vertex_outgoing_particles(self, vertex_number):
-        return self.numbers_to_particles(self._outgoing[vertex_number])
+        return self.materialized(self._outgoing_view, vertex_number,
+            self._outgoing[vertex_number], self.numbers_to_particles)
 
     @property
     def vertices(self):
-        return self.numbers_to_vertices(self._vertices)
+        return self.materialized(self._views, "vertices", self._vertices,
+                                 self.numbers_to_vertices)
 
     @property
     def particles(self):
-        return self.numbers_to_particles(self._particles)
+        return self.materialized(self._views, "particles", self._particles,
+                                 self.numbers_to_particles)
 
     @property
     def initial_particles(self):
-        return self.numbers_to_particles(self._initial_particles)
+        return self.materialized(self._views, "initial_particles",
+            self._initial_particles, self.numbers_to_particles)
 
     def summarize_particles(self, particles):
-        elementary_particles = []
-        for p in particles:
-            if isinstance(p, ViewParticleSummary):
-                elementary_particles.extend(p.particle_numbers)
-            else:
-                elementary_particles.append(p.particle_number)
-        return ViewParticleSummary(self, elementary_particles)
+        _, (summary,) = self.summarize_groups(particle_groups=[particles])
+        return summary
 
     def summarize_vertices(self, vertices):
-        elementary_vertices = []
-        for p in vertices:
-            if isinstance(p, ViewVertexSummary):
-                elementary_vertices.extend(p.vertex_numbers)
-            else:
-                elementary_vertices.append(p.vertex_number)
-        return ViewVertexSummary(self, elementary_vertices)
+        (summary,), _ = self.summarize_groups(vertex_groups=[vertices])
+        return summary
+
+    def summarize_groups(self, vertex_groups=(), particle_groups=()):
+        """
+        Summarize disjoint groups of vertices and of particles, which must all
+        have been found before calling this. The summaries are put in the maps
+        in one pass and the topology changes once. The vertices are summarized
+        first, so that the start and end vertex of each particle summary are
+        already known. Returns the lists of vertex and particle summaries.
+        """
+        vertex_summaries = [ViewVertexSummary(self, self.elementary_numbers(group))
+                            for group in vertex_groups]
+        for summary in vertex_summaries:
+            summary.orig_v_map = self.remap(self.v_map, summary.vertex_numbers, summary)
+            summary.orig_p_map = self.remap(self.p_map,
+                summary.internal_particle_numbers, None)
+
+        particle_summaries = [ViewParticleSummary(self, self.elementary_numbers(group))
+                              for group in particle_groups]
+        for summary in particle_summaries:
+            summary.orig_p_map = self.remap(self.p_map, summary.particle_numbers, summary)
+        # The ends are found once every particle is mapped to its summary
+        for summary in particle_summaries:
+            summary.orig_v_map = self.remap(self.v_map, summary.attach(), None)
+
+        self.topology_changed()
+        return vertex_summaries, particle_summaries
+
+    def elementary_numbers(self, objects):
+        "The numbers of the event particles or vertices behind view `objects`"
+        return [nr for obj in objects for nr in obj.represented_numbers]
+
+    def remap(self, view_map, numbers, obj):
+        """
+        Map `numbers` to `obj` in `view_map`, which is p_map or v_map. Returns
+        what they were mapped to before.
+        """
+        before = {}
+        for nr in numbers:
+            before[nr] = view_map[nr]
+            view_map[nr] = obj
+        return before
 
     def drop(self, obj):
         """
@@ -106,6 +173,7 @@ class GraphView(object):
         if isinstance(obj, ViewParticle):
             for pn in obj.represented_numbers:
                 self.p_map[pn] = None
+            self.topology_changed()
             
             if obj.start_vertex and obj.start_vertex.dangling:
                 self.drop(obj.start_vertex)
@@ -115,10 +183,35 @@ class GraphView(object):
         elif isinstance(obj, ViewVertex):
             for vn in obj.represented_numbers:
                 self.v_map[vn] = None
+            self.topology_changed()
             
             for particle in obj.through:
                 self.drop(particle)
 
+    def drop_all(self, objs):
+        """
+        Remove many view{particle,vertex}s from the graph at once, with the
+        same result as calling drop on each of them.
+        """
+        particles = [obj for obj in objs if isinstance(obj, ViewParticle)]
+        vertices = [obj for obj in objs if isinstance(obj, ViewVertex)]
+        for vertex in vertices:
+            particles.extend(vertex.through)
+
+        for obj in particles:
+            for pn in obj.represented_numbers:
+                self.p_map[pn] = None
+        for obj in vertices:
+            for vn in obj.represented_numbers:
+                self.v_map[vn] = None
+        self.topology_changed()
+
+        for obj in particles:
+            if obj.start_vertex and obj.start_vertex.dangling:
+                self.drop(obj.start_vertex)
+            if obj.end_vertex and obj.end_vertex.dangling:
+                self.drop(obj.end_vertex)
+
     def walk(self, obj, 
         particle_action=lambda p, d: None, vertex_action=lambda p, d: None,
         loop_action=lambda p, d: None, ascend=False):
@@ -163,20 +256,32 @@ class GraphView(object):
         
         return Store.result
         
+    @property
+    def reachability(self):
+        """
+        Which objects can be reached from which, see Reachability. It is
+        remade when the topology changes.
+        """
+        return self.materialized(self._views, "reachability", self, Reachability)
+
+    def distances(self, sources, ascend=False, max_depth=None):
+        """
+        Search from all of the view objects `sources` at once, down the graph
+        or up it if `ascend`. Returns {view object: number of steps from the
+        nearest source} for the objects at most `max_depth` steps away.
+        """
+        reachability = self.reachability
+        index, nodes = reachability.index, reachability.nodes
+        found = reachability.search([index[obj] for obj in sources], ascend, max_depth)
+        return dict((nodes[i], depth) for i, depth in found.iteritems())
+
     @property
     def depth(self):
         """
         Returns the maximum depth of the graph, and sets .depth attributes on 
         all of the particles.
         """
-        class Store:
-            maxdepth = 0
-            
-        def walker(particle, depth):
-            particle.depth = depth
-            Store.maxdepth = max(depth, Store.maxdepth)
-        
-        for particle in self.initial_particles:
-            self.walk_descendants(particle, walker)
-        
-        return Store.maxdepth
+        reachability = self.reachability
+        for particle in self.particles:
+            particle.depth = reachability.depth(particle)
+        return reachability.max_depth
@@ -3,6 +3,7 @@ class Summary(object):
     def undo_summary(self):
         self.graph.p_map.update(self.orig_p_map)
         self.graph.v_map.update(self.orig_v_map)
+        self.graph.topology_changed()
 
 class ViewObject(object):
     """
@@ -1,5 +1,8 @@
 from itertools import chain
-from math import log, atan2, tan
+from math import log, atan2, sqrt, tan
+
+from mcviz.utils.particledata import (classify, INVISIBLE, GLUON, GLUINO,
+    PHOTON, BOSON, QUARK, SQUARK, LEPTON, SLEPTON, CHARGINO)
 
 from .view_object import ViewObject, Summary
 
@@ -39,55 +42,74 @@ class ViewParticle(ViewObject):
         except ValueError:       # catch pt == 0
             return float("inf") * self.p[2]
 
+    @property
+    def rapidity(self):
+        e, pz = self.e, self.p[2]
+        if e > abs(pz):
+            return 0.5 * log((e + pz) / (e - pz))
+        return float("inf") * pz
+
+    @property
+    def mass(self):
+        "The invariant mass of the four-momentum"
+        m2 = self.e**2 - self.pt**2 - self.p[2]**2
+        return sqrt(m2) if m2 >= 0 else -sqrt(-m2)
+
+    @property
+    def classification(self):
+        return classify(int(self.pdgid))
+
+    @property
+    def charge(self):
+        return self.classification.charge
+
+    @property
+    def spin(self):
+        return self.classification.spin
+
     @property
     def colored(self):
         return self.color or self.anticolor
 
     @property
     def invisible(self):
-        return abs(self.pdgid) in [12, 14, 16, 18, 25, 35, 36, 39,
-                               1000039, 1000012, 1000014, 1000016,
-                               1000022, 1000023, 1000025, 1000035]
+        return self.flags & INVISIBLE != 0
 
     @property
     def gluon(self):
-        return self.pdgid == 21
+        return self.flags & GLUON != 0
 
     @property
     def gluino(self):
-        return self.pdgid == 1000021
+        return self.flags & GLUINO != 0
 
     @property
     def photon(self):
-        return self.pdgid == 22
+        return self.flags & PHOTON != 0
 
     @property
     def boson(self):
-        return (21 <= abs(self.pdgid) <= 25 or
-                32 <= abs(self.pdgid) <= 37 or
-                self.pdgid in [39, 5000039])
+        return self.flags & BOSON != 0
 
     @property
     def quark(self):
-        return 1 <= abs(self.pdgid) <= 8
+        return self.flags & QUARK != 0
 
     @property
     def squark(self):
-        return (1000001 <= abs(self.pdgid) <= 1000006 or
-                2000001 <= abs(self.pdgid) <= 2000006)
+        return self.flags & SQUARK != 0
     
     @property
     def lepton(self):
-        return 11 <= abs(self.pdgid) <= 18
+        return self.flags & LEPTON != 0
 
     @property
     def slepton(self):
-        return (1000011 <= abs(self.pdgid) <= 1000016 or
-                2000011 <= abs(self.pdgid) <= 2000016)
+        return self.flags & SLEPTON != 0
 
     @property
     def chargino(self):
-        return abs(self.pdgid) in [1000024, 1000037]
+        return self.flags & CHARGINO != 0
         
     @property
     def descends_both(self):
@@ -100,7 +122,9 @@ class ViewParticle(ViewObject):
         
     def descends(self, n):
         assert n == 1 or n == 2, "Only supported for initial particles"
-        return "descendant_of_p%i" % n in self.tags
+        reachability = self.graph.reachability
+        initial = reachability.initial
+        return len(initial) >= n and reachability.reaches(initial[n-1], self)
 
     @property
     def reference(self):
@@ -108,6 +132,12 @@ class ViewParticle(ViewObject):
         #return ref.replace("-","N") # replace for negative particle nr
         return "P{0}".format(self.order_number)
 
+def kinematic(name):
+    "A property reading a particle's entry in the event's kinematics arrays"
+    def get(self):
+        return getattr(self.kinematics, name)[self.kinematics_index]
+    return property(get)
+
 class ViewParticleSingle(ViewParticle):
     """
     Represents a view of a single particle
@@ -125,6 +155,9 @@ class ViewParticleSingle(ViewParticle):
         self.color = self.event_particle.color
         self.anticolor = self.event_particle.anticolor
         self.status = self.event_particle.status
+        self.kinematics = self.graph.event.kinematics
+        self.kinematics_index = self.kinematics.index[particle_number]
+        self.flags = self.kinematics.flags[self.kinematics_index]
         
         if not self.colored and self.quark:
             self.color = not self.antiparticle
@@ -134,6 +167,14 @@ class ViewParticleSingle(ViewParticle):
         return "<ViewParticleSingle pdgid={0} ref='{1}'>"\
             .format(self.pdgid, self.reference)
     
+    # Computed for all particles when the event was loaded
+    pt = kinematic("pt")
+    eta = kinematic("eta")
+    phi = kinematic("phi")
+    rapidity = kinematic("rapidity")
+    mass = kinematic("mass")
+    charge = kinematic("charge")
+
     @property
     def start_vertex(self):
         return self.graph.particle_start_vertex(self.particle_number)
@@ -164,12 +205,16 @@ class ViewParticleSummary(ViewParticle, Summary):
         
         # For storing information before we did the summary (so we can invert it)
         self.orig_p_map, self.orig_v_map = {}, {}
-
-        # represent all particles
-        for p in self.particle_numbers:
-            self.orig_p_map[p] = self.graph.p_map[p]
-            self.graph.p_map[p] = self
-
+        self._views = {}
+
+    def attach(self):
+        """
+        Find the start and end vertex of the summary and its quantities, once
+        its particles are mapped to it by GraphView.summarize_groups. Returns
+        the numbers of the vertices inside the summary, which leave the view.
+        Only the maps are read, as the topology has not been marked changed.
+        """
+        p_map = self.graph.p_map
         start_vnrs = (self.graph._start_vertex[p_nr] for p_nr in self.particle_numbers)
         end_vnrs = (self.graph._end_vertex[p_nr] for p_nr in self.particle_numbers)
         
@@ -178,18 +223,17 @@ class ViewParticleSummary(ViewParticle, Summary):
         
         # internal vertex := vertex that has no non-summarized incoming and outgoings
         #                    AND is not final or initial
+        me = set((self,))
+        def only_me(particle_numbers):
+            return set(p_map[nr] for nr in particle_numbers) - set((None,)) == me
+
         def is_internal(vertex):
-            me = set((self,))
-            return (me == set(vertex.outgoing)) and (me == set(vertex.incoming))
+            return (only_me(vertex.outgoing_numbers) and
+                    only_me(vertex.incoming_numbers))
 
         internal_vertices = [vn for vn in start_vertices & end_vertices if is_internal(vn)]
         start_vertices.difference_update(internal_vertices)
         end_vertices.difference_update(internal_vertices)
-
-        for vertex in internal_vertices:
-            for nr in vertex.represented_numbers:
-                self.orig_v_map[nr] = self.graph.v_map[nr]
-                self.graph.v_map[nr] = None
         
         assert len(start_vertices) == 1
         assert len(end_vertices) == 1
@@ -197,10 +241,6 @@ class ViewParticleSummary(ViewParticle, Summary):
         self._start_vertices = sorted(chain(*[v.represented_numbers for v in start_vertices]))
         self._end_vertices = sorted(chain(*[v.represented_numbers for v in end_vertices]))
 
-        # for the assertion:
-        self.start_vertex
-        self.end_vertex
-
         # Extract quantities from particles that go into the end vertex of this summary
         self.name = ",".join(set(p.name for p in self.represented_particles))
         self.m = 0
@@ -225,21 +265,26 @@ class ViewParticleSummary(ViewParticle, Summary):
         self.m = energy_mag(self.m)
 
         self.pdgid = min(pdgids)
+        self.flags = self.classification.flags
         self.color, self.anticolor = max(color), max(anticolor)
         
         self.status = max(p.status for p in self.represented_particles)
-        
+
+        return list(chain(*[v.represented_numbers for v in internal_vertices]))
+
     @property
     def start_vertex(self):
-        svs = self.graph.numbers_to_vertices(self._start_vertices)
+        svs = self.graph.materialized(self._views, "start_vertex",
+            self._start_vertices, self.graph.numbers_to_vertices)
         assert len(svs) == 1
-        return svs.pop()
+        return next(iter(svs))
 
     @property
     def end_vertex(self):
-        evs = self.graph.numbers_to_vertices(self._end_vertices)
+        evs = self.graph.materialized(self._views, "end_vertex",
+            self._end_vertices, self.graph.numbers_to_vertices)
         assert len(evs) == 1
-        return evs.pop()
+        return next(iter(evs))
     
     @property
     def order_number(self):
@@ -79,6 +79,14 @@ class ViewVertexSingle(ViewVertex):
     def outgoing(self):
         return self.graph.vertex_outgoing_particles(self.vertex_number)
 
+    @property
+    def incoming_numbers(self):
+        return self.graph._incoming[self.vertex_number]
+
+    @property
+    def outgoing_numbers(self):
+        return self.graph._outgoing[self.vertex_number]
+
     @property
     def event_vertex(self):
         return self.graph.event.vertices[self.vertex_number]
@@ -93,6 +101,10 @@ class ViewVertexSingle(ViewVertex):
         return [self.vertex_number]
 
 class ViewVertexSummary(ViewVertex, Summary):
+    """
+    Represents a view of a summary of vertices. It is made by
+    GraphView.summarize_groups, which puts it in the view.
+    """
     def __init__(self, graph, vertex_numbers):
         super(ViewVertexSummary, self).__init__(graph)
         
@@ -101,28 +113,22 @@ class ViewVertexSummary(ViewVertex, Summary):
         self._outgoing = [] 
         self.orig_v_map, self.orig_p_map = {}, {}
         
-        summarized_particle_nrs = set()
+        # Particles between two of the vertices are hidden inside the summary
+        self.internal_particle_numbers = []
+        summarized_vertex_nrs = set(self.vertex_numbers)
         
         for v_nr in self.vertex_numbers:
-            self.orig_v_map[v_nr] = self.graph.v_map[v_nr]
-            self.graph.v_map[v_nr] = self
-            
             for p_nr in self.graph._incoming[v_nr]:
-                if self.graph._start_vertex[p_nr] in self.vertex_numbers:
-                    summarized_particle_nrs.add(p_nr)
+                if self.graph._start_vertex[p_nr] in summarized_vertex_nrs:
+                    self.internal_particle_numbers.append(p_nr)
                 else:
                     self._incoming.append(p_nr)
                     
             for p_nr in self.graph._outgoing[v_nr]:
-                if self.graph._end_vertex[p_nr] in self.vertex_numbers:
-                    summarized_particle_nrs.add(p_nr)
-                else:
+                if self.graph._end_vertex[p_nr] not in summarized_vertex_nrs:
                     self._outgoing.append(p_nr)
             
-        for p_nr in summarized_particle_nrs:
-            self.orig_p_map[p_nr] = self.graph.p_map[p_nr]
-            self.graph.p_map[p_nr] = None
-            
+        self._views = {}
             
         self.tags.add("summary")
 
@@ -133,11 +139,21 @@ class ViewVertexSummary(ViewVertex, Summary):
 
     @property
     def incoming(self):
-        return self.graph.numbers_to_particles(self._incoming)
+        return self.graph.materialized(self._views, "incoming", self._incoming,
+                                       self.graph.numbers_to_particles)
 
     @property
     def outgoing(self):
-        return self.graph.numbers_to_particles(self._outgoing)
+        return self.graph.materialized(self._views, "outgoing", self._outgoing,
+                                       self.graph.numbers_to_particles)
+
+    @property
+    def incoming_numbers(self):
+        return self._incoming
+
+    @property
+    def outgoing_numbers(self):
+        return self._outgoing
 
     @property
     def order_number(self):
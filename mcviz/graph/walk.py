@@ -1,53 +1,59 @@
-from itertools import takewhile
-
-from mcviz.utils import OrderedSet
-
+# Position of a node which has been walked completely
+DONE = -1
 
 def walk(node,
-         walk_action=lambda p, d: None, loop_action=lambda p, d: None, 
-         completed_walks=None, uncompleted_walks=None, depth=0):
+         walk_action=lambda p, d: None, loop_action=lambda p, d: None, depth=0):
     """
-    Walk the particle graph.
-    
-    Shamelessly stolen algorithm from:
+    Walk the particle graph depth first from `node`.
+
+    `walk_action(node, depth)` is called once for every node reached and
+    returns the nodes to go to from there. When one of them is still being
+    walked, the nodes from there down to the current one form a loop, and
+    `loop_action(node, depth)` is called on each of them.
+
+    Based on the algorithm of:
     http://www.electricmonk.nl/log/2008/08/07/dependency-resolving-algorithm
-    
-    Enhanced for our purposes to provide loop marking.
+
+    The walk keeps its own stack, so it is not limited by python's recursion
+    limit. Returns the nodes walked, in the order they were completed.
     """
-    if completed_walks is None: completed_walks = OrderedSet()
-    if uncompleted_walks is None: uncompleted_walks = OrderedSet()
-    
-    next_nodes = walk_action(node, depth)
-
-    uncompleted_walks.add(node)
-    
-    for next_node in next_nodes:
-        if next_node not in completed_walks:
-            # we haven't yet seen this particle, walk it.
-            if next_node in uncompleted_walks:
+    # {node: its position on the path, or DONE}
+    position = {}
+    # The nodes being walked, from `node` down, and the rest of the nodes to
+    # go to from each of them
+    path, pending = [], []
+    completed = []
+
+    def enter(node, depth):
+        next_nodes = walk_action(node, depth)
+        position[node] = len(path)
+        path.append(node)
+        pending.append(iter(next_nodes))
+
+    enter(node, depth)
+    while pending:
+        for next_node in pending[-1]:
+            where = position.get(next_node)
+            if where is None:
+                # we haven't yet seen this node, walk it.
+                enter(next_node, depth + len(path))
+                break
+            elif where != DONE and loop_action:
                 # We have a loop, because we have seen it but not walked it.
-                # All particles from the end up to this daughter are 
+                # All nodes from the end of the path up to this one are
                 # participating in the loop
-                if not loop_action:
-                    continue
-                 
-                lps = takewhile(lambda x: x != next_node, 
-                                reversed(uncompleted_walks))
-                                 
-                looping_nodes = list(lps) + [next_node]
-                
+                looping_nodes = path[:where:-1] + [next_node]
+                current_depth = depth + len(path) - 1
+
                 # -1 because a single particle loop should be at the same
-                # depth as the self.walk() call.
+                # depth as the current node.
                 n_lp = len(looping_nodes) - 1
                 for i, looping_node in enumerate(looping_nodes):
-                    loop_action(looping_node, depth - n_lp + i + 1)
-                     
-            else:
-                # Not circular, so walk it.
-                walk(next_node, walk_action, loop_action,
-                          completed_walks, uncompleted_walks, depth+1)
-    
-    completed_walks.add(node)
-    uncompleted_walks.discard(node)
-    return completed_walks
+                    loop_action(looping_node, current_depth - n_lp + i + 1)
+        else:
+            pending.pop()
+            done = path.pop()
+            position[done] = DONE
+            completed.append(done)
 
+    return completed
@@ -0,0 +1,6 @@
+"""
+Jet clustering of the particles of an event, for the Jets transform and
+jet tagging. See clustering.py.
+"""
+
+from .clustering import Jet, JetAlgorithm, JetAlgorithms, cluster_jets
@@ -0,0 +1,351 @@
+"""
+Sequential recombination jet clustering: the generalised kt family for
+hadron colliders (kt, Cambridge/Aachen, anti-kt) and the e+e- variants, with
+four-momenta added together when jets are merged (the E scheme).
+
+Hadron collider algorithms keep every jet in a tile of the (rapidity, phi)
+plane at least R wide, so that the nearest neighbour of a jet is always in
+its own or one of the eight tiles around it. Each jet remembers its nearest
+neighbour, and only the jets around those merged have to look for a new one,
+so clustering N particles takes about N sqrt(N) steps instead of N^3.
+e+e- algorithms have no such geometry and keep nearest neighbours among all
+jets, in N^2 steps.
+"""
+
+from collections import namedtuple
+from heapq import heappush, heappop
+from itertools import count
+from math import atan2, cos, floor, log, pi, sqrt
+
+INFINITY = float("inf")
+TWOPI = 2 * pi
+# Rapidity given to particles with no transverse momentum, as in FastJet
+MAX_RAPIDITY = 1e5
+
+JetAlgorithm = namedtuple("JetAlgorithm", "name p ee")
+
+class JetAlgorithms(object):
+    """
+    The available algorithms. `p` is the power of the momentum in the
+    distance measure, None for the algorithms which take it as an argument.
+    The _for_passive variants only differ from the plain ones for ghost
+    particles, which mcviz never adds, so they cluster the same way.
+    """
+    kt = JetAlgorithm("kt", 1., False)
+    cambridge = JetAlgorithm("cambridge", 0., False)
+    antikt = JetAlgorithm("antikt", -1., False)
+    genkt = JetAlgorithm("genkt", None, False)
+    cambridge_for_passive = JetAlgorithm("cambridge_for_passive", 0., False)
+    genkt_for_passive = JetAlgorithm("genkt_for_passive", None, False)
+    ee_kt = JetAlgorithm("ee_kt", 1., True)
+    ee_genkt = JetAlgorithm("ee_genkt", None, True)
+
+class Jet(object):
+    """
+    The particles clustered into a jet, and their total four-momentum
+    """
+    def __init__(self, particles, px, py, pz, e):
+        self.particles = particles
+        self.p = px, py, pz
+        self.e = e
+
+    @property
+    def pt(self):
+        return sqrt(self.p[0]**2 + self.p[1]**2)
+
+    @property
+    def rapidity(self):
+        return rapidity(self.p[0], self.p[1], self.p[2], self.e)
+
+    @property
+    def phi(self):
+        return phi(self.p[0], self.p[1])
+
+    def __repr__(self):
+        return "<Jet n=%i pt=%.3f y=%.3f phi=%.3f>" % (
+            len(self.particles), self.pt, self.rapidity, self.phi)
+
+def rapidity(px, py, pz, e):
+    if e > abs(pz):
+        return 0.5 * log((e + pz) / (e - pz))
+    return MAX_RAPIDITY if pz >= 0 else -MAX_RAPIDITY
+
+def phi(px, py):
+    "Azimuth in [0, 2pi)"
+    angle = atan2(py, px)
+    return angle + TWOPI if angle < 0 else angle
+
+class TiledPlane(object):
+    """
+    Jets in tiles of the (rapidity, phi) plane, for the hadron collider
+    algorithms. The distance between two jets is their Delta R^2, and only
+    neighbours closer than R are looked for, because further ones are never
+    merged before one of the two is merged with the beam.
+    """
+    beam = True
+
+    def __init__(self, r):
+        self.cutoff = self.norm = r * r
+        tile_size = max(r, 0.1)
+        self.n_phi = max(1, int(TWOPI / tile_size))
+        self.phi_size = TWOPI / self.n_phi
+        self.y_size = tile_size
+        # By jet number
+        self.rapidity, self.phi, self.tile_of = [], [], []
+        # {tile: jet numbers in it}, {tile: it and the tiles around it}
+        self.tiles, self.around = {}, {}
+
+    def momentum_factor(self, px, py, pz, e, p):
+        kt2 = px * px + py * py
+        if kt2 == 0:
+            return 0. if p > 0 else INFINITY if p < 0 else 1.
+        return kt2 ** p
+
+    def add(self, i, px, py, pz, e):
+        y, angle = rapidity(px, py, pz, e), phi(px, py)
+        tile = int(floor(y / self.y_size)), int(angle / self.phi_size) % self.n_phi
+        self.rapidity.append(y)
+        self.phi.append(angle)
+        self.tile_of.append(tile)
+        self.tiles.setdefault(tile, set()).add(i)
+
+    def remove(self, i):
+        self.tiles[self.tile_of[i]].discard(i)
+
+    def tiles_around(self, tile):
+        """
+        The tile and those around it, the tile itself first, each with which
+        side of the tile it is on in rapidity and phi (-1, 0 or 1)
+        """
+        around = self.around.get(tile)
+        if around is None:
+            y_tile, phi_tile = tile
+            around, seen = [], set()
+            for dy, dphi in sorted(((dy, dphi) for dy in (-1, 0, 1) for dphi in (-1, 0, 1)),
+                                   key=lambda offset: offset != (0, 0)):
+                other = y_tile + dy, (phi_tile + dphi) % self.n_phi
+                if other not in seen:
+                    seen.add(other)
+                    # With fewer than three tiles in phi they are on both sides
+                    around.append((other, dy, dphi if self.n_phi >= 3 else 0))
+            self.around[tile] = around
+        return around
+
+    def near(self, jets):
+        "The jets which could be within R of any of `jets`"
+        tiles, tile_of = self.tiles, self.tile_of
+        around = set()
+        for i in jets:
+            around.update(other for other, dy, dphi in self.tiles_around(tile_of[i]))
+        return [j for tile in around for j in tiles.get(tile, ())]
+
+    def distance(self, i, j):
+        dy = self.rapidity[i] - self.rapidity[j]
+        dphi = abs(self.phi[i] - self.phi[j])
+        if dphi > pi:
+            dphi = TWOPI - dphi
+        return dy * dy + dphi * dphi
+
+    def nearest(self, i):
+        """
+        The nearest jet to jet `i` within R and its distance, or (None, R^2).
+        Tiles which are further away than the nearest jet found so far are
+        not looked in.
+        """
+        rapidities, phis, tiles = self.rapidity, self.phi, self.tiles
+        y, angle = rapidities[i], phis[i]
+        tile = self.tile_of[i]
+        # How far the jet is from the edges of its tile
+        y_low = max(0., y - tile[0] * self.y_size)
+        y_high = max(0., self.y_size - y_low)
+        phi_low = max(0., angle - tile[1] * self.phi_size)
+        phi_high = max(0., self.phi_size - phi_low)
+        best, best_distance = None, self.cutoff
+        for other, dy_tile, dphi_tile in self.tiles_around(tile):
+            jets = tiles.get(other)
+            if not jets:
+                continue
+            edge_y = y_low if dy_tile < 0 else y_high if dy_tile > 0 else 0.
+            edge_phi = phi_low if dphi_tile < 0 else phi_high if dphi_tile > 0 else 0.
+            if edge_y * edge_y + edge_phi * edge_phi >= best_distance:
+                continue
+            for j in jets:
+                dy = y - rapidities[j]
+                dphi = angle - phis[j]
+                if dphi > pi:
+                    dphi -= TWOPI
+                elif dphi < -pi:
+                    dphi += TWOPI
+                d = dy * dy + dphi * dphi
+                if d < best_distance and j != i:
+                    best, best_distance = j, d
+        return best, best_distance
+
+    def closer(self, k, jets, nn_distance):
+        "The `jets` which are closer to jet `k` than to their nearest neighbour"
+        rapidities, phis = self.rapidity, self.phi
+        y, angle = rapidities[k], phis[k]
+        found = []
+        for m in jets:
+            dy = y - rapidities[m]
+            dphi = angle - phis[m]
+            if dphi > pi:
+                dphi -= TWOPI
+            elif dphi < -pi:
+                dphi += TWOPI
+            d = dy * dy + dphi * dphi
+            if d < nn_distance[m] and m != k:
+                found.append((m, d))
+        return found
+
+class Sphere(object):
+    """
+    Jets as directions in space, for the e+e- algorithms. The distance
+    between two jets is 1 - cos of the angle between them, and every jet is
+    a neighbour of every other.
+    """
+    def __init__(self, r, beam):
+        self.beam = beam
+        # ee_kt: d_ij = 2 min(E_i^2, E_j^2) (1 - cos theta_ij)
+        self.norm = (1 - cos(min(r, pi))) if beam else 0.5
+        self.direction = {}
+
+    def momentum_factor(self, px, py, pz, e, p):
+        if e == 0:
+            return 0. if p > 0 else INFINITY if p < 0 else 1.
+        return (e * e) ** p
+
+    def add(self, i, px, py, pz, e):
+        length = sqrt(px * px + py * py + pz * pz) or 1.
+        self.direction[i] = px / length, py / length, pz / length
+
+    def remove(self, i):
+        del self.direction[i]
+
+    def near(self, jets):
+        return self.direction.keys()
+
+    def distance(self, i, j):
+        (xi, yi, zi), (xj, yj, zj) = self.direction[i], self.direction[j]
+        return 1. - (xi * xj + yi * yj + zi * zj)
+
+    def nearest(self, i):
+        "The nearest jet to jet `i` and its distance, or (None, infinity)"
+        xi, yi, zi = self.direction[i]
+        best, best_distance = None, INFINITY
+        for j, (xj, yj, zj) in self.direction.iteritems():
+            d = 1. - (xi * xj + yi * yj + zi * zj)
+            if d < best_distance and j != i:
+                best, best_distance = j, d
+        return best, best_distance
+
+    def closer(self, k, jets, nn_distance):
+        "The `jets` which are closer to jet `k` than to their nearest neighbour"
+        xk, yk, zk = self.direction[k]
+        direction = self.direction
+        found = []
+        for m in jets:
+            xm, ym, zm = direction[m]
+            d = 1. - (xk * xm + yk * ym + zk * zm)
+            if d < nn_distance[m] and m != k:
+                found.append((m, d))
+        return found
+
+def cluster_jets(particles, algorithm=JetAlgorithms.antikt, r=0.4, p=-1.,
+                 n_jets=None):
+    """
+    Cluster `particles`, which have four-momenta .p and .e, into jets with
+    `algorithm`, one of JetAlgorithms, and radius `r`. `p` is only used by
+    the genkt algorithms. Returns the inclusive jets, or if `n_jets` is
+    given the jets left when clustering has gone down to that many (ee_kt
+    has no beam distance, so without `n_jets` it makes a single jet).
+    """
+    if algorithm.p is not None:
+        p = algorithm.p
+    if algorithm.ee:
+        geometry = Sphere(r, beam=algorithm is not JetAlgorithms.ee_kt)
+    else:
+        geometry = TiledPlane(r)
+
+    # Jets by number, the particles come first
+    members, momenta, factor = [], [], []
+    active = set()
+    def add(particles, momentum):
+        i = len(members)
+        members.append(particles)
+        momenta.append(momentum)
+        factor.append(geometry.momentum_factor(*(momentum + (p,))))
+        geometry.add(i, *momentum)
+        active.add(i)
+        return i
+
+    for particle in particles:
+        px, py, pz = particle.p
+        add([particle], (px, py, pz, particle.e))
+
+    # Nearest neighbour of each jet, with its distance, and a heap of the
+    # smallest distance measure of each jet, whose entries are only valid
+    # while the jet's serial number is unchanged
+    nn, nn_distance = {}, {}
+    serial, heap, serials = {}, [], count()
+    norm = geometry.norm
+
+    def find_neighbour(i):
+        nn[i], nn_distance[i] = geometry.nearest(i)
+
+    def measure(i):
+        "The smallest distance measure of jet `i`, and whether it's to the beam"
+        beam = factor[i] if geometry.beam else INFINITY
+        j = nn[i]
+        if j is None:
+            return beam, True
+        pair = min(factor[i], factor[j]) * nn_distance[i] / norm
+        return (pair, False) if pair <= beam else (beam, True)
+
+    def update(i):
+        serial[i] = next(serials)
+        heappush(heap, (measure(i)[0], serial[i], i))
+
+    for i in active:
+        find_neighbour(i)
+    for i in active:
+        update(i)
+
+    jets = []
+    while active:
+        if n_jets is not None and len(active) <= n_jets:
+            break
+        value, entry_serial, i = heappop(heap)
+        if i not in active or serial[i] != entry_serial:
+            continue
+
+        j, k = nn[i], None
+        active.discard(i)
+        geometry.remove(i)
+        if measure(i)[1]:
+            jets.append(i)
+            gone = (i,)
+        else:
+            active.discard(j)
+            geometry.remove(j)
+            gone = i, j
+            (pxi, pyi, pzi, ei), (pxj, pyj, pzj, ej) = momenta[i], momenta[j]
+            k = add(members[i] + members[j], (pxi + pxj, pyi + pyj, pzi + pzj, ei + ej))
+            find_neighbour(k)
+            update(k)
+
+        # Only jets near those which went can have had one of them as nearest
+        # neighbour, or have the new jet as their nearest
+        around = geometry.near(gone if k is None else gone + (k,))
+        for m in around:
+            if nn[m] in gone and m != k:
+                find_neighbour(m)
+                update(m)
+        if k is not None:
+            for m, d in geometry.closer(k, around, nn_distance):
+                nn[m], nn_distance[m] = k, d
+                update(m)
+
+    if n_jets is not None:
+        jets = sorted(active)
+    return [Jet(members[i], *momenta[i]) for i in jets]
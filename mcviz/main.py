@@ -16,13 +16,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from os.path import splitext
 from textwrap import dedent
 
 from . import log; log = log.getChild(__name__)
 
 from . import EventGraph, EventParseError, GraphWorkspace, FatalError, parse_options
 
+from .graph.loaders import parse_event_spec
 from .logger import get_logger_level, log_level
+from .parallel import draw_parallel
 from .utils import Units
 from .utils.timer import Timer; timer = Timer(log, log.VERBOSE)
 from .help import run_help
@@ -44,18 +47,48 @@ def run(args, argv):
              "Please see http://mcviz.net/license.txt")
 
     filename = args.filename
-    log.verbose('trying to read event from "%s"' % filename)
-    with timer('read event from "%s"' % filename):
-        try:
-            event_graph = EventGraph.load(args)
-        except EventParseError, x:
-            log.fatal("No success in reading events from %s!" % filename)
-            raise FatalError
-    log.info('drawing event from "%s"' % (filename))
-
-    gw = GraphWorkspace("local", event_graph, cmdline=" ".join(argv))
+    if args.index:
+        with timer('index "%s"' % filename):
+            try:
+                index = EventGraph.index(args)
+            except (EventParseError, IOError), x:
+                log.fatal("Failed to index %s!" % filename)
+                raise FatalError
+        log.info('indexed %i events in "%s"' % (len(index), index.filename))
+        return
+
+    filename, event_numbers = parse_event_spec(args.filename)
+    if event_numbers is None or len(event_numbers) > 1:
+        output_file = args.output_file
+        if output_file != "-" and "{event" not in output_file:
+            # Give every event its own output file
+            root, ext = splitext(output_file)
+            args.output_file = root + "_{event}" + ext
+            log.info('writing events to "%s"' % args.output_file)
+
+    # The tools are built once and used for every event
+    gw = GraphWorkspace("local", cmdline=" ".join(argv))
     gw.load_tools(args)
-    gw.run()
+
+    if args.jobs > 1:
+        draw_parallel(gw, args)
+        return
+
+    log.verbose('trying to read events from "%s"' % filename)
+    events = EventGraph.load_events(args)
+    while True:
+        with timer('read event from "%s"' % filename):
+            try:
+                event_number, event_graph = next(events)
+            except StopIteration:
+                break
+            except EventParseError, x:
+                log.fatal("No success in reading events from %s!" % filename)
+                raise FatalError
+        log.info('drawing event %i from "%s"' % (event_number, filename))
+
+        gw.set_event(event_graph, event_number)
+        gw.run()
 
 def real_main(argv):
     parser, args = parse_options()
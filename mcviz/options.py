@@ -5,13 +5,17 @@ from argparse import ArgumentParser, RawDescriptionHelpFormatter, SUPPRESS
 import sys
 
 from . import FatalError
+from .graph.loaders import FORMAT_NAMES
 from .help import help_topics
 from .tools import tool_type_options
+from .utils.trydecompress import STDIN
 
 
 def get_option_parser():
-    usage = ("usage: %(prog)s [options] {hepmc_file|lhe_file|pythia_log}[:<event index, 0 first>]\n"
-             "       for example: %(prog)s --demo pythia_01.log:2")
+    usage = ("usage: %(prog)s [options] {hepmc_file|lhe_file|pythia_log}[:<events, 0 first>]\n"
+             "       for example: %(prog)s --demo pythia_01.log:2\n"
+             "       or, to draw several events: %(prog)s --demo pythia_01.log:0-9 or :all\n"
+             "       or, from standard input: cat events.hepmc | %(prog)s -:all")
     epilog = ("\nTo show extensive help, type %(prog)s --help all\n"
              "To show help on a specific tool %(prog)s --help [tool]"
              #"For a list of examples, type %(prog)s --help examples"
@@ -33,9 +37,32 @@ def get_option_parser():
 
     o("--units", action="store", dest="units")
 
-    o("--output_file", action="store", help="Filename for output file", default="mcviz.svg")
+    o("--output_file", action="store", default="mcviz.svg",
+      help="Filename for output file. When drawing several events, {event} "
+           "is replaced by the event number, e.g. out_{event:05d}.svg")
 
-    o("filename", nargs='?', help="Input file name, optionally followed by event index e.g. pythia_01.log:2", default=None)
+    o("-j", "--jobs", type=int, default=1,
+      help="Number of processes to draw events with, when drawing several")
+
+    o("--columnar", action="store_true",
+      help="Store events in columns, which uses much less memory for large events. "
+           "HepMC events are read straight into columns, others are converted once read")
+
+    o("--format", choices=FORMAT_NAMES, default=None,
+      help="Format of the input file. By default it is guessed from its content")
+
+    o("--index", action="store_true",
+      help="Build an index of the input file for fast access to any event, and exit")
+
+    o("--select", default=None, metavar="EXPRESSION",
+      help="Only draw the events for which EXPRESSION is true, e.g. "
+           "'has_pdgid(6) and n_particles > 500' or 'max_pt(11) > 20'. "
+           "Also available: count(*pdgids). Use with e.g. events.hepmc:all")
+
+    o("--no-cache", action="store_true",
+      help="Neither read parsed events from the cache nor store them in it")
+
+    o("filename", nargs='?', help="Input file name, optionally followed by event indices e.g. pythia_01.log:2, pythia_01.log:0-9,20 or pythia_01.log:all. Use - to read standard input, e.g. - or -:all", default=None)
 
     g = p.add_argument_group("The MCViz Toolbox")
     o = g.add_argument
@@ -61,12 +88,27 @@ def get_option_parser():
     o("--links", action="store_true", help=SUPPRESS)
     return p
     
+def stdin_spec_last(arguments):
+    """
+    argparse takes standard input with events, e.g. "-:all", for an option.
+    Move it after "--", so that it is read as the filename.
+    """
+    if "--" in arguments:
+        end = arguments.index("--")
+        options, rest = arguments[:end], arguments[end + 1:]
+    else:
+        options, rest = arguments, []
+    specs = [a for a in options if a.startswith(STDIN + ":")]
+    if not specs:
+        return arguments
+    options = [a for a in options if not a.startswith(STDIN + ":")]
+    return options + ["--"] + specs + rest
+
 def parse_options(arguments=None):
     parser = get_option_parser()
     if arguments is None:
-        args = parser.parse_args()
-    else:
-        args = parser.parse_args(arguments)
+        arguments = sys.argv[1:]
+    args = parser.parse_args(stdin_spec_last(list(arguments)))
 
     if args.demo:
         args.optionset = ["demo"]
@@ -0,0 +1,100 @@
+"""
+Draw many events at once with a pool of worker processes.
+
+The parent process only reads the raw events from the input file and hands
+them out. The workers are forked from the parent once its tools are built, so
+each of them starts with its own warm copy of the tool chain and glyph
+library, and parses, lays out and paints the events it is given.
+"""
+
+from . import log; log = log.getChild(__name__)
+
+from collections import deque
+from multiprocessing import Pool
+from signal import signal, SIGINT, SIG_IGN
+from time import time
+from traceback import format_exc
+
+from . import EventGraph, EventParseError, FatalError
+from .utils.svg import TexGlyph
+
+# How many events per worker are read ahead of the ones being drawn
+READ_AHEAD = 2
+# Waiting on a result with a timeout keeps the parent interruptible
+FOREVER = 1 << 30
+
+# The state of a worker, inherited from the parent when it is forked
+workspace, worker_args = None, None
+
+def ignore_interrupts():
+    "Ctrl-C is dealt with by the parent, which stops the workers"
+    signal(SIGINT, SIG_IGN)
+
+def draw_event(task):
+    """
+    Parse and draw one event in a worker.
+    Returns (event number, seconds taken, error message or None)
+    """
+    format, event_number, event = task
+    start = time()
+    try:
+        event_graph = EventGraph.from_raw(format, event, worker_args)
+        workspace.set_event(event_graph, event_number)
+        workspace.run()
+    except FatalError:
+        # The reason has already been logged by the worker
+        return event_number, time() - start, "fatal error"
+    except Exception:
+        return event_number, time() - start, format_exc()
+    return event_number, time() - start, None
+
+def draw_parallel(gw, args):
+    """
+    Draw the events selected by args.filename with `args.jobs` workers, each
+    of them a copy of the workspace `gw` with its tools loaded
+    """
+    global workspace, worker_args
+    workspace, worker_args = gw, args
+    # Load the glyphs before forking, rather than once in every worker
+    TexGlyph.get_library()
+
+    filename = args.filename.partition(":")[0]
+    timings, failed = [], []
+    def collect(result):
+        event_number, elapsed, error = result
+        if error:
+            log.error("event %i failed after %.2fs: %s" % (event_number, elapsed, error))
+            failed.append(event_number)
+        else:
+            log.info('drew event %i from "%s" in %.2fs' % (event_number, filename, elapsed))
+            timings.append(elapsed)
+
+    start = time()
+    pool = Pool(args.jobs, ignore_interrupts)
+    pending = deque()
+    try:
+        try:
+            for task in EventGraph.read_events(args):
+                pending.append(pool.apply_async(draw_event, (task,)))
+                if len(pending) >= READ_AHEAD * args.jobs:
+                    collect(pending.popleft().get(FOREVER))
+        except EventParseError, x:
+            log.fatal("No success in reading events from %s!" % filename)
+            raise FatalError
+        while pending:
+            collect(pending.popleft().get(FOREVER))
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+    elapsed = time() - start
+    if timings:
+        log.info("drew %i events in %.1fs with %i processes (%.2fs of work per event)"
+                 % (len(timings), elapsed, args.jobs, sum(timings) / len(timings)))
+    if failed:
+        log.fatal("%i events failed: %s" % (len(failed), ", ".join(map(str, failed))))
+        raise FatalError
@@ -129,7 +129,7 @@ class InlineLabelsLayout(FeynmanLayout):
         
         if 'jet' in down.item.tags: #Make a dummy item for the upstream particle
             item = ViewParticle(self.graph)
-            item.pdgid = 0
+            item.pdgid = item.flags = 0
             item.color = item.anticolor = None
             item.order_number = -1000
         else:
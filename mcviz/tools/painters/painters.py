@@ -11,8 +11,10 @@ class StdPainter(Painter):
     _args = (Arg("output_file", str, "output filename", default="mcviz.svg"),)
     _base = True
 
-    def write_data(self, data_string):
+    def write_data(self, data_string, event_number=0):
         output_file = self.options["output_file"]
+        if isinstance(output_file, basestring) and "{event" in output_file:
+            output_file = output_file.format(event=event_number)
         # Dump the data to stdout if required
         log.debug("data hash: 0x%0X", hash(data_string))
         if output_file == "-":
@@ -58,5 +60,6 @@ class DOTPainter(StdPainter, FundamentalTool):
     """
     _name = "dot"
     def __call__(self, workspace, layout):
-        self.write_data("graph {\n%s\n}" % layout.dot.encode("UTF-8"))
+        self.write_data("graph {\n%s\n}" % layout.dot.encode("UTF-8"),
+                        workspace.event_number)
 
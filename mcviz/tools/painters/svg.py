@@ -77,7 +77,7 @@ class SVGPainter(StdPainter, FundamentalTool):
                 text(2*sz, -1*sz, 0.8*sz,  "Height: %.4f" % h)
 
 
-        self.write_data(self.doc.toprettyxml())
+        self.write_data(self.doc.toprettyxml(), workspace.event_number)
 
     def paint_edge(self, edge):
         """
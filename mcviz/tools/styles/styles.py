@@ -8,6 +8,8 @@ from mcviz.tools import Style, Arg
 from mcviz.tools.layouts import FeynmanLayout, DualLayout
 from mcviz.utils import rainbow_color
 from mcviz.graph import ViewParticle, ViewVertex
+from mcviz.utils.particledata import (INVISIBLE, GLUON, GLUINO, PHOTON, BOSON,
+    SQUARK, LEPTON, SLEPTON, CHARGINO)
 
 
 DEFAULT_NODE_ARGS = {"stroke": "black", "fill": "white", "stroke-width": "0.05"}
@@ -36,18 +38,19 @@ class Default(Style):
 
 
 def particle_color(particle):
-    if particle.gluon:
+    flags = particle.flags
+    if flags & GLUON:
         return "green"
-    elif particle.photon:
+    elif flags & PHOTON:
         return "orange"
     elif particle.colored:
         if particle.color:
             return "red"
         else:
             return "blue"
-    elif particle.boson:
+    elif flags & BOSON:
         return "magenta"
-    elif particle.lepton:
+    elif flags & LEPTON:
         return "#EFDECD" # "Almond"
     else:
         return "black"
@@ -136,8 +139,9 @@ class FancyLines(Style):
         for edge in layout.edges:
             particle = edge.item
             edge.style_args["scale"] = 0.2 * self.options["scale"]
-            if not hasattr(particle, "gluon"):
+            if not hasattr(particle, "flags"):
                 return
+            flags = particle.flags
             # colouring
             if "jet" in particle.tags:
                 edge.style_line_type = "jet"
@@ -151,30 +155,30 @@ class FancyLines(Style):
                     edge.style_args["n"] = edge.n_represented
                 except AttributeError:
                     pass # Edge has no n_represented property
-            elif particle.gluon:
+            elif flags & GLUON:
                 edge.style_args["scale"] = 0.2 * self.options["scale"]
                 edge.style_line_type = "gluon"
-            elif particle.photon:
+            elif flags & PHOTON:
                 if particle.final_state:
                     edge.style_line_type = "final_photon"
                 else:
                     edge.style_line_type = "photon"
-            elif particle.invisible:
+            elif flags & INVISIBLE:
                 edge.style_line_type = "invisible"
-            elif particle.squark:
+            elif flags & SQUARK:
                 edge.style_line_type = "sfermion"
             elif particle.colored:
                 edge.style_line_type = "fermion"
-            elif particle.lepton:
+            elif flags & LEPTON:
                 edge.style_line_type = "fermion"
-            elif particle.boson:
+            elif flags & BOSON:
                 edge.style_line_type = "boson"
-            elif particle.gluino:
+            elif flags & GLUINO:
                 edge.style_args["scale"] = 0.2 * self.options["scale"]
                 edge.style_line_type = "gluino"
-            elif particle.chargino:
+            elif flags & CHARGINO:
                 edge.style_line_type = "chargino"
-            elif particle.slepton:
+            elif flags & SLEPTON:
                 edge.style_line_type = "sfermion"
             else:
                 edge.style_line_type = "hadron"
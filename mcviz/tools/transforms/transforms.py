@@ -1,31 +1,59 @@
 from .. import log; log = log.getChild(__name__)
 
-from functools import wraps
 from collections import defaultdict
-from new import classobj
+from itertools import chain
 
 from mcviz.tools import Transform, Arg
-from mcviz.graph import Summary
+from mcviz.graph import Summary, ViewParticle, ViewVertex
+from mcviz.utils.unionfind import UnionFind
 
 
-def retrying(func):
+def related_groups(relations, min_size=2):
     """
-    If the decorated function raises retry, run it again, else, fallthrough.
-    The Retry object is passed through as a kwarg.
+    Group view objects which are related. `relations` yields (object, key)
+    pairs, and objects sharing a key are grouped, directly or through other
+    objects. Returns the groups of at least `min_size` objects, in the order
+    their objects were first related.
     """
-    class Retry(Exception): pass
-    @wraps(func)
-    def wrapped(*args, **kwargs):
-        kwargs["Retry"] = Retry()
-        while True:
-            try:
-                return func(*args, **kwargs)
-            except Retry:
-                pass
-            else:
-                break
-    return wrapped
-    
+    groups, objects = UnionFind(), set()
+    for obj, key in relations:
+        objects.add(obj)
+        groups.union(obj, ("key", key))
+    groups = ([obj for obj in group if obj in objects] for group in groups.groups())
+    return [group for group in groups if len(group) >= min_size]
+
+def rewrite_to_fixed_point(graph_view, objects, relate, rewrite):
+    """
+    Rewrite the graph until none of its objects are related any more.
+
+    `relate(obj)` returns the keys relating `obj` to other objects, as for
+    related_groups. Each round groups `objects` and `rewrite(groups)` rewrites
+    all of the groups at once, returning the objects it made. Only those and
+    their neighbours are looked at again in the next round.
+    """
+    while objects:
+        groups = related_groups((obj, key) for obj in objects
+                                # Rewritten away since it was queued
+                                if graph_view.contains(obj)
+                                for key in relate(obj))
+        if not groups:
+            break
+        new_objects = rewrite(groups)
+        dirty = set(chain(new_objects, *map(neighbours, new_objects)))
+        dirty.discard(None)
+        objects = sorted(dirty)
+
+def neighbours(obj):
+    """
+    The objects of the same kind as `obj` which are one step away from it
+    """
+    if isinstance(obj, ViewVertex):
+        particles = obj.through
+        return chain((p.start_vertex for p in particles),
+                     (p.end_vertex for p in particles))
+    vertices = (obj.start_vertex, obj.end_vertex)
+    return chain(*[v.through for v in vertices if v is not None])
+
 
 class NoKinks(Transform):
     """
@@ -37,86 +65,92 @@ class NoKinks(Transform):
     _name = "NoKinks"
     def __call__(self, graph_view):
         pdgid_changes = defaultdict(int)
+        # Particles through the same kink are summarized together, and so are
+        # chains of kinks
+        kinks = []
         for vertex in graph_view.vertices:
             if not (len(vertex.incoming) == 1 and len(vertex.outgoing) == 1):
                 # Only consider particles with one particle entering and exiting
                 continue
                 
             if list(vertex.incoming)[0].pdgid == list(vertex.outgoing)[0].pdgid:
-                summary = graph_view.summarize_particles(vertex.through)
-                kinks = (getattr(x, "kink_number", 0) for x in vertex.through)
-                summary.kink_number = sum(kinks) + 1
-                summary.tag("kink")
+                kinks.extend((p, vertex) for p in vertex.through)
             else:
                 # Oops, we have a particle changing pdgid on the way through.. 
                 # It could be a graph inconsistency or it could be a K meson. Warn.
                 arg = list(vertex.incoming)[0].pdgid, list(vertex.outgoing)[0].pdgid
                 pdgid_changes[arg] += 1
+
+        groups = related_groups(kinks)
+        _, summaries = graph_view.summarize_groups(particle_groups=groups)
+        for particles, summary in zip(groups, summaries):
+            # A chain of n particles has n - 1 kinks
+            previous = sum(getattr(x, "kink_number", 0) for x in particles)
+            summary.kink_number = previous + len(particles) - 1
+            summary.tag("kink")
                 
         for change, count in sorted(pdgid_changes.iteritems()):
             arg = change + (count,)
             log.debug("kink removal: observed pdgid %s change to %s %i time(s)" % arg)
 
 @Transform.decorate("Gluballs")
-@retrying
-def gluballs(graph_view, Retry):
+def gluballs(graph_view):
     """
     Remove gluon self-interaction, replacing them all with one glu-vertex.
     """
-    for vertex in graph_view.vertices:
-        if not all(p.gluon for p in vertex.through):
-            continue
-            
-        vertices = set()
-        def walker(vertex, depth):
-            if not all(p.gluon for p in vertex.through):
-                return () # empty tuple means: do not continue here
-            vertices.add(vertex)
-                
-        graph_view.walk(vertex, vertex_action=walker)
-        
-        if len(vertices) > 1:
-            summary = graph_view.summarize_vertices(vertices)
+    def gluon_vertex(vertex):
+        return all(p.gluon for p in vertex.through)
+
+    def relate(vertex):
+        # Gluon vertices join the gluon vertices their particles end in
+        if not gluon_vertex(vertex):
+            return ()
+        ends = (p.end_vertex for p in vertex.outgoing)
+        return chain((vertex,), (end for end in ends if gluon_vertex(end)))
+
+    def rewrite(groups):
+        summaries, _ = graph_view.summarize_groups(vertex_groups=groups)
+        for vertices, summary in zip(groups, summaries):
             summary.tag("gluball")
             nv = sum(getattr(x, "gluball_nvertices", 1) for x in vertices)
             summary.gluball_nvertices = nv
-            raise Retry
+        return summaries
+
+    rewrite_to_fixed_point(graph_view, graph_view.vertices, relate, rewrite)
 
 @Transform.decorate("Categorize")
 def categorize(graph_view):
     """
     Categorize all final state particles with the same pdgid into one particle
     """
-    for vertex in graph_view.vertices:
-        final_state_particles = [p for p in vertex.outgoing if p.final_state]
-        by_pdgid = {}
-        for p in final_state_particles:
-            by_pdgid.setdefault(p.pdgid, []).append(p)
-        for k, particles in by_pdgid.iteritems():
-            if len(particles) > 1:
-                graph_view.summarize_vertices(p.end_vertex for p in particles).tag("category")
-                summary = graph_view.summarize_particles(particles)
-                summary.tag("category")
-                summary.subscripts.append(("x%i" % len(particles), "under"))
+    groups = related_groups((p, (vertex, p.pdgid)) for vertex in graph_view.vertices
+                            for p in vertex.outgoing if p.final_state)
+
+    vertex_groups = [[p.end_vertex for p in particles] for particles in groups]
+    vertex_summaries, summaries = graph_view.summarize_groups(vertex_groups, groups)
+    for particles, vsummary, summary in zip(groups, vertex_summaries, summaries):
+        vsummary.tag("category")
+        summary.tag("category")
+        summary.subscripts.append(("x%i" % len(particles), "under"))
 
 @Transform.decorate("Chainmail")
-@retrying
-def chainmail(graph_view, Retry):
+def chainmail(graph_view):
     """
     So named because lots of gluons all going the same way looks like chainmail.
     
     This function removes sibling particles of the same type.
     """
-    for particle in graph_view.particles:
-        candidates = particle.start_vertex.outgoing
-        siblings = set(p for p in candidates 
-                       if p.end_vertex == particle.end_vertex and 
-                          p.pdgid == particle.pdgid)
-        if len(siblings) > 1:
-            summary = graph_view.summarize_particles(siblings)
+    def relate(particle):
+        return [(particle.start_vertex, particle.end_vertex, particle.pdgid)]
+
+    def rewrite(groups):
+        _, summaries = graph_view.summarize_groups(particle_groups=groups)
+        for siblings, summary in zip(groups, summaries):
             summary.tag("multiple")
             summary.multiple_count = sum(getattr(x, "multiple_count", 1) for x in siblings)
-            raise Retry
+        return summaries
+
+    rewrite_to_fixed_point(graph_view, graph_view.particles, relate, rewrite)
 
 _jet_algos = ("kt", "cambridge", "antikt", "genkt", "cambridge_for_passive", "genkt_for_passive", "ee_kt", "ee_genkt")
 class Jets(Transform):
@@ -124,23 +158,26 @@ class Jets(Transform):
     _args = [Arg("algorithm", str, "Jet Algorithm", default="antikt", choices=_jet_algos),
              Arg("r", float, "Delta R for the Jet Algorithm", default=0.4),
              Arg("n_max", int, "Maximum number of jets to form", default=5),
-             Arg("tracks", Arg.bool, "Only cluster charged particles", default=False)]
+             Arg("tracks", Arg.bool, "Only cluster charged particles", default=False),
+             Arg("p", float, "Momentum power for the genkt algorithms", default=-1.)]
     def __call__(self, graph_view):
         from mcviz.jet import cluster_jets, JetAlgorithms
         from math import hypot
         track_jets = self.options["tracks"]
-        if track_jets:
-            raise Exception("Unimplemented!")
         def pselect(p):
             return p.final_state and not p.invisible and (p.charge != 0 if track_jets else True)
         final_state_particles = [p for p in graph_view.particles if pselect(p)]
-        jets = cluster_jets(final_state_particles, getattr(JetAlgorithms, self.options["algorithm"]))
-        print "Converted %i final state particles into %i jets" % (len(final_state_particles), len(jets))
+        algorithm = getattr(JetAlgorithms, self.options["algorithm"])
+        # ee_kt never merges with the beam, so cluster down to n_max jets
+        n_jets = self.options["n_max"] if algorithm is JetAlgorithms.ee_kt else None
+        jets = cluster_jets(final_state_particles, algorithm, r=self.options["r"],
+                            p=self.options["p"], n_jets=n_jets)
+        log.info("Converted %i final state particles into %i jets" % (len(final_state_particles), len(jets)))
 
         def pt(jet):
             return hypot(*jet.p[:2])
         for i, jet in enumerate(sorted(jets, key=pt, reverse=True)):
-            print "Created jet: np=%2i, %r, %r" % (len(jet.particles), jet.p, jet.e)
+            log.debug("Created jet: np=%2i, %r, %r" % (len(jet.particles), jet.p, jet.e))
             if i >= self.options["n_max"]:
                 break
             jet_start_vertices = set(p.start_vertex for p in jet.particles)
@@ -159,13 +196,14 @@ def contract_clusters(graph_view):
     Summarize all particles and vertices which decend from hadronization 
     vertices and tag them.
     """
+    # Clusters which share particles or ends are summarized together
+    clusters = []
     for vertex in graph_view.vertices:
         if not vertex.hadronization:
             continue
         
         class Walk:
             particles = set()
-            vertices = set()
             failed = False
             
         def walker(particle, depth):
@@ -179,12 +217,18 @@ def contract_clusters(graph_view):
             continue
             
         cluster_ends = set(p.end_vertex for p in Walk.particles if p.final_state)
-        vsummary = graph_view.summarize_vertices(cluster_ends)
+        clusters.extend((obj, vertex) for obj in chain(Walk.particles, cluster_ends))
+
+    vertex_groups, particle_groups = [], []
+    for group in related_groups(clusters, min_size=1):
+        particle_groups.append([obj for obj in group if isinstance(obj, ViewParticle)])
+        vertex_groups.append([obj for obj in group if isinstance(obj, ViewVertex)])
+    vsummaries, psummaries = graph_view.summarize_groups(vertex_groups, particle_groups)
+    for particles, vsummary, psummary in zip(particle_groups, vsummaries, psummaries):
         vsummary.tag("cluster")
-        vsummary.cluster_nvertices = len(Walk.vertices)
-        psummary = graph_view.summarize_particles(Walk.particles)
+        vsummary.cluster_nvertices = len(vsummary.vertex_numbers)
         psummary.tag("cluster")
-        psummary.cluster_nparticles = len(Walk.particles)
+        psummary.cluster_nparticles = len(particles)
 
 @Transform.decorate("NoLoops")
 def contract_loops(graph_view):
@@ -202,7 +246,11 @@ def contract_loops(graph_view):
                                    Arg("keep_up", int, "max depth to ascend from vertex", default=20)])
 def pluck(graph_view, start, end, param, keep_down, keep_up):
     """
-    Keep a specific vertex and particles travelling through it
+    Keep a specific vertex and particles travelling through it.
+
+    Everything at most keep_down + 1 steps down or keep_up + 1 steps up from
+    the start vertex of a particle in the range is kept, counting each
+    particle and vertex on the shortest way as a step.
     """
     
     if not end:
@@ -210,28 +258,19 @@ def pluck(graph_view, start, end, param, keep_down, keep_up):
 
     keep_particles = [] #particle for particle in graph_view.particles if abs(particle.pdgid) in keep]
     for particle in graph_view.particles:
-        if particle.pdgid == -6: print(abs(getattr(particle, param)))
         if hasattr(particle, param):
             if start <= abs(getattr(particle, param)) <= end:
                 keep_particles.append(particle)
 
-    keep_objects = set()
-    max_depth = keep_down
-    def walker(vertex, depth):
-        keep_objects.add(vertex)
-        log.debug("vertex depth = %d" %depth)
-        if depth > max_depth:
-            return ()
-
-    for p in keep_particles:
-        max_depth = keep_down
-        graph_view.walk(p.start_vertex, vertex_action=walker, particle_action=walker)
-        max_depth = keep_up
-        graph_view.walk(p.start_vertex, vertex_action=walker, particle_action=walker, ascend=True)
+    # Objects one step beyond the depth limits are kept, their neighbours not.
+    # Depths are shortest distances. Depth first walks from each particle
+    # used to reach some objects along a longer way first, and kept fewer.
+    starts = set(p.start_vertex for p in keep_particles)
+    keep_objects = set(graph_view.distances(starts, max_depth=keep_down + 1))
+    keep_objects.update(graph_view.distances(starts, ascend=True, max_depth=keep_up + 1))
     
-    for obj in list(graph_view.particles) + list(graph_view.vertices):
-        if obj not in keep_objects:
-            graph_view.drop(obj)
+    graph_view.drop_all([obj for obj in chain(graph_view.particles, graph_view.vertices)
+                         if obj not in keep_objects])
 
 class Unsummarize(Transform):
     """
@@ -269,21 +308,16 @@ class Unsummarize(Transform):
 @Transform.decorate("Shallow")
 def shallow(graph_view, drop_depth=10):
     """
-    Take only the first `drop_depth`
+    Take only the first `drop_depth` steps from the initial vertices, counting
+    each particle and vertex on the shortest way as a step.
     """
-    keep_objects = set()
-    
-    def walker(obj, depth):
-        if depth <= drop_depth:
-            keep_objects.add(obj)
-    
-    for vertex in graph_view.vertices:
-        if vertex.initial:
-            graph_view.walk(vertex, vertex_action=walker, particle_action=walker)
+    # A depth first walk from each initial vertex used to reach some objects
+    # along a longer way first, and kept fewer.
+    initial_vertices = [vertex for vertex in graph_view.vertices if vertex.initial]
+    keep_objects = set(graph_view.distances(initial_vertices, max_depth=drop_depth))
     
-    for obj in list(graph_view.particles) + list(graph_view.vertices):
-        if obj not in keep_objects:
-            graph_view.drop(obj)
+    graph_view.drop_all([obj for obj in chain(graph_view.particles, graph_view.vertices)
+                         if obj not in keep_objects])
             
 @Transform.decorate("MergeVertices")
 def merge_vertices(graph_view):
@@ -291,16 +325,14 @@ def merge_vertices(graph_view):
     Merge vertices by position. Required by some generators which don't connect 
     particles together.
     """
-    vertices_by_position = defaultdict(list)
-    for vertex in graph_view.vertices:
-        if vertex.event_vertex.position:
-            pos = tuple(float(v) for v in vertex.event_vertex.position)
-            if pos != (0,0,0,0):
-                vertices_by_position[pos].append(vertex)
+    def positions():
+        for vertex in graph_view.vertices:
+            if vertex.event_vertex.position:
+                pos = tuple(float(v) for v in vertex.event_vertex.position)
+                if pos != (0,0,0,0):
+                    yield vertex, pos
 
-    for pos, vertices in sorted(vertices_by_position.iteritems()):
-        if len(vertices) >= 2:
-            summary = graph_view.summarize_vertices(vertices)
+    graph_view.summarize_groups(vertex_groups=related_groups(positions()))
 
 
 class Cut(Transform):
@@ -363,11 +395,6 @@ class Cut(Transform):
 
             return (reject if not reverse else not reject)
 
-        keep = set()
-        def mark(item, depth):
-            keep.add(item)
-            item.tag(passed_tag)
-
         particles_to_walk = set()
 
         for particle in particles:
@@ -386,32 +413,33 @@ class Cut(Transform):
                     if mothers or daughters:
                         particles_to_walk.add(particle)
 
-        for p in particles_to_walk:
-            graph_view.walk(p, vertex_action=mark, particle_action=mark, ascend=True)
-
-        def pruner(item, depth):
-            if passed_tag in item.tags:
-                return ()
+        # Keep everything which leads to a particle passing the cut, found in
+        # one search up from all of them
+        reachability = graph_view.reachability
+        seeds = [reachability.index[p] for p in particles_to_walk]
+        keep = set(reachability.nodes[i]
+                   for i in reachability.search(seeds, ascend=True))
+        for item in keep:
+            item.tag(passed_tag)
 
+        # Summarize the daughters of kept vertices which are cut away, and
+        # their ends. Ends shared by the daughters of several kept vertices
+        # become one summary.
+        cut_ends, cut_daughter_groups = [], []
         for vertex in graph_view.vertices:
             if passed_tag in vertex.tags:
                 cut_daughters = [p for p in vertex.outgoing if passed_tag not in p.tags]
-                #print vertex, cut_daughters
                 if len(cut_daughters) > 0:
-                    vsummary = graph_view.summarize_vertices(set(d.end_vertex for d in cut_daughters))
-                    vsummary.tag("cut_summary")
-                    psummary = graph_view.summarize_particles(set(cut_daughters))
-                    psummary.tag("cut_summary")
-
-        for p in graph_view.particles:
-            if p in keep:
-                continue
+                    cut_daughter_groups.append(cut_daughters)
+                    cut_ends.extend((d.end_vertex, vertex) for d in cut_daughters)
 
-            if p.start_vertex in keep: # and not p.start_vertex.hadronization:
-                # Don't discard
-                continue
+        vsummaries, psummaries = graph_view.summarize_groups(
+            related_groups(cut_ends, min_size=1), cut_daughter_groups)
+        for summary in chain(vsummaries, psummaries):
+            summary.tag("cut_summary")
 
-            graph_view.drop(p)
+        graph_view.drop_all([p for p in graph_view.particles
+                             if p not in keep and p.start_vertex not in keep])
 
         #Clean out 'dangling' vertices
         for vertex in graph_view.vertices:
@@ -0,0 +1,114 @@
+"""
+Properties of particle species from the pythia particle database
+(ParticleData.xml), by PDG id.
+"""
+
+from .. import log; log = log.getChild(__name__)
+
+from collections import namedtuple
+from xml.etree.cElementTree import fromstring
+from pkg_resources import resource_string
+
+# Flags of the kinds of particle a species is
+(INVISIBLE, GLUON, GLUINO, PHOTON, BOSON, QUARK, SQUARK, LEPTON, SLEPTON,
+ CHARGINO) = [1 << i for i in xrange(10)]
+
+INVISIBLE_IDS = frozenset([12, 14, 16, 18, 25, 35, 36, 39,
+                           1000039, 1000012, 1000014, 1000016,
+                           1000022, 1000023, 1000025, 1000035])
+
+# `charge` in units of e, `spin` in units of hbar, None if unknown
+Classification = namedtuple("Classification", "flags charge spin")
+
+species = None
+classifications = None
+
+def get_species():
+    """
+    Return a dictionary from PDG id to the attributes of that species in
+    ParticleData.xml, including antiparticles. Read once, when first needed.
+    """
+    global species
+    if species is None:
+        species = {}
+        xml_data = resource_string("mcviz.utils.svg.data", "ParticleData.xml")
+        for particle in fromstring(xml_data).getiterator("particle"):
+            attributes = particle.attrib
+            pdgid = int(attributes["id"])
+            species[pdgid] = attributes
+            if "antiName" in attributes:
+                species[-pdgid] = attributes
+        log.debug("read %i particle species" % len(species))
+    return species
+
+def species_flags(pdgid):
+    "The kinds of particle the species `pdgid` is, as flags"
+    a = abs(pdgid)
+    flags = 0
+    if a in INVISIBLE_IDS:
+        flags |= INVISIBLE
+    if pdgid == 21:
+        flags |= GLUON
+    if pdgid == 1000021:
+        flags |= GLUINO
+    if pdgid == 22:
+        flags |= PHOTON
+    if 21 <= a <= 25 or 32 <= a <= 37 or pdgid in (39, 5000039):
+        flags |= BOSON
+    if 1 <= a <= 8:
+        flags |= QUARK
+    if 1000001 <= a <= 1000006 or 2000001 <= a <= 2000006:
+        flags |= SQUARK
+    if 11 <= a <= 18:
+        flags |= LEPTON
+    if 1000011 <= a <= 1000016 or 2000011 <= a <= 2000016:
+        flags |= SLEPTON
+    if a in (1000024, 1000037):
+        flags |= CHARGINO
+    return flags
+
+def make_classification(pdgid):
+    attributes = get_species().get(pdgid)
+    if attributes is None:
+        return Classification(species_flags(pdgid), 0., None)
+    charge = int(attributes.get("chargeType", 0)) / 3.
+    # spinType is 2s+1, 0 where it is not defined
+    spin_type = int(attributes.get("spinType", 0))
+    spin = (spin_type - 1) / 2. if spin_type else None
+    return Classification(species_flags(pdgid), -charge if pdgid < 0 else charge,
+                          spin)
+
+def get_classifications():
+    """
+    Return a dictionary from PDG id to the Classification of every species in
+    ParticleData.xml. Made once, when first needed.
+    """
+    global classifications
+    if classifications is None:
+        classifications = dict((pdgid, make_classification(pdgid))
+                               for pdgid in get_species())
+    return classifications
+
+def classify(pdgid):
+    """
+    The Classification of the species `pdgid`. Species which are not in the
+    database are classified by their id alone, and taken as neutral.
+    """
+    table = get_classifications()
+    found = table.get(pdgid)
+    if found is None:
+        found = table[pdgid] = make_classification(pdgid)
+    return found
+
+def classify_all(pdgids):
+    "The Classifications of the species `pdgids`, in the same order"
+    table = get_classifications()
+    get = table.get
+    return [get(pdgid) or classify(pdgid) for pdgid in pdgids]
+
+def charge(pdgid):
+    """
+    Electric charge of the species `pdgid`, in units of e. Species which are
+    not in the database are taken as neutral.
+    """
+    return classify(pdgid).charge
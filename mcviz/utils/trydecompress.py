@@ -1,28 +1,259 @@
+"""
+Transparently decompress input files while they are being read.
+
+The compression is detected from the first bytes of a file and the data is
+decompressed in chunks as it is consumed, so that neither the compressed nor
+the decompressed file is ever held in memory in one piece.
+
+Standard input ("-") and named pipes can be read as well. They can only be
+read once, but may first be opened to peek at their start, which is then
+read again when they are opened for real.
+"""
+
+from .. import log; log = log.getChild(__name__)
+
+from os import stat
+from stat import S_ISREG
+from sys import stdin
+from zlib import decompressobj, MAX_WBITS
+
+from mcviz.exception import FatalError
 
 try:
-    from zlib import error as zliberror
+    from bz2 import BZ2Decompressor
 except ImportError:
-    # Just in case. If zlib isn't available for some crazy reason.
-    class zliberror(Exception): pass
+    BZ2Decompressor = None
 
 try:
-    from gzip import GzipFile
+    from lzma import LZMADecompressor
 except ImportError:
-    GzipFile = None
+    try:
+        from backports.lzma import LZMADecompressor
+    except ImportError:
+        LZMADecompressor = None
+
 
-from cStringIO import StringIO
+CHUNK_SIZE = 1 << 16
 
-def try_decompress(data):
+MAGIC = [("gzip", "\x1f\x8b"),
+         ("bz2", "BZh"),
+         ("xz", "\xfd7zXZ\x00")]
+MAGIC_SIZE = max(len(magic) for kind, magic in MAGIC)
+
+DECOMPRESSORS = {
+    # 16 + MAX_WBITS: expect a gzip header and trailer around the stream
+    "gzip": lambda: decompressobj(16 + MAX_WBITS),
+    "zlib": decompressobj,
+    "bz2": BZ2Decompressor,
+    "xz": LZMADecompressor,
+}
+
+def looks_like_zlib(magic):
+    "zlib streams start with a deflate header whose first two bytes are 0 mod 31"
+    return (len(magic) >= 2 and magic[0] == "\x78" and
+            (ord(magic[0]) * 256 + ord(magic[1])) % 31 == 0)
+
+def compression(magic):
     """
-    Try various decompression algorithms on `data`, return the decompressed
-    output
+    Identify the compression of data starting with `magic` (the first
+    MAGIC_SIZE bytes). Returns None for uncompressed data.
     """
-    for encoding in "zlib zip bz2 gzip".split():
+    for kind, kind_magic in MAGIC:
+        if magic.startswith(kind_magic):
+            return kind
+    if looks_like_zlib(magic):
+        return "zlib"
+    return None
+
+STDIN = "-"
+
+def is_stream(filename):
+    """
+    Is `filename` standard input or another file which can only be read once,
+    such as a named pipe?
+    """
+    if filename == STDIN:
+        return True
+    try:
+        return not S_ISREG(stat(filename).st_mode)
+    except OSError:
+        return False
+
+def is_compressed(filename):
+    with open(filename, "rb") as fd:
+        return compression(fd.read(MAGIC_SIZE)) is not None
+
+class StreamInput(object):
+    """
+    Standard input or a named pipe. The data read while it is opened to peek
+    at it is kept, and read again when it is next opened. Once it has been
+    opened without peeking it can't be opened again.
+    """
+    def __init__(self, name, fd):
+        self.name = name
+        self.fd = fd
+        # Data to be read before any more is read from fd, and data read
+        # while peeking
+        self.replay, self.kept = "", ""
+        self.peeking, self.opened = False, False
+
+    def reopen(self, peek):
+        if self.opened and not self.peeking:
+            raise IOError('"{0}" can only be read once'.format(self.name))
+        self.replay, self.kept = self.kept + self.replay, ""
+        self.peeking, self.opened = peek, True
+        return self
+
+    def read(self, size=-1):
+        if size < 0:
+            data = self.replay + self.fd.read()
+        else:
+            data = self.replay[:size]
+            if len(data) < size:
+                data += self.fd.read(size - len(data))
+        self.replay = self.replay[len(data):]
+        if self.peeking:
+            self.kept += data
+        return data
+
+    def readline(self):
+        # Lines are read from fd one at a time, so that each event of a live
+        # stream is seen as soon as it has been written
+        end = self.replay.find("\n") + 1
+        if end:
+            line, self.replay = self.replay[:end], self.replay[end:]
+        else:
+            line, self.replay = self.replay + self.fd.readline(), ""
+        if self.peeking:
+            self.kept += line
+        return line
+
+    def unread(self, data):
+        "Put back `data`, which was just read"
+        self.replay = data + self.replay
+        if self.peeking:
+            self.kept = self.kept[:len(self.kept) - len(data)]
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        if not self.peeking:
+            self.fd.close()
+
+# The streams opened so far, by name
+streams = {}
+
+def open_stream(filename, peek=False):
+    """
+    Open standard input or a named pipe. See StreamInput.
+    """
+    stream = streams.get(filename)
+    if stream is None:
+        fd = stdin if filename == STDIN else open(filename, "rb")
+        stream = streams[filename] = StreamInput(filename, fd)
+    return stream.reopen(peek)
+
+class DecompressingReader(object):
+    """
+    A read-only file-like object which decompresses `fd` as it is read.
+    `head` is data already read from `fd` (e.g. to sniff the compression).
+    """
+    def __init__(self, fd, kind, head=""):
+        self.fd = fd
+        self.kind = kind
+        self.decompressor = DECOMPRESSORS[kind]()
+        self.pending = head
+        self.buffer, self.pos = "", 0
+
+    def fill(self):
+        """
+        Decompress the next chunk of input into the buffer.
+        Returns False at the end of the input.
+        """
+        data = self.pending or self.fd.read(CHUNK_SIZE)
+        self.pending = ""
+        if not data:
+            return False
         try:
-            if encoding == "gzip" and GzipFile is not None:
-                data = GzipFile(fileobj=StringIO(data)).read()
-                continue
-            data = data.decode(encoding)
-        except (zliberror, IOError, LookupError):
-            pass
-    return data
+            chunk = self.decompressor.decompress(data)
+        except EOFError:
+            # The previous stream ended exactly at a chunk boundary
+            self.decompressor = DECOMPRESSORS[self.kind]()
+            chunk = self.decompressor.decompress(data)
+        unused = getattr(self.decompressor, "unused_data", "")
+        if unused:
+            # Concatenated streams (e.g. `cat a.gz b.gz`): start over
+            self.decompressor = DECOMPRESSORS[self.kind]()
+            self.pending = unused
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) - self.pos < size:
+            if not self.fill():
+                break
+        end = len(self.buffer) if size < 0 else self.pos + size
+        data = self.buffer[self.pos:end]
+        self.pos += len(data)
+        return data
+
+    def readline(self):
+        while True:
+            end = self.buffer.find("\n", self.pos)
+            if end >= 0:
+                line = self.buffer[self.pos:end+1]
+                self.pos = end + 1
+                return line
+            if not self.fill():
+                line = self.buffer[self.pos:]
+                self.buffer, self.pos = "", 0
+                return line
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        self.fd.close()
+
+def open_decompressed(filename, peek=False):
+    """
+    Open `filename` for reading. gzip, bzip2, xz and zlib compressed files are
+    decompressed as they are read. `peek` only matters for streams (see
+    StreamInput), which are read again from the start after peeking.
+    """
+    if is_stream(filename):
+        fd = open_stream(filename, peek)
+    else:
+        fd = open(filename, "rb")
+    head = fd.read(MAGIC_SIZE)
+    kind = compression(head)
+    if kind is None:
+        if isinstance(fd, StreamInput):
+            fd.unread(head)
+        else:
+            fd.seek(0)
+        return fd
+
+    if DECOMPRESSORS[kind] is None:
+        fd.close()
+        log.fatal('"{0}" is {1} compressed, but this python has no {1} support'
+                  .format(filename, kind))
+        if kind == "xz":
+            log.fatal("xz input needs python 3.3 or the backports.lzma module")
+        raise FatalError
+    log.debug('reading {0} compressed "{1}"'.format(kind, filename))
+    return DecompressingReader(fd, kind, head)
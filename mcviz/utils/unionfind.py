@@ -0,0 +1,55 @@
+"""
+Disjoint sets, for grouping objects which are related to each other
+through a chain of pairwise relations.
+"""
+
+class UnionFind(object):
+    """
+    A forest of disjoint sets of hashable items, with path halving and
+    union by size. Items are added when first mentioned.
+    """
+    def __init__(self, items=()):
+        self.parent = {}
+        self.size = {}
+        self.order = []
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+            self.order.append(item)
+
+    def find(self, item):
+        "The representative of the set containing `item`"
+        self.add(item)
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a, b):
+        "Join the sets containing `a` and `b`"
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+    def groups(self):
+        """
+        The sets as lists, in the order their first items were added, each in
+        the order its items were added
+        """
+        index, groups = {}, []
+        for item in self.order:
+            root = self.find(item)
+            if root not in index:
+                index[root] = len(groups)
+                groups.append([])
+            groups[index[root]].append(item)
+        return groups
@@ -9,19 +9,27 @@ from .utils.timer import Timer
 
 class GraphWorkspace(object):
 
-    def __init__(self, name, event_graph, cmdline=""):
+    def __init__(self, name, event_graph=None, cmdline="", event_number=0):
         
         self.log = log.getChild(name)
         self.log.debug('Creating new graph workspace {0}'.format(name))
         self.timer = Timer(self.log)
         
         self.name = name
-        self.event_graph = event_graph
         self.cmdline = cmdline
-                
+        self.tools = {}
+        if event_graph is not None:
+            self.set_event(event_graph, event_number)
+
+    def set_event(self, event_graph, event_number=0):
+        """
+        Work on another event. The tools are kept, so that a workspace can
+        draw many events one after the other.
+        """
+        self.event_graph = event_graph
+        self.event_number = event_number
         self.graph_view = GraphView(event_graph)
         self.layout = None
-        self.tools = {}
 
     def load_tools(self, options):
         debug_tools()
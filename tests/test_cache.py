@@ -0,0 +1,91 @@
+from os import listdir, stat, utime
+from os.path import exists
+
+from mcviz import parse_options
+from mcviz.graph import cache
+from mcviz.graph.cache import EventCache, read_event, write_event, prune
+from mcviz.graph.graph import EventGraph
+
+from test_loaders import sample
+
+def event_args(filename, *options):
+    parser, args = parse_options(list(options) + [filename])
+    return args
+
+def canonical(event_graph):
+    particles = [(p.no, p.pdgid, p.status, p.color, p.anticolor, p.p, p.e, p.m,
+                  p.name, p.other_flow, p.vertex_in.vno, p.vertex_out.vno)
+                 for no, p in sorted(event_graph.particles.iteritems())]
+    vertices = [(v.vno, sorted(p.no for p in v.incoming),
+                 sorted(p.no for p in v.outgoing), v.position)
+                for vno, v in sorted(event_graph.vertices.iteritems())]
+    units = event_graph.units.energy_mag, event_graph.units.length_mag
+    return particles, vertices, units, event_graph.pdfinfo
+
+def test_round_trip(tmpdir):
+    for name in ("events.hepmc", "events.pythia", "events.lhe"):
+        args = event_args(sample(tmpdir, name) + ":2", "--no-cache")
+        event_graph = EventGraph.load(args)
+        path = str(tmpdir.join(name + ".mcvizev"))
+        write_event(path, event_graph)
+        cached = read_event(path, EventGraph)
+        assert cached.columns is not None
+        assert canonical(cached) == canonical(event_graph)
+
+    # Anything else is not an event
+    with open(path, "r+b") as fd:
+        fd.write("X")
+    assert read_event(path, EventGraph) is None
+    assert read_event(str(tmpdir.join("missing")), EventGraph) is None
+
+def test_cache_invalidation(tmpdir, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmpdir.join("cache")))
+    filename = sample(tmpdir, "events.hepmc")
+    args = event_args(filename + ":1")
+    event_cache = EventCache(filename, args)
+    assert not event_cache.has(1)
+
+    event_number, event_graph = next(EventGraph.load_events(args))
+    assert event_cache.has(1)
+    assert canonical(event_cache.get(1, EventGraph)) == canonical(event_graph)
+
+    # The input is modified
+    st = stat(filename)
+    utime(filename, (st.st_atime, st.st_mtime + 10))
+    assert not event_cache.has(1)
+    next(EventGraph.load_events(args))
+    assert event_cache.has(1)
+
+    with open(filename, "ab") as fd:
+        fd.write("\n")
+    utime(filename, (st.st_atime, st.st_mtime + 10))
+    assert not event_cache.has(1) and event_cache.get(1, EventGraph) is None
+
+    # Options which change how events are parsed have their own cache
+    assert not EventCache(filename, event_args(filename, "--units", "MEV")).has(1)
+    assert not EventCache(filename, event_args(filename, "--format", "lhe")).has(1)
+
+def test_prune(tmpdir, monkeypatch):
+    cache_dir = tmpdir.join("cache")
+    monkeypatch.setattr(cache, "CACHE_DIR", str(cache_dir))
+    filename = sample(tmpdir, "events.hepmc")
+    paths = []
+    for event_number in range(4):
+        args = event_args("%s:%i" % (filename, event_number))
+        next(EventGraph.load_events(args))
+        paths.append(EventCache(filename, args).path(event_number))
+        utime(paths[-1], (0, 1000 * event_number))
+    sizes = [stat(path).st_size for path in paths]
+    assert sorted(listdir(str(cache_dir))) == sorted(p.rpartition("/")[2] for p in paths)
+
+    # Event 0 is used again
+    assert EventCache(filename, args).get(0, EventGraph) is not None
+    prune(sizes[0] + sizes[3])
+    assert [exists(path) for path in paths] == [True, False, False, True]
+    prune(0)
+    assert listdir(str(cache_dir)) == []
+
+    # Storing an event keeps the cache small
+    monkeypatch.setattr(cache, "CACHE_SIZE", 0)
+    next(EventGraph.load_events(args))
+    assert listdir(str(cache_dir)) == []
@@ -0,0 +1,91 @@
+from mcviz.graph.columns import EventColumns, ColumnParticle, ColumnVertex
+from mcviz.graph.graph import EventGraph
+from mcviz.graph.view import GraphView
+from mcviz.graph.loaders.hepmc import load_single_event
+from mcviz.graph.loaders.pythialog import read_events, make_event
+
+from test_loaders import HEPMC_EVENT, sample
+
+PARTICLE_ATTRIBUTES = ("no", "pdgid", "status", "color", "anticolor", "p", "e",
+                       "m", "name", "other_flow", "pt", "eta", "phi",
+                       "initial_state", "final_state")
+
+def numbers(particles):
+    return sorted(p.no for p in particles)
+
+def check_columns(vertices, particles):
+    "The columns of an event look just like its Particles and Vertices"
+    columns = EventColumns.from_graph(vertices, particles)
+    cvertices, cparticles = columns.vertices, columns.particles
+    assert list(cparticles) == sorted(particles)
+    for no, p in particles.iteritems():
+        cp = cparticles[no]
+        assert isinstance(cp, ColumnParticle)
+        for attribute in PARTICLE_ATTRIBUTES:
+            assert getattr(cp, attribute) == getattr(p, attribute), (no, attribute)
+        assert cp.vertex_in.vno == p.vertex_in.vno
+        assert cp.vertex_out.vno == p.vertex_out.vno
+        assert numbers(cp.mothers) == numbers(p.mothers)
+        assert numbers(cp.daughters) == numbers(p.daughters)
+
+    assert list(cvertices) == sorted(vertices)
+    for vno, v in vertices.iteritems():
+        cv = cvertices[vno]
+        assert isinstance(cv, ColumnVertex)
+        assert cv.vno == vno
+        assert numbers(cv.incoming) == numbers(v.incoming)
+        assert numbers(cv.outgoing) == numbers(v.outgoing)
+        if columns.position is None:
+            assert cv.position is v.position is None
+        else:
+            # Vertices without a position are at the origin
+            assert cv.position == tuple(map(float, v.position or (0, 0, 0, 0)))
+    return columns
+
+def test_hepmc_columns():
+    class args: units = None
+    vertices, particles, units, pdfinfo = load_single_event(
+        [line.split() for line in HEPMC_EVENT], args)
+    columns = check_columns(vertices, particles)
+    assert columns.vertices[-3].position == (0.1, 0.2, 0.3, 0.4)
+    assert columns.particles[4].other_flow == {3: 7}
+
+def test_pythia_columns(tmpdir):
+    for event_number, lines in read_events(sample(tmpdir, "events.pythia"), None):
+        vertices, particles, units = make_event(lines, None)
+        columns = check_columns(vertices, particles)
+        assert columns.position is None
+
+        # Views are made afresh on every look up, but are the same
+        cparticles = columns.particles
+        assert cparticles[3] == cparticles[3] and hash(cparticles[3]) == hash(cparticles[3])
+        assert cparticles[3] != cparticles[4]
+        assert len(set([cparticles[3], cparticles[3]])) == 1
+        assert len(cparticles) == len(particles) and 0 not in cparticles
+
+        # Drawing the columns is the same as drawing the objects
+        event = EventGraph(vertices, particles, units)
+        columnar = event.to_columns()
+        assert columnar.columns is not None and columnar.to_columns() is columnar
+        assert columnar.kinematics is event.kinematics
+        view, cview = GraphView(event), GraphView(columnar)
+        assert [p.reference for p in view.particles] == [p.reference for p in cview.particles]
+        assert [(v.reference, [p.reference for p in v.outgoing]) for v in view.vertices] == \
+            [(v.reference, [p.reference for p in v.outgoing]) for v in cview.vertices]
+
+def test_columns_from_lists():
+    "Particles are sorted by number, and empty vertices are left out"
+    momenta = [[1., 2., 3.], [0., 0., 1.], [0., 0., 0.], [4., 5., 6.], [0., 0., 0.]]
+    columns = EventColumns.from_lists(
+        [7, 2, 5], [21, 2212, 1], [2, 4, 1], [501, 0, 502], [0, 0, 501],
+        momenta, {0: {3: 9}},
+        [(-3, [], [], None), (-2, [0], [2], (1., 2., 3., 4.)), (-1, [1], [0], None)])
+    particles, vertices = columns.particles, columns.vertices
+    assert list(particles) == [2, 5, 7] and list(vertices) == [-2, -1]
+    assert [particles[no].pdgid for no in (2, 5, 7)] == [2212, 1, 21]
+    assert particles[7].p == (1., 0., 0.) and particles[7].e == 4.
+    assert particles[7].other_flow == {3: 9}
+    assert particles[5].vertex_in == vertices[-2] and particles[5].final_state
+    assert numbers(particles[2].daughters) == [7] and particles[2].initial_state
+    assert vertices[-2].position == (1., 2., 3., 4.)
+    assert vertices[-1].position == (0., 0., 0., 0.)
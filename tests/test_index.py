@@ -0,0 +1,69 @@
+from os import utime, stat
+
+from mcviz.graph.loaders import index
+from mcviz.graph.loaders.index import EventIndex, get_index
+from mcviz.graph.loaders.hepmc import index_events, read_events, event_generator
+
+from test_loaders import sample
+
+def test_index_rebuilt_when_file_changes(tmpdir):
+    path = sample(tmpdir, "events.hepmc")
+    scans = []
+    def scanner(fd):
+        scans.append(fd.name)
+        return index_events(fd)
+
+    index = get_index(path, "hepmc", scanner)
+    assert len(index) == 4 and len(scans) == 1
+    assert EventIndex.read(path, "hepmc").entries == index.entries
+    get_index(path, "hepmc", scanner)
+    assert len(scans) == 1
+
+    # Only the modification time changes
+    st = stat(path)
+    utime(path, (st.st_atime, st.st_mtime + 10))
+    assert EventIndex.read(path, "hepmc") is None
+    assert get_index(path, "hepmc", scanner).entries == index.entries
+    assert len(scans) == 2
+
+    # Only the size changes
+    with open(path, "rb") as fd:
+        data = fd.read()
+    start = data.index("\nE 1 ") + 1
+    with open(path, "wb") as fd:
+        fd.write(data[:start] + data[data.index("\nE 2 ") + 1:])
+    utime(path, (st.st_atime, st.st_mtime + 10))
+    assert EventIndex.read(path, "hepmc") is None
+    assert len(get_index(path, "hepmc", scanner)) == 3
+    assert len(scans) == 3
+
+def test_indexed_read_matches_sequential(tmpdir):
+    path = sample(tmpdir, "events.hepmc")
+    with open(path) as fd:
+        sequential = list(enumerate(event_generator(line for line in fd
+                                                    if not line.startswith("HepMC::"))))
+    assert len(sequential) == 4
+
+    assert list(read_events(path, [1, 3])) == [sequential[1], sequential[3]]
+    assert EventIndex.read(path, "hepmc") is not None
+    # Read again, now seeking with the stored index
+    assert list(read_events(path, None)) == sequential
+
+def test_index_location(tmpdir, monkeypatch):
+    cache = tmpdir.mkdir("cache")
+    monkeypatch.setattr(index, "XDG_CACHE_HOME", str(cache))
+
+    # Next to the input file
+    path = sample(tmpdir, "events.hepmc")
+    get_index(path, "hepmc", index_events)
+    assert tmpdir.join("events.hepmc" + index.INDEX_SUFFIX).check()
+    assert not cache.listdir()
+
+    # In the cache if the input file is in a checkout
+    checkout = tmpdir.mkdir("checkout")
+    checkout.mkdir(".git")
+    path = sample(checkout.mkdir("data"), "events.hepmc")
+    get_index(path, "hepmc", index_events)
+    assert not checkout.join("data", "events.hepmc" + index.INDEX_SUFFIX).check()
+    assert len(cache.listdir()) == 1
+    assert EventIndex.read(path, "hepmc") is not None
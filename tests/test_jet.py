@@ -0,0 +1,66 @@
+from math import cos, cosh, pi, sin, sinh
+from random import Random
+
+from mcviz.jet import cluster_jets, JetAlgorithms
+from mcviz.jet.clustering import TiledPlane
+
+class Particle(object):
+    def __init__(self, pt, y, phi):
+        self.p = pt * cos(phi), pt * sin(phi), pt * sinh(y)
+        self.e = pt * cosh(y)
+
+def naive_cluster(particles, p, r):
+    "Clustering by comparing every pair at every step"
+    geometry = TiledPlane(r)
+    jets, found = {}, []
+    for i, particle in enumerate(particles):
+        jets[i] = [particle], tuple(particle.p) + (particle.e,)
+        geometry.add(i, *jets[i][1])
+    n = len(particles)
+    def factor(i):
+        return geometry.momentum_factor(*(jets[i][1] + (p,)))
+    while jets:
+        i, j = min(((factor(i), i, None) for i in jets), key=lambda x: x[0])[1:]
+        best = factor(i)
+        for a in jets:
+            for b in jets:
+                if a < b:
+                    d = min(factor(a), factor(b)) * geometry.distance(a, b) / (r * r)
+                    if d < best:
+                        best, i, j = d, a, b
+        if j is None:
+            found.append(jets.pop(i)[0])
+            continue
+        (pi_, mi), (pj, mj) = jets.pop(i), jets.pop(j)
+        jets[n] = pi_ + pj, tuple(x + y for x, y in zip(mi, mj))
+        geometry.add(n, *jets[n][1])
+        n += 1
+    return found
+
+def jet_contents(jets):
+    return sorted(sorted(id(p) for p in jet) for jet in jets)
+
+def test_separated_clusters():
+    particles = [Particle(50., 0.1, 1.), Particle(30., 0.15, 1.1), Particle(10., 0., 0.9),
+                 Particle(40., -1.5, 4.), Particle(20., -1.45, 4.05)]
+    jets = cluster_jets(particles, JetAlgorithms.antikt, r=0.4)
+    assert jet_contents(jet.particles for jet in jets) == jet_contents(
+        [particles[:3], particles[3:]])
+    leading = max(jets, key=lambda jet: jet.pt)
+    assert abs(leading.e - sum(p.e for p in particles[:3])) < 1e-9
+
+def test_matches_naive_clustering():
+    random = Random(1)
+    particles = [Particle(random.expovariate(0.2), random.uniform(-3, 3),
+                          random.uniform(0, 2 * pi)) for i in xrange(100)]
+    for algorithm in (JetAlgorithms.kt, JetAlgorithms.cambridge, JetAlgorithms.antikt):
+        jets = cluster_jets(particles, algorithm, r=0.6)
+        expected = naive_cluster(particles, algorithm.p, 0.6)
+        assert jet_contents(jet.particles for jet in jets) == jet_contents(expected)
+
+def test_ee_kt_exclusive():
+    particles = [Particle(50., 0.1, 1.), Particle(30., 0.15, 1.1),
+                 Particle(40., -1.5, 4.), Particle(20., -1.45, 4.05)]
+    jets = cluster_jets(particles, JetAlgorithms.ee_kt, n_jets=2)
+    assert jet_contents(jet.particles for jet in jets) == jet_contents(
+        [particles[:2], particles[2:]])
@@ -0,0 +1,385 @@
+from os.path import dirname, join as pjoin
+
+from mcviz import FatalError
+from mcviz.graph.loaders import parse_event_spec
+from mcviz.utils.trydecompress import open_decompressed
+
+from test_trydecompress import gzipped
+
+TESTS_DIR = dirname(__file__)
+
+def sample(tmpdir, name, compress=False):
+    """
+    A copy of the sample event file `name` in `tmpdir`, gzipped if
+    `compress`, so that no index is written next to the original
+    """
+    with open(pjoin(TESTS_DIR, name), "rb") as fd:
+        data = fd.read()
+    if compress:
+        name, data = name + ".gz", gzipped(data)
+    path = str(tmpdir.join(name))
+    with open(path, "wb") as fd:
+        fd.write(data)
+    return path
+
+def test_parse_event_spec():
+    assert parse_event_spec("events.hepmc") == ("events.hepmc", [0])
+    assert parse_event_spec("events.hepmc:3") == ("events.hepmc", [3])
+    assert parse_event_spec("events.hepmc:all") == ("events.hepmc", None)
+    assert parse_event_spec("a.log:7-9,1,8") == ("a.log", [1, 7, 8, 9])
+
+    try:
+        parse_event_spec("events.hepmc:3-1")
+    except FatalError:
+        pass
+    else:
+        raise Exception("backwards event range accepted")
+
+def test_stdin_events(monkeypatch):
+    from mcviz import EventGraph, parse_options
+    from mcviz.utils import trydecompress
+
+    def read_stdin(arguments):
+        parser, args = parse_options(arguments)
+        monkeypatch.setattr(trydecompress, "streams", {})
+        with open(pjoin(TESTS_DIR, "events.hepmc"), "rb") as fd:
+            monkeypatch.setattr(trydecompress, "stdin", fd)
+            return args, [n for n, event in EventGraph.load_events(args)]
+
+    # argparse would take these for options
+    args, events = read_stdin(["-:all", "--no-cache"])
+    assert args.filename == "-:all" and args.no_cache
+    assert events == [0, 1, 2, 3]
+    args, events = read_stdin(["--format", "hepmc", "-:1,3", "-t", "NoKinks"])
+    assert args.format == "hepmc" and args.transform == ["NoKinks"]
+    assert events == [1, 3]
+    assert read_stdin(["--", "-:0-1"])[1] == [0, 1]
+    assert read_stdin(["-"])[1] == [0]
+
+HEPMC_EVENT = """\
+E 1 -1 -1.0 -1.0 -1.0 0 -3 3 1 2 0 0
+U GEV MM
+V -1 0 0 0 0 0 1 1 0
+P 1 2212 0 0 7000 7000 0.938 4 0 0 -1 0
+P 3 21 1 2 50 50.1 0 3 0 0 -3 2 1 501 2 502
+V -2 0 0 0 0 0 1 1 0
+P 2 2212 0 0 -7000 7000 0.938 4 0 0 -2 0
+P 4 21 -1 -2 -40 40.1 0 3 0 0 -3 3 1 502 2 503 3 7
+V -3 0 0.1 0.2 0.3 0.4 0 1 0
+P 5 25 0 0 10 90.2 0 1 0 0 0 2 1 501 2 503
+""".splitlines()
+
+def test_hepmc_columns():
+    from mcviz.graph.loaders.hepmc import load_single_event, load_event_columns
+    class args: units = None
+
+    vertices, particles, units, pdfinfo = load_single_event(
+        [line.split() for line in HEPMC_EVENT], args)
+    cvertices, cparticles, cunits, cpdfinfo = load_event_columns(HEPMC_EVENT, args)
+
+    assert sorted(particles) == sorted(cparticles)
+    for no, p in particles.iteritems():
+        cp = cparticles[no]
+        for attr in ("pdgid", "status", "color", "anticolor", "p", "e", "m",
+                     "other_flow"):
+            assert getattr(p, attr) == getattr(cp, attr), (no, attr)
+        assert p.vertex_in.vno == cp.vertex_in.vno
+        assert p.vertex_out.vno == cp.vertex_out.vno
+
+    assert sorted(vertices) == sorted(cvertices)
+    for vno, v in vertices.iteritems():
+        cv = cvertices[vno]
+        assert sorted(p.no for p in v.incoming) == sorted(p.no for p in cv.incoming)
+        assert sorted(p.no for p in v.outgoing) == sorted(p.no for p in cv.outgoing)
+    assert cvertices[-3].position == (0.1, 0.2, 0.3, 0.4)
+    assert cparticles[4].other_flow == {3: 7}
+
+HEPMC3_EVENT = """\
+E 0 1 5
+U GEV MM
+A 0 GenPdfInfo 21 21 0.1 0.2 91 1 1 0 0
+A 3 flow1 501
+A 4 flow2 501
+A 4 flow3 7
+P 1 0 2212 0 0 7000 7000 0.938 4
+P 2 0 2212 0 0 -7000 7000 0.938 4
+V -1 0 [1,2] @ 0.1 0.2 0.3 0.4
+P 3 -1 21 1 2 50 50.1 0 2
+P 4 -1 -1 -1 -2 -40 40.1 0 2
+P 5 3 21 1 2 50 50.1 0 1
+""".splitlines()
+
+def test_hepmc3():
+    from mcviz.graph.loaders.hepmc3 import load_event_columns
+    class args: units = None
+
+    vertices, particles, units, pdfinfo = load_event_columns(HEPMC3_EVENT, args)
+    assert sorted(particles) == [1, 2, 3, 4, 5]
+    assert vertices[-1].position == (0.1, 0.2, 0.3, 0.4)
+    assert sorted(p.no for p in vertices[-1].incoming) == [1, 2]
+    assert sorted(p.no for p in vertices[-1].outgoing) == [3, 4]
+    # The vertex 3 decays in isn't written, but is still there
+    assert [p.no for p in particles[5].mothers] == [3]
+    assert particles[5].vertex_in == particles[3].vertex_out
+    assert particles[5].final_state and particles[4].final_state
+    assert particles[1].initial_state
+    assert (particles[3].color, particles[4].anticolor) == (501, 501)
+    assert particles[4].other_flow == {3: 7}
+    assert pdfinfo.x1 == "0.1"
+
+class CountingFile(object):
+    "A file which counts the lines read from it"
+    def __init__(self, fd):
+        self.fd = fd
+        self.lines = 0
+
+    def __iter__(self):
+        for line in self.fd:
+            self.lines += 1
+            yield line
+
+    def close(self):
+        self.fd.close()
+
+def test_hepmc_streaming(tmpdir):
+    from mcviz.graph.loaders.hepmc import read_events
+    expected = list(read_events(sample(tmpdir, "events.hepmc"), None))
+    assert [n for n, event in expected] == [0, 1, 2, 3]
+
+    # Compressed files can't be indexed, so they are streamed through
+    compressed = sample(tmpdir, "events.hepmc", compress=True)
+    assert list(read_events(compressed, None)) == expected
+    assert list(read_events(compressed, [1, 3])) == [expected[1], expected[3]]
+    try:
+        list(read_events(compressed, [2, 7]))
+    except FatalError:
+        pass
+    else:
+        raise Exception("missing event not noticed")
+
+def test_hepmc_streaming_stops(tmpdir, monkeypatch):
+    "Nothing is read after the last event wanted"
+    from mcviz.graph.loaders import hepmc
+    opened = []
+    def open_counting(filename):
+        opened.append(CountingFile(open_decompressed(filename)))
+        return opened[-1]
+    monkeypatch.setattr(hepmc, "open_decompressed", open_counting)
+
+    compressed = sample(tmpdir, "events.hepmc", compress=True)
+    assert [n for n, event in hepmc.read_events(compressed, [0, 1])] == [0, 1]
+    with open(pjoin(TESTS_DIR, "events.hepmc")) as fd:
+        lines = fd.readlines()
+    # The end of event 1 is only seen at the start of event 2
+    starts = [i for i, line in enumerate(lines) if line.startswith("E ")]
+    assert opened[0].lines == starts[2] + 1 < len(lines)
+
+def test_lhe_init_block(tmpdir):
+    from mcviz.graph.loaders.leshouchesevent import read_init, read_events
+    with open(pjoin(TESTS_DIR, "events.lhe")) as fd:
+        init, init_lines = read_init(fd)
+        # Reading stops at the end of the init block
+        assert next(fd).strip() == "<event>"
+    assert (init.IDBMUP1, init.IDBMUP2, init.EBMUP1, init.EBMUP2) == (2212, 2212, 7000., 7000.)
+    assert init.NPRUP == 1
+    assert init_lines == ["2212 2212 7000.0 7000.0 0 0 10042 10042 3 1",
+                          "1.0 0.1 1.0 1"]
+
+    path = sample(tmpdir, "events.lhe")
+    for event_number, (event_init, lines) in read_events(path, [0, 3]):
+        assert event_init == init
+
+def test_lhe_index(tmpdir):
+    from mcviz.graph.loaders.index import EventIndex
+    from mcviz.graph.loaders.leshouchesevent import read_events, make_event
+    class args: units = None
+
+    streamed = list(read_events(sample(tmpdir, "events.lhe", compress=True), None))
+    assert [n for n, event in streamed] == range(4)
+
+    path = sample(tmpdir, "events.lhe")
+    assert list(read_events(path, [1, 2])) == streamed[1:3]
+    index = EventIndex.read(path, "lhe")
+    assert [n_particles for offset, n_particles in index.entries] == [12] * 4
+    assert list(read_events(path, None)) == streamed
+
+    # Making an event leaves the event read alone
+    event_number, event = streamed[3]
+    lines = list(event[1])
+    vertices, particles, units = make_event(event, args)
+    assert event[1] == lines
+    assert sorted(make_event(event, args)[1]) == sorted(particles) == range(1, 15)
+    assert particles[1].pdgid == particles[2].pdgid == 2212
+    assert particles[1].e == particles[2].e == 7000.
+
+def pythia_log(tmpdir, name, hard_listings, compress=False):
+    """
+    A copy of the sample pythia log in which the listings `hard_listings` are
+    of the hard process instead of the complete event
+    """
+    from mcviz.graph.loaders.pythialog import START_COMPLETE, START_HARD
+    with open(pjoin(TESTS_DIR, "events.pythia")) as fd:
+        parts = fd.read().split(START_COMPLETE)
+    data = parts[0]
+    for i, part in enumerate(parts[1:]):
+        data += (START_HARD if i in hard_listings else START_COMPLETE) + part
+    if compress:
+        name, data = name + ".gz", gzipped(data)
+    path = str(tmpdir.join(name))
+    with open(path, "wb") as fd:
+        fd.write(data)
+    return path
+
+def test_pythia_listings(tmpdir):
+    from mcviz.graph.loaders.pythialog import read_events, make_event
+
+    path = sample(tmpdir, "events.pythia")
+    indexed = list(read_events(path, None))
+    assert [n for n, records in indexed] == range(4)
+    assert list(read_events(path, [1, 3])) == [indexed[1], indexed[3]]
+    vertices, particles, units = make_event(indexed[2][1], None)
+    # Every record but the system line is a particle
+    assert sorted(particles) == range(1, len(indexed[2][1]))
+
+    streamed = sample(tmpdir, "events.pythia", compress=True)
+    assert list(read_events(streamed, None)) == indexed
+    assert list(read_events(streamed, [2])) == [indexed[2]]
+
+    # Complete listings are drawn in preference to the others, which are
+    # numbered on their own
+    for compress in (False, True):
+        mixed = pythia_log(tmpdir, "mixed.pythia", (0, 2), compress)
+        assert list(read_events(mixed, None)) == [(0, indexed[1][1]),
+                                                  (1, indexed[3][1])]
+        hard = pythia_log(tmpdir, "hard.pythia", range(4), compress)
+        assert list(read_events(hard, [1, 2])) == indexed[1:3]
+
+def test_pythia_streaming_stops(tmpdir, monkeypatch):
+    from mcviz.graph.loaders import pythialog
+    opened = []
+    def open_counting(filename):
+        opened.append(CountingFile(open_decompressed(filename)))
+        return opened[-1]
+    monkeypatch.setattr(pythialog, "open_decompressed", open_counting)
+
+    compressed = sample(tmpdir, "events.pythia", compress=True)
+    assert [n for n, records in pythialog.read_events(compressed, [1])] == [1]
+    with open(pjoin(TESTS_DIR, "events.pythia")) as fd:
+        lines = fd.readlines()
+    ends = [i for i, line in enumerate(lines) if "End PYTHIA Event Listing" in line]
+    assert opened[0].lines == ends[1] + 1 < len(lines)
+
+def test_sniff_format(tmpdir):
+    from mcviz.graph.loaders import sniff_format, SNIFF_SIZE
+    for name, format in [("events.hepmc", "hepmc"), ("events.hepmc3", "hepmc3"),
+                         ("events.lhe", "lhe"), ("events.pythia", "pythia")]:
+        assert sniff_format(sample(tmpdir, name)) == format
+        assert sniff_format(sample(tmpdir, name, compress=True)) == format
+
+    def write(name, data):
+        path = str(tmpdir.join(name))
+        with open(path, "wb") as fd:
+            fd.write(data)
+        return path
+
+    # A pythia log with a HepMC listing starting just after its first
+    # listing is HepMC, which is tried first
+    with open(pjoin(TESTS_DIR, "events.pythia")) as fd:
+        lines = fd.readlines()
+    log = "".join(lines)
+    lines.insert(8, "HepMC::IO_GenEvent-START_EVENT_LISTING\n")
+    assert sniff_format(write("both.log", "".join(lines))) == "hepmc"
+
+    # Markers are looked for in the first SNIFF_SIZE bytes only
+    banner = "x" * 79 + "\n"
+    late = write("late.log", banner * (SNIFF_SIZE // 160) + log)
+    assert sniff_format(late) == "pythia"
+    too_late = write("too_late.log", banner * (SNIFF_SIZE // 80 + 1) + log)
+    assert sniff_format(too_late) is None
+
+    assert sniff_format(write("empty", "")) is None
+    assert sniff_format(write("text", "Nothing but text\n" * 10)) is None
+    assert sniff_format(write("text.gz", gzipped("Nothing but text\n"))) is None
+
+class Node(object):
+    "A particle which is only numbered and linked"
+    def __init__(self, no):
+        self.no = no
+        self.mothers, self.daughters = set(), set()
+
+    def __lt__(self, rhs):
+        return self.no < rhs.no
+
+def linked_particles(mothers):
+    "Particles made from {number: mother numbers}"
+    particles = dict((no, Node(no)) for no in mothers)
+    for no, numbers in mothers.iteritems():
+        for mother in numbers:
+            particles[no].mothers.add(particles[mother])
+            particles[mother].daughters.add(particles[no])
+    return [particles[no] for no in sorted(particles)]
+
+def quadratic_make_vertices(particles):
+    "make_vertices as it was, searching every vertex for the mothers"
+    from mcviz.graph import Vertex
+    vertex_dict = dict()
+    vno = 0
+    for particle in particles:
+        found_v = None
+        if frozenset(particle.mothers) in vertex_dict:
+            found_v = vertex_dict[frozenset(particle.mothers)]
+        else:
+            for v in vertex_dict.itervalues():
+                for m in particle.mothers:
+                    if m in v.incoming:
+                        found_v = v
+                        break
+                if found_v:
+                    break
+
+        if found_v:
+            found_v.outgoing.add(particle)
+            for new_mother in found_v.incoming:
+                particle.mothers.add(new_mother)
+                new_mother.daughters.add(particle)
+        elif particle.mothers:
+            vno += 1
+            vertex_dict[frozenset(particle.mothers)] = Vertex(vno, particle.mothers, [particle])
+        else:
+            vno += 1
+            vertex_dict[particle] = Vertex(vno, [], [particle])
+    return vertex_dict, vno
+
+def made_vertices(make, particles):
+    "The vertices and particles made by `make` from `particles`"
+    vertex_dict, vno = make(particles)
+    vertices = sorted((v.vno, sorted(p.no for p in v.incoming),
+                       sorted(p.no for p in v.outgoing)) for v in vertex_dict.values())
+    links = [(p.no, sorted(m.no for m in p.mothers), sorted(d.no for d in p.daughters))
+             for p in particles]
+    return vertices, links, vno
+
+def test_make_vertices(tmpdir):
+    from mcviz.graph.loaders import make_vertices
+    from mcviz.graph.loaders.pythialog import read_events
+
+    for event_number, lines in read_events(sample(tmpdir, "events.pythia"), None):
+        fields = [line.split() for line in lines[1:]]
+        # The mothers are the fifth and sixth columns, after the name
+        mothers = dict((int(f[0]), set(int(m) for m in f[4:6] if m != "0"))
+                       for f in fields)
+        assert (made_vertices(make_vertices, linked_particles(mothers)) ==
+                made_vertices(quadratic_make_vertices, linked_particles(mothers)))
+
+    # 3 and 4 are each made by a mother of 5, which comes out of the vertex
+    # made first
+    mothers = {1: (), 2: (), 3: (1,), 4: (2,), 5: (1, 2), 6: (1,)}
+    vertices, links, vno = made_vertices(make_vertices, linked_particles(mothers))
+    assert vertices == [(1, [], [1]), (2, [], [2]), (3, [1], [3, 5, 6]), (4, [2], [4])]
+    assert links[4] == (5, [1, 2], [])
+    # Previously the vertex depended on the order of a dictionary
+    old_vertices, old_links, old_vno = made_vertices(quadratic_make_vertices,
+                                                     linked_particles(mothers))
+    assert old_vertices in (vertices, [(1, [], [1]), (2, [], [2]),
+                                       (3, [1], [3, 6]), (4, [2], [4, 5])])
+    assert old_links == links and old_vno == vno == 4
@@ -0,0 +1,48 @@
+from mcviz import EventGraph, GraphWorkspace, FatalError, parse_options
+from mcviz.parallel import draw_parallel
+
+from test_loaders import sample
+
+class DotWorkspace(GraphWorkspace):
+    """
+    A workspace which writes the dot source of its layouts, and so needn't
+    run graphviz on them
+    """
+    def run_layout_engine(self):
+        pass
+
+def workspace(tmpdir, output_file, *options):
+    parser, args = parse_options(["--painter", "dot", "--jobs", "2",
+                                  "--no-cache"] + list(options))
+    args.output_file = str(tmpdir.join(output_file))
+    gw = DotWorkspace("test")
+    gw.load_tools(args)
+    return gw, args
+
+def test_draw_parallel(tmpdir):
+    path = sample(tmpdir, "events.hepmc")
+    gw, args = workspace(tmpdir, "event_{event}.dot", "--transform", "NoKinks",
+                         path + ":all")
+    draw_parallel(gw, args)
+
+    # The same events drawn one at a time
+    for event_number in range(4):
+        gw, args = workspace(tmpdir, "single.dot", "--transform", "NoKinks",
+                             "%s:%i" % (path, event_number))
+        gw.set_event(EventGraph.load(args), event_number)
+        gw.run()
+        drawn = tmpdir.join("event_%i.dot" % event_number).read()
+        assert drawn.startswith("graph {")
+        assert drawn == tmpdir.join("single.dot").read()
+
+def test_draw_parallel_failure(tmpdir):
+    "Events which fail are reported once all of the others are drawn"
+    path = sample(tmpdir, "events.hepmc")
+    gw, args = workspace(tmpdir, "event_{event}.dot", path + ":0-2")
+    gw.set_event = None
+    try:
+        draw_parallel(gw, args)
+    except FatalError:
+        pass
+    else:
+        raise Exception("failed events not reported")
@@ -0,0 +1,13 @@
+from mcviz.utils.particledata import (classify, classify_all, charge,
+    BOSON, GLUON, INVISIBLE, LEPTON, QUARK, SQUARK)
+
+def test_classify():
+    electron, gluon, higgs = classify_all([11, 21, 25])
+    assert electron.flags == LEPTON
+    assert (electron.charge, electron.spin) == (-1., 0.5)
+    assert gluon.flags == GLUON | BOSON and gluon.spin == 1.
+    assert higgs.flags == INVISIBLE | BOSON
+    assert classify(-2).flags == QUARK and abs(charge(-2) + 2 / 3.) < 1e-9
+    assert classify(-1000002).flags == SQUARK
+    # Not in the database: classified by id, neutral, no spin
+    assert classify(-25) == (INVISIBLE | BOSON, 0., None)
@@ -0,0 +1,66 @@
+from os.path import join as pjoin
+
+from mcviz import EventGraph, FatalError, parse_options
+from mcviz.graph.selection import EventSelection
+
+from test_loaders import TESTS_DIR, sample
+
+def test_selection():
+    pdgids, px, py = [2212, 2212, 6, -6, 11], [0, 0, 3, -3, 30], [0, 0, 4, -4, 40]
+    event = pdgids, px, py
+    assert EventSelection("has_pdgid(6) and n_particles == 5")(*event)
+    assert EventSelection("count(6) == 2 and count(2212, 11) == 3")(*event)
+    assert EventSelection("max_pt(6) == 5 and max_pt() == 50")(*event)
+    assert not EventSelection("has_pdgid(13) or max_pt(13) > 0")(*event)
+
+def test_bad_selection():
+    for expression, event in [("n_particles >", None),
+                              ("open('x')", ([], [], []))]:
+        try:
+            EventSelection(expression)(*event)
+        except FatalError:
+            pass
+        else:
+            raise Exception("bad selection %r accepted" % expression)
+
+def in_mev(tmpdir):
+    "A copy of the sample HepMC file with its momenta in MeV"
+    with open(pjoin(TESTS_DIR, "events.hepmc")) as fd:
+        lines = fd.readlines()
+    for i, line in enumerate(lines):
+        if line.startswith("U GEV"):
+            lines[i] = line.replace("GEV", "MEV")
+        elif line.startswith("P "):
+            fields = line.split()
+            fields[3:8] = ["%.8e" % (float(f) * 1000) for f in fields[3:8]]
+            lines[i] = " ".join(fields) + "\n"
+    path = str(tmpdir.join("mev.hepmc"))
+    with open(path, "w") as fd:
+        fd.writelines(lines)
+    return path
+
+def selected(filename, expression, *options):
+    parser, args = parse_options(list(options) + ["--no-cache", "--select",
+                                                  expression, filename + ":all"])
+    return [event_number for format, event_number, event in EventGraph.read_events(args)]
+
+def test_selection_units(tmpdir):
+    "Momenta are selected on in GeV, whatever the units of the input"
+    from mcviz.graph.loaders.hepmc import read_events, make_event, summary_columns
+    gev, mev = sample(tmpdir, "events.hepmc"), in_mev(tmpdir)
+    parser, args = parse_options(["--no-cache"])
+    for (n, gev_event), (n, mev_event) in zip(read_events(gev, None),
+                                              read_events(mev, None)):
+        pdgids, px, py = summary_columns(mev_event, args)
+        gev_pdgids, gev_px, gev_py = summary_columns(gev_event, args)
+        assert pdgids == gev_pdgids
+        for x, y, gev_x, gev_y in zip(px, py, gev_px, gev_py):
+            assert abs(x - gev_x) < 1e-6 and abs(y - gev_y) < 1e-6
+        kinematics = EventGraph(*make_event(mev_event, args)).kinematics
+        assert abs(max(kinematics.pt) - max(
+            (x**2 + y**2)**0.5 for x, y in zip(px, py))) < 1e-6
+
+    assert selected(mev, "max_pt() > 90") == selected(gev, "max_pt() > 90") == [0, 1, 3]
+    assert selected(mev, "max_pt() > 95") == [1]
+    # --units overrides the units of the event
+    assert selected(gev, "max_pt() > 0.095", "--units", "MEV MM") == [1]
@@ -0,0 +1,299 @@
+from os.path import join as pjoin
+
+from mcviz import EventGraph, parse_options
+from mcviz.graph import GraphView, ViewVertex
+from mcviz.tools import Tool, ToolSetting
+from mcviz.tools.transforms.transforms import (related_groups,
+    rewrite_to_fixed_point, neighbours)
+
+from test_loaders import TESTS_DIR, sample
+from test_view import make_view, numbers
+
+def sample_view(tmpdir, name, event_number):
+    parser, args = parse_options(["--no-cache",
+                                  "%s:%i" % (sample(tmpdir, name), event_number)])
+    return GraphView(EventGraph.load(args))
+
+def test_related_groups():
+    relations = [(5, "a"), (3, "b"), (8, "c"), (1, "a"), (8, "b"), (9, "d")]
+    assert related_groups(relations) == [[5, 1], [3, 8]]
+    assert related_groups(relations, min_size=1) == [[5, 1], [3, 8], [9]]
+
+def test_neighbours():
+    view = make_view()
+    p3 = view.p_map[3]
+    assert numbers(neighbours(p3)) == [1, 3, 3, 4, 5]
+    assert numbers(set(neighbours(view.v_map[-3]))) == [-4, -3, -2, -1]
+
+    beam = view.v_map[-1]
+    assert view.contains(p3) and view.contains(beam)
+    beams = view.summarize_vertices([beam, view.v_map[-2]])
+    assert not view.contains(beam) and view.contains(beams)
+    assert view.contains(p3)
+
+def leaf_collapse(graph_view, looked_at):
+    "Merge vertices without outgoing particles into their parents"
+    def relate(vertex):
+        looked_at.append(vertex)
+        if vertex.outgoing:
+            return [vertex]
+        return [vertex] + [p.start_vertex for p in vertex.incoming]
+    return relate
+
+def test_rewrite_to_fixed_point(tmpdir):
+    view = sample_view(tmpdir, "events.pythia", 0)
+    looked_at, rounds = [], []
+    def rewrite(groups):
+        rounds.append(groups)
+        return view.summarize_groups(vertex_groups=groups)[0]
+    rewrite_to_fixed_point(view, view.vertices, leaf_collapse(view, looked_at), rewrite)
+
+    # The summaries made in a round are leaves in the next one, until all
+    # of the event is one vertex
+    assert len(rounds) > 2
+    assert len(view.vertices) == 1 and not view.particles
+
+    # The same as grouping all of the vertices again in every round
+    again = sample_view(tmpdir, "events.pythia", 0)
+    all_looked_at = []
+    relate = leaf_collapse(again, all_looked_at)
+    while True:
+        groups = related_groups((v, key) for v in again.vertices
+                                for key in relate(v))
+        if not groups:
+            break
+        again.summarize_groups(vertex_groups=groups)
+    assert [sorted(v.vertex_numbers) for v in again.vertices] == \
+        [sorted(v.vertex_numbers) for v in view.vertices]
+    assert len(looked_at) < len(all_looked_at)
+
+# transforms.reference was made with these transforms as they were before
+# they summarized all of their groups at once. The only change is that a
+# chain of kinks now counts all of its kinks, where it used to count one.
+SUMMARIZING = ["NoKinks", "Gluballs", "Chainmail", "Categorize",
+               "MergeVertices", "Clusters"]
+SAMPLES = [("events.pythia", 0), ("events.pythia", 1), ("events.hepmc", 0),
+           ("events.hepmc", 1), ("events.lhe", 0), ("summaries.hepmc", 0)]
+
+SUMMARY_ATTRIBUTES = ("gluball_nvertices", "multiple_count", "kink_number",
+                      "cluster_nparticles")
+
+def transformed(view, setting):
+    tool, = Tool.build_tools("transform", [ToolSetting.from_string(setting)], None)
+    tool(view)
+    return view
+
+def describe_numbers(obj):
+    return "+".join(str(nr) for nr in sorted(obj.represented_numbers))
+
+def describe_tags(obj):
+    tags = sorted(tag for tag in obj.tags if isinstance(tag, str))
+    tags += ["%s=%s" % (attribute, getattr(obj, attribute))
+             for attribute in SUMMARY_ATTRIBUTES if hasattr(obj, attribute)]
+    tags += [text for text, position in obj.subscripts]
+    return " ".join(tags)
+
+def describe_view(graph_view):
+    "One line for each object of the view, naming what it summarizes"
+    lines = []
+    for p in graph_view.particles:
+        lines.append("P%s %i V%s>V%s e=%.4g %s" % (describe_numbers(p), p.pdgid,
+            describe_numbers(p.start_vertex), describe_numbers(p.end_vertex),
+            p.e, describe_tags(p)))
+    for v in graph_view.vertices:
+        lines.append("V%s in=%s out=%s %s" % (describe_numbers(v),
+            sorted(describe_numbers(p) for p in v.incoming),
+            sorted(describe_numbers(p) for p in v.outgoing), describe_tags(v)))
+    return lines
+
+def read_reference():
+    reference, lines = {}, None
+    with open(pjoin(TESTS_DIR, "transforms.reference")) as fd:
+        for line in fd.read().splitlines():
+            if line.startswith("## "):
+                lines = reference[line[3:]] = []
+            else:
+                lines.append(line)
+    return reference
+
+def test_summaries_match_reference(tmpdir):
+    reference = read_reference()
+    for name, event_number in SAMPLES:
+        for setting in SUMMARIZING:
+            view = transformed(sample_view(tmpdir, name, event_number), setting)
+            key = "%s:%i %s" % (name, event_number, setting)
+            assert describe_view(view) == reference[key], key
+
+def sequential_cut(graph_view, cut=5, param="pt", mothers=False, daughters=False,
+                   final_state=True):
+    """
+    Cut as it was, walking up from each particle passing the cut in turn and
+    summarizing the daughters cut away from each kept vertex in turn
+    """
+    final_state = final_state and not daughters
+    if final_state:
+        particles = [p for p in graph_view.particles if p.final_state]
+    else:
+        particles = graph_view.particles
+
+    passed_tag = "passed_cut"
+    def cutter(p):
+        return abs(getattr(p, param)) <= cut
+
+    keep = set()
+    def mark(item, depth):
+        keep.add(item)
+        item.tag(passed_tag)
+
+    particles_to_walk = set()
+    for particle in particles:
+        if mothers:
+            loop_over = particle.mothers
+        elif daughters:
+            loop_over = particle.daughters
+        else:
+            loop_over = [particle]
+        for p in loop_over:
+            if not cutter(p):
+                particles_to_walk.add(p)
+                if mothers or daughters:
+                    particles_to_walk.add(particle)
+
+    for p in particles_to_walk:
+        graph_view.walk(p, vertex_action=mark, particle_action=mark, ascend=True)
+
+    for vertex in graph_view.vertices:
+        if passed_tag in vertex.tags:
+            cut_daughters = [p for p in vertex.outgoing if passed_tag not in p.tags]
+            if len(cut_daughters) > 0:
+                vsummary = graph_view.summarize_vertices(set(d.end_vertex for d in cut_daughters))
+                vsummary.tag("cut_summary")
+                psummary = graph_view.summarize_particles(set(cut_daughters))
+                psummary.tag("cut_summary")
+
+    for p in graph_view.particles:
+        if p not in keep and p.start_vertex not in keep:
+            graph_view.drop(p)
+
+    for vertex in graph_view.vertices:
+        if not vertex.incoming and not vertex.outgoing:
+            graph_view.drop(vertex)
+    return graph_view
+
+CUTS = [("Cut:40", dict(cut=40)), ("Cut:40:param=e", dict(cut=40, param="e")),
+        ("Cut:20:mothers=True", dict(cut=20, mothers=True)),
+        ("Cut:40:daughters=True", dict(cut=40, daughters=True)),
+        ("Cut:40:final_state=False", dict(cut=40, final_state=False))]
+
+def test_cut(tmpdir):
+    "Cut in one pass gives the view that cutting one particle at a time did"
+    cut_ends = []
+    for name, event_number in SAMPLES:
+        for setting, options in CUTS:
+            view = transformed(sample_view(tmpdir, name, event_number), setting)
+            before = sequential_cut(sample_view(tmpdir, name, event_number), **options)
+            assert describe_view(view) == describe_view(before), (name, setting)
+            cut_ends.extend(v for v in view.vertices if "cut_summary" in v.tags)
+
+    # Some cut away ends are summarized together, some are shared by the
+    # daughters of several kept vertices
+    assert any(len(v.represented_numbers) > 1 for v in cut_ends)
+    assert any(len(v.incoming) > 1 for v in cut_ends)
+
+def walked_pluck(graph_view, start, keep_down, keep_up):
+    "Pluck as it was, with a depth first walk each way from each particle"
+    keep_objects = set()
+    def walker(max_depth):
+        def keep(obj, depth):
+            keep_objects.add(obj)
+            if depth > max_depth:
+                return ()
+        return keep
+
+    for p in graph_view.particles:
+        if abs(p.pdgid) == start:
+            down, up = walker(keep_down), walker(keep_up)
+            graph_view.walk(p.start_vertex, vertex_action=down, particle_action=down)
+            graph_view.walk(p.start_vertex, vertex_action=up, particle_action=up,
+                            ascend=True)
+    return keep_objects
+
+def walked_shallow(graph_view, drop_depth=10):
+    "Shallow as it was, with a depth first walk from each initial vertex"
+    keep_objects = set()
+    def walker(obj, depth):
+        if depth <= drop_depth:
+            keep_objects.add(obj)
+    for vertex in graph_view.vertices:
+        if vertex.initial:
+            graph_view.walk(vertex, vertex_action=walker, particle_action=walker)
+    return keep_objects
+
+def nearby(sources, max_depth, ascend=False):
+    "The objects at most `max_depth` steps from any of `sources`"
+    found, layer = set(sources), list(sources)
+    for depth in range(max_depth):
+        next_layer = []
+        for obj in layer:
+            if isinstance(obj, ViewVertex):
+                next_objects = obj.incoming if ascend else obj.outgoing
+            else:
+                next_objects = [obj.start_vertex if ascend else obj.end_vertex]
+            for next_obj in next_objects:
+                if next_obj not in found:
+                    found.add(next_obj)
+                    next_layer.append(next_obj)
+        layer = next_layer
+    return found
+
+def kept(view, keep_objects):
+    """
+    The numbers of the particles and vertices left after dropping all but
+    `keep_objects`. Dropping a vertex drops the particles through it.
+    """
+    vertices = [v for v in view.vertices if v in keep_objects]
+    particles = [p for p in view.particles if p in keep_objects and
+                 p.start_vertex in keep_objects and p.end_vertex in keep_objects]
+    return numbers(particles), numbers(vertices)
+
+def check_kept(view, expected, walked):
+    "Returns whether the depth first walk would have kept fewer objects"
+    assert (numbers(view.particles), numbers(view.vertices)) == expected
+    old_particles, old_vertices = walked
+    assert set(old_particles) <= set(expected[0])
+    assert set(old_vertices) <= set(expected[1])
+    return walked != expected
+
+ALL_SAMPLES = SAMPLES + [("events.pythia", 2), ("events.pythia", 3),
+                         ("events.hepmc", 2), ("events.hepmc", 3)]
+
+def test_pluck(tmpdir):
+    "Pluck keeps what is near to the particles plucked, by shortest distance"
+    n_fewer = 0
+    for name, event_number in ALL_SAMPLES:
+        for pdgid, keep_down, keep_up in [(21, 2, 2), (5, 1, 3), (21, 8, 20)]:
+            setting = "Pluck:%i:keep_down=%i:keep_up=%i" % (pdgid, keep_down, keep_up)
+            view = transformed(sample_view(tmpdir, name, event_number), setting)
+
+            before = sample_view(tmpdir, name, event_number)
+            starts = set(p.start_vertex for p in before.particles
+                         if abs(p.pdgid) == pdgid)
+            # Objects one step beyond the depth limits are kept
+            near = (nearby(starts, keep_down + 1) |
+                    nearby(starts, keep_up + 1, ascend=True))
+            walked = walked_pluck(before, pdgid, keep_down, keep_up)
+            n_fewer += check_kept(view, kept(before, near), kept(before, walked))
+    # The depth first walks reached some objects along longer paths first
+    assert n_fewer > 0
+
+def test_shallow(tmpdir):
+    "Shallow keeps what is near to the initial vertices, by shortest distance"
+    n_fewer = 0
+    for name, event_number in ALL_SAMPLES:
+        view = transformed(sample_view(tmpdir, name, event_number), "Shallow")
+
+        before = sample_view(tmpdir, name, event_number)
+        near = nearby([v for v in before.vertices if v.initial], 10)
+        walked = walked_shallow(before)
+        n_fewer += check_kept(view, kept(before, near), kept(before, walked))
+    assert n_fewer > 0
@@ -0,0 +1,52 @@
+import bz2
+import zlib
+from gzip import GzipFile
+from cStringIO import StringIO
+from tempfile import NamedTemporaryFile
+
+from mcviz.utils.trydecompress import open_decompressed, StreamInput
+
+TEXT = "".join("line {0}\n".format(i) for i in xrange(20000)) + "no newline"
+
+def gzipped(data):
+    out = StringIO()
+    gz = GzipFile(fileobj=out, mode="wb")
+    gz.write(data)
+    gz.close()
+    return out.getvalue()
+
+def check_roundtrip(data, expected=TEXT):
+    with NamedTemporaryFile() as f:
+        f.write(data)
+        f.flush()
+        fd = open_decompressed(f.name)
+        try:
+            assert fd.readline() == "line 0\n"
+            assert fd.read(7) == "line 1\n"
+            assert "".join(fd) == expected[len("line 0\nline 1\n"):]
+        finally:
+            fd.close()
+
+def test_trydecompress():
+    check_roundtrip(TEXT)
+    check_roundtrip(gzipped(TEXT))
+    check_roundtrip(bz2.compress(TEXT))
+    check_roundtrip(zlib.compress(TEXT))
+    # Concatenated gzip members, as produced by `cat a.gz b.gz`
+    check_roundtrip(gzipped(TEXT[:1000]) + gzipped(TEXT[1000:]))
+
+def test_stream_input():
+    stream = StreamInput("-", StringIO("first line\nsecond line\nthird line\n"))
+    peek = stream.reopen(peek=True)
+    assert peek.readline() == "first line\n"
+    assert peek.read(3) == "sec"
+    peek.close()
+
+    fd = stream.reopen(peek=False)
+    assert list(fd) == ["first line\n", "second line\n", "third line\n"]
+    try:
+        stream.reopen(peek=True)
+    except IOError:
+        pass
+    else:
+        raise Exception("stream read twice")
@@ -0,0 +1,10 @@
+from mcviz.utils.unionfind import UnionFind
+
+def test_union_find():
+    groups = UnionFind([5, 3, 8, 1])
+    groups.union(8, 3)
+    groups.union(1, 9)
+    groups.union(9, 8)
+    assert groups.find(3) == groups.find(1)
+    assert groups.find(5) != groups.find(3)
+    assert groups.groups() == [[5], [3, 8, 1, 9]]
@@ -0,0 +1,77 @@
+from mcviz.graph.graph import EventGraph
+from mcviz.graph.view import GraphView
+from mcviz.graph.loaders.hepmc import load_event_columns
+
+from test_loaders import HEPMC_EVENT
+
+def make_view():
+    class args: units = None
+    vertices, particles, units, pdfinfo = load_event_columns(HEPMC_EVENT, args)
+    return GraphView(EventGraph(vertices, particles, units, pdfinfo))
+
+def numbers(objects):
+    return sorted(n for o in objects for n in o.represented_numbers)
+
+def test_adjacency_follows_topology():
+    view = make_view()
+    vertex = view.v_map[-3]
+    assert vertex.incoming is vertex.incoming
+    assert numbers(vertex.incoming) == [3, 4]
+
+    n_vertices = len(view.vertices)
+    beams = view.summarize_vertices([view.v_map[-1], view.v_map[-2]])
+    assert numbers(beams.outgoing) == [3, 4]
+    assert view.p_map[3].start_vertex is beams
+    assert len(view.vertices) == n_vertices - 1
+
+    beams.undo_summary()
+    assert numbers(view.p_map[3].start_vertex.incoming) == [1]
+    assert len(view.vertices) == n_vertices
+
+    view.drop(view.p_map[5])
+    assert numbers(view.particles) == [1, 2, 3, 4]
+    assert not view.p_map[3].end_vertex.outgoing
+
+def test_reachability():
+    view = make_view()
+    reachability = view.reachability
+    p1, p3, p4, p5 = [view.p_map[no] for no in (1, 3, 4, 5)]
+    assert reachability.is_ancestor(p1, p5)
+    assert not reachability.is_ancestor(p5, p1)
+    assert not reachability.is_ancestor(p1, p4)
+    assert numbers(p for p in reachability.descendants(p1) if p in view.particles) == [3, 5]
+    assert reachability.depth(p1) == 1
+    assert reachability.depth(p5) == 5
+    assert p5.descends_both and p3.descends_one
+
+    view.drop(p5)
+    assert view.reachability is not reachability
+    assert p5 not in view.reachability.descendants(p1)
+
+def test_distances():
+    view = make_view()
+    p1, p2, p5 = [view.p_map[no] for no in (1, 2, 5)]
+    down = view.distances([p1, p2], max_depth=2)
+    assert down[p1] == down[p2] == 0
+    assert sorted(down.values()) == [0, 0, 1, 1, 2, 2]
+    up = view.distances([p5], ascend=True)
+    assert up[p1] == up[p2] == 4
+
+    view.drop_all([p5, view.v_map[-1]])
+    assert numbers(view.particles) == [2, 4]
+
+def test_summarize_groups():
+    view = make_view()
+    p3, p4 = view.p_map[3], view.p_map[4]
+    version = view.topology_version
+    (beams,), (gluons,) = view.summarize_groups([[view.v_map[-1], view.v_map[-2]]],
+                                                [[p3, p4]])
+    # The particles summarized go from the summary of their start vertices
+    assert view.topology_version == version + 1
+    assert gluons.start_vertex is beams and numbers(beams.outgoing) == [3, 4]
+    assert view.p_map[3] is view.p_map[4] is gluons
+    assert numbers(view.particles) == [1, 2, 3, 4, 5]
+    assert len(view.particles) == 4
+
+    gluons.undo_summary()
+    assert view.p_map[3] is p3 and p3.start_vertex is beams
@@ -0,0 +1,17 @@
+from mcviz.graph.walk import walk
+
+def test_deep_walk():
+    "Walks much deeper than python's recursion limit"
+    n = 100000
+    assert len(walk(0, lambda node, depth: [node + 1] if node < n else [])) == n + 1
+
+def test_walk_loops():
+    edges = {0: [1], 1: [2, 3], 2: [0], 3: []}
+    depths, looping = {}, []
+    def walk_action(node, depth):
+        depths[node] = depth
+        return edges[node]
+    completed = walk(0, walk_action, lambda node, depth: looping.append((node, depth)))
+    assert depths == {0: 0, 1: 1, 2: 2, 3: 2}
+    assert looping == [(2, 1), (1, 2), (0, 3)]
+    assert completed == [2, 3, 1, 0]